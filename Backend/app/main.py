@@ -1,91 +1,198 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
+import anyio
+import asyncio
+import concurrent.futures
+import logging
+import orjson
 import os
 # from app.routes import excel_routes
 from app.routes import excel_routes
+from app.services.supabase_service import SupabaseService
+from app.models import schemas
+from app.utils.responses import AppORJSONResponse
+from app.utils.preflight import PreflightMiddleware
+from app.utils.body_limit import BodySizeLimitMiddleware
+from app.utils.logging_setup import start_logging, stop_logging
+from app.utils.openai_mapper import close_shared_client, aclose_shared_client
+
+logger = logging.getLogger(__name__)
 # from app.routes import excel_routes, pdf_routes
 
 app = FastAPI(
     title="Data Extractor API",
     description="API to extract data from Excel and PDF files using Pandas and AI mapping",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=AppORJSONResponse
 )
 
-# Get allowed origins from environment variable or use default
-ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
+# Make sure every schema has its validator/serializer built before the first request
+for _model in (
+    schemas.ExcelUploadResponse,
+    schemas.ExcelBatchUploadResponse,
+    schemas.SheetDataResponse,
+    schemas.FilterRequest,
+    schemas.ColumnMappingResponse,
+    schemas.MappedDataResponse,
+    schemas.MappedDataSummaryResponse,
+):
+    _model.model_rebuild()
+
+# Get extra allowed origins from environment variable (comma-separated), parsed once at import
+ALLOWED_ORIGINS = tuple(origin.strip() for origin in os.getenv("ALLOWED_ORIGINS", "").split(",") if origin.strip())
+
+CORS_ORIGINS = (
+    "http://localhost:3000",  # Local development
+    "https://growship-red.vercel.app",  # Your Vercel frontend
+) + ALLOWED_ORIGINS
+
+# CORSMiddleware does exact matching on allow_origins, so wildcard
+# subdomains must go through allow_origin_regex (compiled once at startup)
+VERCEL_ORIGIN_REGEX = r"https://[a-zA-Z0-9-]+\.vercel\.app"
+
+CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH"]
+CORS_HEADERS = [
+    "Accept",
+    "Accept-Language",
+    "Content-Language",
+    "Content-Type",
+    "Authorization",
+    "X-Requested-With",
+    "Origin",
+    "Access-Control-Request-Method",
+    "Access-Control-Request-Headers",
+]
+CORS_MAX_AGE = 86400  # Cache preflight response for 24 hours
+
+# Largest accepted request body; bigger uploads get a 413 before they are read
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+
+# Innermost, so CORSMiddleware still adds headers to 413 responses
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_UPLOAD_BYTES)
 
 # CORS middleware with production-ready configuration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",  # Local development
-        "https://growship-red.vercel.app",  # Your Vercel frontend
-        "https://*.vercel.app",  # All Vercel deployments
-    ],
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=VERCEL_ORIGIN_REGEX,  # All Vercel deployments
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=[
-        "Accept",
-        "Accept-Language",
-        "Content-Language",
-        "Content-Type",
-        "Authorization",
-        "X-Requested-With",
-        "Origin",
-        "Access-Control-Request-Method",
-        "Access-Control-Request-Headers",
-    ],
+    allow_methods=CORS_METHODS,
+    allow_headers=CORS_HEADERS,
     expose_headers=["*"],
-    max_age=3600,  # Cache preflight response for 1 hour
+    max_age=CORS_MAX_AGE,
+)
+
+# Compress large tabular JSON responses (negotiated via Accept-Encoding)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Outermost: answer preflights for allowed origins before any other middleware runs
+app.add_middleware(
+    PreflightMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=VERCEL_ORIGIN_REGEX,
+    allow_methods=CORS_METHODS,
+    allow_headers=CORS_HEADERS,
+    max_age=CORS_MAX_AGE,
 )
 
 # Include routes
 app.include_router(excel_routes.router, prefix="/api/v1/excel", tags=["excel"])
 # app.include_router(pdf_routes.router, prefix="/api/v1/pdf", tags=["pdf"])
 
+# Constant payloads are encoded once; a fresh Response wraps the bytes per request
+# because middleware appends headers to the response's header list in place
+_ROOT_BODY = orjson.dumps({"message": "Data Extractor API is running! Supports Excel and PDF files."})
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "Data Extractor API"})
+_HEALTH_HEADERS = {"Cache-Control": "public, max-age=30"}
+
+# CORS config cannot change after startup, so build the debug payload once
+_CORS_INFO_BODY = orjson.dumps({
+    "allowed_origins": list(CORS_ORIGINS),
+    "allowed_origin_regex": VERCEL_ORIGIN_REGEX,
+    "environment": os.getenv("ENVIRONMENT", "development"),
+    "cors_configured": True
+})
+
 @app.get("/")
 async def root():
-    return {"message": "Data Extractor API is running! Supports Excel and PDF files."}
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "Data Extractor API"}
+    return Response(content=_HEALTH_BODY, media_type="application/json", headers=_HEALTH_HEADERS)
 
 @app.get("/cors-info")
 async def cors_info():
     """Debug endpoint to check CORS configuration"""
-    return {
-        "allowed_origins": ALLOWED_ORIGINS,
-        "environment": os.getenv("ENVIRONMENT", "development"),
-        "cors_configured": True
-    }
+    return Response(content=_CORS_INFO_BODY, media_type="application/json")
+
+# Upper bound on concurrent threadpool jobs (pandas parsing, sync Supabase calls)
+THREADPOOL_TOKENS = int(os.getenv("THREADPOOL_TOKENS", max(40, 2 * (os.cpu_count() or 1))))
+
+# Shared pool for run_in_executor(None, ...) calls such as storage uploads
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", 16))
+
+# Started per worker (after any fork) so each process has its own listener thread
+@app.on_event("startup")
+async def configure_logging():
+    start_logging()
+
+@app.on_event("shutdown")
+async def flush_logging():
+    stop_logging()
+
+@app.on_event("startup")
+async def configure_threadpool():
+    """Raise the anyio thread limiter so concurrent uploads don't queue behind the default 40 tokens"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="executor")
+    )
+
+@app.on_event("startup")
+async def init_supabase_service():
+    """Create the Supabase client once per worker, off the event loop"""
+    app.state.supabase_service = None
+    app.state.supabase_error = None
+    try:
+        app.state.supabase_service = await run_in_threadpool(SupabaseService)
+    except Exception as e:
+        app.state.supabase_error = str(e)
+        logger.error("Supabase client initialization failed: %s", e)
+
+@app.on_event("shutdown")
+async def close_supabase_service():
+    if app.state.supabase_service is not None:
+        await app.state.supabase_service.close()
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    close_shared_client()
+    await aclose_shared_client()
 
 @app.get("/debug/supabase")
 async def debug_supabase():
     """Debug endpoint to check Supabase configuration"""
-    try:
-        from app.services.supabase_service import SupabaseService
-        supabase_service = SupabaseService()
-        
-        # Check if client is properly initialized
-        client_status = "initialized" if supabase_service.client else "not_initialized"
-        
+    supabase_service = app.state.supabase_service
+    
+    if app.state.supabase_error:
         return {
-            "supabase_url_configured": bool(os.getenv("SUPABASE_URL")),
-            "supabase_key_configured": bool(os.getenv("SUPABASE_ANON_KEY")),
-            "client_status": client_status,
-            "proxy_env_vars": {
-                var: os.getenv(var) for var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']
-            }
-        }
-    except Exception as e:
-        return {
-            "error": str(e),
+            "error": app.state.supabase_error,
             "supabase_url_configured": bool(os.getenv("SUPABASE_URL")),
             "supabase_key_configured": bool(os.getenv("SUPABASE_ANON_KEY"))
         }
-
-@app.options("/{path:path}")
-async def options_handler(path: str):
-    """Handle OPTIONS requests for CORS preflight"""
-    return {"message": "OK"}
\ No newline at end of file
+    
+    # Check if client is properly initialized
+    client_status = "initialized" if supabase_service and supabase_service.client else "not_initialized"
+    
+    return {
+        "supabase_url_configured": bool(os.getenv("SUPABASE_URL")),
+        "supabase_key_configured": bool(os.getenv("SUPABASE_ANON_KEY")),
+        "client_status": client_status,
+        "db_pool": supabase_service.pg_pool_stats() if supabase_service else None,
+        "proxy_env_vars": {
+            var: os.getenv(var) for var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']
+        }
+    }
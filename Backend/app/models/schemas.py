@@ -1,14 +1,31 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional, Union
+from pydantic import BaseModel, ConfigDict, SkipValidation
+from typing import List, Dict, Any, Optional
+
+# Response payloads are built server-side from native types and never mutated after
+# construction, so strict mode skips the lax coercion fallback on every field
+RESPONSE_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True, strict=True)
 
 class ExcelUploadResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     filename: str
     sheets: List[str]
     message: str
+    sheet_used: Optional[str] = None
+    mapping: Optional[Dict[str, Any]] = None
+
+class ExcelBatchUploadResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
+    files: List[ExcelUploadResponse]
+    message: str
 
 class SheetDataResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     sheet_name: str
-    data: List[Dict[str, Any]]
+    # Row dicts come straight from DataFrame.to_dict, so skip the per-row walk
+    data: SkipValidation[List[Dict[str, Any]]]
     columns: List[str]
     total_rows: int
 
@@ -17,6 +34,8 @@ class FilterRequest(BaseModel):
     columns: Optional[List[str]] = None
 
 class ColumnMappingResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     filename: str
     sheet_used: str
     mapping: Dict[str, str]
@@ -24,21 +43,25 @@ class ColumnMappingResponse(BaseModel):
     original_columns: List[str]
     mapped_columns: List[str]
     total_rows: int
-    mapped_data_sample: List[Dict[str, Any]]
+    mapped_data_sample: SkipValidation[List[Dict[str, Any]]]
     message: str
 
 class MappedDataResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     filename: str
     sheet_used: str
     mapping: Dict[str, str]
     validation: Dict[str, Any]
-    data: List[Dict[str, Any]]
+    data: SkipValidation[List[Dict[str, Any]]]
     columns: List[str]
     total_rows: int
     offset: int
     limit: int
 
 class MappedDataSummaryResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     filename: str
     sheet_used: str
     mapping: Dict[str, str]
@@ -1,38 +1,123 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Form, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Form, BackgroundTasks, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import orjson
 import aiofiles
 from typing import List, Optional
 import pandas as pd
 import numpy as np
 import asyncio
-import concurrent.futures
+import hashlib
+import logging
 import uuid
 from app.utils.excel_processor import ExcelProcessor
 from app.services.supabase_service import SupabaseService
-from app.models.schemas import ExcelUploadResponse, SheetDataResponse, FilterRequest
+from app.models.schemas import ExcelUploadResponse, ExcelBatchUploadResponse, SheetDataResponse, FilterRequest
+from app.utils.responses import AppORJSONResponse, model_response
+from app.utils.ttl_cache import TTLCache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Ensure upload directory exists
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-async def store_file_to_supabase_background(file_content: bytes, filename: str, user_id: str, organization_id: str, document_id: str):
-    """Background task to store file to Supabase storage using thread pool to prevent blocking"""
+# Rows converted per chunk when streaming NDJSON responses
+STREAM_CHUNK_ROWS = 1000
+
+# Bytes copied per read when saving uploads, so whole files are never held in memory
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+ALLOWED_UPLOAD_EXTENSIONS = frozenset({".xlsx", ".xls", ".csv"})
+
+def is_allowed_upload(filename: Optional[str]) -> bool:
+    """Check the upload's extension (case-insensitive) against the supported spreadsheet types"""
+    return bool(filename) and os.path.splitext(filename)[1].lower() in ALLOWED_UPLOAD_EXTENSIONS
+
+# Business-question results only change when data is ingested or deleted
+business_cache = TTLCache(ttl=int(os.getenv("BUSINESS_CACHE_TTL", 60)))
+
+# Per-question overrides of BUSINESS_CACHE_TTL: dashboards poll the trend, breakdowns move slowly
+BUSINESS_CACHE_TTLS = {
+    "get_monthly_sales_trend": 30,
+    "get_sales_by_country": 300,
+    "get_category_performance": 300,
+}
+
+async def get_supabase_service(request: Request) -> SupabaseService:
+    """Return the worker's shared Supabase service created at startup"""
+    supabase_service = getattr(request.app.state, "supabase_service", None)
+    if supabase_service is None:
+        detail = getattr(request.app.state, "supabase_error", None) or "Supabase service is not initialized"
+        raise HTTPException(status_code=500, detail=detail)
+    return supabase_service
+
+async def call_business_function_cached(supabase_service: SupabaseService, function_name: str, organization_id: str, user_id: str, **kwargs) -> list:
+    """Call a business function, serving repeat calls from the per-worker TTL cache"""
+    key = (function_name, organization_id, user_id, tuple(sorted(kwargs.items())))
+    result = business_cache.get(key)
+    if result is None:
+        result = await supabase_service.call_business_function(function_name, organization_id, user_id, **kwargs)
+        # Errors come back as [], so only cache real results
+        if result:
+            business_cache.set(key, result, ttl=BUSINESS_CACHE_TTLS.get(function_name))
+    return result
+
+# Per-worker progress of queued ingest jobs; the document record's status is the durable state
+ingest_jobs = TTLCache(ttl=int(os.getenv("INGEST_JOB_TTL", 3600)))
+
+def invalidate_business_cache(organization_id: str) -> None:
+    """Drop cached business-question results for an organization after its data changes"""
+    business_cache.invalidate(lambda key: key[1] == organization_id)
+
+async def save_upload_file(file: UploadFile, file_path: str) -> str:
+    """Stream an uploaded file to disk in fixed-size chunks and return its sha256 hex digest"""
+    hasher = hashlib.sha256()
+    async with aiofiles.open(file_path, 'wb') as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            await f.write(chunk)
+    return hasher.hexdigest()
+
+async def cleanup_document_upload(file_path: str) -> None:
+    """Remove an upload-and-process file and its per-document directory once empty"""
+    await run_in_threadpool(ExcelProcessor.safe_file_cleanup, file_path)
+    upload_dir = os.path.dirname(file_path)
+    if os.path.abspath(upload_dir) != os.path.abspath(UPLOAD_DIR):
+        try:
+            os.rmdir(upload_dir)
+        except OSError:
+            pass
+
+async def get_mapping_result(file_path: str, sheet_name: Optional[str], sample_size: int, document_id: Optional[str] = None) -> dict:
+    """Return the mapping result for a file, reusing the cached result for a known document"""
+    result = await run_in_threadpool(ExcelProcessor.load_cached_mapping, document_id, sheet_name, sample_size)
+    if result is not None:
+        return result
+    
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Process file with OpenAI mapping
+    result = await ExcelProcessor.aprocess_file_with_openai_mapping(file_path, sheet_name, sample_size)
+    await run_in_threadpool(ExcelProcessor.save_cached_mapping, document_id, sheet_name, sample_size, result)
+    return result
+
+async def store_file_to_supabase_background(supabase_service: SupabaseService, file_path: str, filename: str, user_id: str, organization_id: str, document_id: str):
+    """Background task to store the saved local file to Supabase storage, then remove it"""
     try:
-        print(f"[BACKGROUND] Starting file storage for: {filename}")
-        supabase_service = SupabaseService()
-        
-        # Use thread pool executor to run file upload in separate thread
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            # Run the file upload in a separate thread
-            storage_path = await loop.run_in_executor(
-                executor,
-                _upload_file_sync,
-                file_content, filename, user_id, organization_id, document_id
-            )
+        logger.info("Starting file storage for: %s", filename)
+        
+        # upload_file_to_storage runs the blocking SDK call on the shared executor
+        storage_path = await supabase_service.upload_file_to_storage(
+            file_path,
+            filename,
+            user_id,
+            organization_id,
+            document_id
+        )
         
         # Update document status to success with document path
         await supabase_service.update_document_storage_status(
@@ -41,70 +126,144 @@ async def store_file_to_supabase_background(file_content: bytes, filename: str,
             document_path=storage_path
         )
         
-        print(f"[BACKGROUND] File stored successfully: {storage_path}")
+        logger.info("File stored successfully: %s", storage_path)
     except Exception as e:
-        print(f"[BACKGROUND ERROR] Failed to store file {filename}: {str(e)}")
+        logger.error("Failed to store file %s: %s", filename, e)
         
         # Update document status to failed
         try:
-            supabase_service = SupabaseService()
             await supabase_service.update_document_storage_status(
                 document_id=document_id,
                 status="failed"
             )
-            print(f"[BACKGROUND] Updated document status to failed for: {document_id}")
+            logger.info("Updated document status to failed for: %s", document_id)
         except Exception as update_error:
-            print(f"[BACKGROUND ERROR] Could not update document status to failed: {update_error}")
-
-def _upload_file_sync(file_content: bytes, filename: str, user_id: str, organization_id: str, document_id: str) -> str:
-    """Synchronous file upload function to be run in thread pool"""
-    import asyncio
-    from app.services.supabase_service import SupabaseService
+            logger.error("Could not update document status to failed: %s", update_error)
     
-    async def _async_upload():
-        supabase_service = SupabaseService()
-        storage_path = await supabase_service.upload_file_to_storage(
-            file_content, 
-            filename, 
-            user_id, 
+    finally:
+        await cleanup_document_upload(file_path)
+
+async def process_document_background(supabase_service: SupabaseService, file_path: str, filename: str, user_id: str,
+                                      organization_id: str, document_id: str, sheet_name: Optional[str], sample_size: int):
+    """Background job: map the saved file with OpenAI, store its rows, then upload it to Supabase storage"""
+    ingest_jobs.set(document_id, {"status": "processing"})
+    try:
+        logger.info("Starting processing for document: %s", document_id)
+        
+        # Process file with OpenAI mapping
+        result = await ExcelProcessor.aprocess_file_with_openai_mapping(file_path, sheet_name, sample_size)
+        
+        # Create user table and brand view if they don't exist (independent, so run together)
+        await asyncio.gather(
+            supabase_service.create_user_table(user_id),
+            supabase_service.create_brand_view(organization_id, user_id)
+        )
+        
+        # Store mapped data with document_id
+        store_success = await supabase_service.store_mapped_data(
             organization_id,
+            user_id,
+            result["mapped_data"],
             document_id
         )
-        return storage_path
+        invalidate_business_cache(organization_id)
+        
+        ingest_jobs.set(document_id, {
+            "status": "stored",
+            "sheet_used": result["sheet_used"],
+            "mapping": result["mapping"],
+            "validation": result["validation"],
+            "total_rows": int(result["total_rows"]),
+            "data_stored": store_success
+        })
+        logger.info("Document data stored: %s", document_id)
+        
+        await supabase_service.create_business_functions(organization_id)
+        
+        # Keep the mapping so later mapped-data/summary calls for this document skip OpenAI
+        await run_in_threadpool(ExcelProcessor.save_cached_mapping, document_id, sheet_name, sample_size, result)
+    except Exception as e:
+        logger.error("Failed to process document %s: %s", document_id, e)
+        ingest_jobs.set(document_id, {"status": "failed", "error": str(e)})
+        await supabase_service.update_document_storage_status(document_id=document_id, status="failed")
+        await cleanup_document_upload(file_path)
+        return
     
-    # Run the async function in a new event loop
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        storage_path = loop.run_until_complete(_async_upload())
-        return storage_path
-    finally:
-        loop.close()
+    # Store the original file; this also removes the local file
+    await store_file_to_supabase_background(supabase_service, file_path, filename, user_id, organization_id, document_id)
 
 @router.post("/upload", response_model=ExcelUploadResponse)
 async def upload_excel_file(file: UploadFile = File(...)):
     """Upload Excel file and get sheet names"""
     try:
         # Validate file type
-        if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+        if not is_allowed_upload(file.filename):
             raise HTTPException(status_code=400, detail="Only Excel and CSV files are allowed")
         
         # Save uploaded file
         file_path = os.path.join(UPLOAD_DIR, file.filename)
-        
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        await save_upload_file(file, file_path)
         
         # Get sheet names
-        sheet_names = ExcelProcessor.get_sheet_names(file_path)
+        sheet_names = await run_in_threadpool(ExcelProcessor.get_sheet_names, file_path)
         
-        return ExcelUploadResponse(
+        return model_response(ExcelUploadResponse(
             filename=file.filename,
             sheets=sheet_names,
             message="File uploaded successfully"
-        )
+        ))
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload-batch", response_model=ExcelBatchUploadResponse)
+async def upload_excel_files_batch(
+    files: List[UploadFile] = File(...),
+    map_columns: bool = Form(False),
+    sample_size: int = Form(50)
+):
+    """Upload several Excel files in one request and get sheet names for each (and, with map_columns, their column mappings)"""
+    try:
+        # Validate every file before writing anything
+        for file in files:
+            if not is_allowed_upload(file.filename):
+                raise HTTPException(status_code=400, detail=f"Only Excel and CSV files are allowed: {file.filename}")
+        
+        file_paths = []
+        for file in files:
+            file_path = os.path.join(UPLOAD_DIR, file.filename)
+            await save_upload_file(file, file_path)
+            file_paths.append(file_path)
+        
+        # Read sheet names for all files concurrently in the threadpool
+        sheet_names_list = await asyncio.gather(*(
+            run_in_threadpool(ExcelProcessor.get_sheet_names, file_path)
+            for file_path in file_paths
+        ))
+        
+        # Map every file's best sheet with concurrent OpenAI calls
+        mapping_results = [None] * len(files)
+        if map_columns:
+            mapping_results = await ExcelProcessor.aprocess_files_with_openai_mapping(file_paths, sample_size=sample_size)
+        
+        return model_response(ExcelBatchUploadResponse(
+            files=[
+                ExcelUploadResponse(
+                    filename=file.filename,
+                    sheets=sheet_names,
+                    message="File uploaded successfully",
+                    sheet_used=result["sheet_used"] if result else None,
+                    mapping=result["mapping"] if result else None
+                )
+                for file, sheet_names, result in zip(files, sheet_names_list, mapping_results)
+            ],
+            message=f"{len(files)} files uploaded successfully"
+        ))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -115,24 +274,30 @@ async def upload_and_process_file(
     user_id: str = Form(...),
     organization_id: str = Form(...),
     sheet_name: str = Form(None),
-    sample_size: int = Form(50)
+    sample_size: int = Form(50),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
-    """Upload file, process with AI mapping, and store to Supabase"""
+    """Upload file and queue AI mapping and storage to Supabase; poll /documents/{document_id}/status for progress"""
     file_path = None
     document_id = None
+    cleanup_in_background = False
     
     try:
         # Validate file type
-        if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+        if not is_allowed_upload(file.filename):
             raise HTTPException(status_code=400, detail="Only Excel and CSV files are allowed")
         
-        # Initialize Supabase service
-        supabase_service = SupabaseService()
+        # Save under a temporary name, hashing on the way so duplicates are detected by content
+        # without touching a same-named file that an earlier upload is still processing
+        file_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+        content_hash = await save_upload_file(file, file_path)
         
-        # Check for duplicate document BEFORE processing
-        duplicate_info = await supabase_service.check_duplicate_document(
-            file.filename, user_id, organization_id
+        # Check for duplicates and create/re-open the document record in one call
+        ingest = await supabase_service.begin_document_ingest(
+            file.filename, user_id, organization_id, content_hash
         )
+        duplicate_info = None if ingest['is_new'] else ingest
+        document_id = ingest['document_id']
         
         if duplicate_info:
             if duplicate_info['is_duplicate']:
@@ -152,17 +317,8 @@ async def upload_and_process_file(
                     "message": message
                 }
             elif duplicate_info['can_retry']:
-                # Retry failed upload
-                document_id = duplicate_info['document_id']
-                print(f"[INFO] Retrying failed upload with document_id: {document_id}")
-                
-                # Update status back to processing for retry
-                await supabase_service.update_document_storage_status(
-                    document_id=document_id,
-                    status="processing"
-                )
-                
-                # Continue with processing (don't return early for retry)
+                # Retry failed upload (status already set back to processing)
+                logger.info("Retrying failed upload with document_id: %s", document_id)
             else:
                 status = duplicate_info['status']
                 message = f"You uploaded this file already with status: {status}."
@@ -175,103 +331,70 @@ async def upload_and_process_file(
                     "message": message
                 }
         else:
-            # Generate new document_id
-            document_id = str(uuid.uuid4())
-            print(f"[INFO] Generated new document_id: {document_id}")
-        
-        # Insert document record immediately with "processing" status (only for new uploads)
-        if not duplicate_info or not duplicate_info.get('can_retry'):
-            await supabase_service.insert_document_storage_metadata(
-                document_name=file.filename,
-                user_id=user_id,
-                organization_id=organization_id,
-                document_id=document_id,
-                status="processing"
-            )
-        
-        # Read file content
-        file_content = await file.read()
-        
-        # Save file locally for processing
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-        
-        # Process file with OpenAI mapping
-        result = ExcelProcessor.process_file_with_openai_mapping(
-            file_path, 
-            sheet_name, 
-            sample_size
-        )
-        
-        # Create user table and organization view if they don't exist
-        await supabase_service.create_user_table(user_id)
-        await supabase_service.create_organization_view(organization_id, user_id)
+            logger.info("Created new document_id: %s", document_id)
         
+        # Move the upload into a directory of its own, so same-named uploads never share a path
+        document_path = os.path.join(UPLOAD_DIR, document_id, os.path.basename(file.filename))
+        os.makedirs(os.path.dirname(document_path), exist_ok=True)
+        os.replace(file_path, document_path)
+        file_path = document_path
         
-        # Store mapped data with document_id
-        store_success = await supabase_service.store_mapped_data(
-            organization_id,
-            user_id,
-            result["mapped_data"],
-            document_id  # Pass document_id here
-        )
-
-        # Create business functions
-        await supabase_service.create_business_functions(organization_id)
-        
-        # Add file storage as background task (after response is sent)
+        # Mapping, storing and file storage run after the response is sent; it also removes the local file
+        ingest_jobs.set(document_id, {"status": "queued"})
         background_tasks.add_task(
-            store_file_to_supabase_background,
-            file_content,
+            process_document_background,
+            supabase_service,
+            file_path,
             file.filename,
             user_id,
             organization_id,
-            document_id  # Pass document_id to background task
+            document_id,
+            sheet_name,
+            sample_size
         )
+        cleanup_in_background = True
         
         # Determine if this is a retry or new upload
         is_retry = duplicate_info and duplicate_info.get('can_retry', False)
         
         return {
             "filename": file.filename,
-            "sheet_used": result["sheet_used"],
-            "mapping": result["mapping"],
-            "validation": result["validation"],
             "storage_path": "pending",  # Will be processed in background
-            "data_stored": store_success,
-            "total_rows": int(result["total_rows"]),
             "document_id": document_id,
             "is_duplicate": False,
-            "status": "processing",
+            "status": "queued",
             "is_retry": is_retry,
             "message": "Retrying failed upload! Processing and uploading to storage in progress." if is_retry else "File uploaded successfully! Processing and uploading to storage in progress."
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
     
     finally:
-        # Always clean up local file to prevent locking issues
-        if file_path:
-            ExcelProcessor.safe_file_cleanup(file_path)
+        # Always clean up local file to prevent locking issues (unless the storage task still needs it)
+        if file_path and not cleanup_in_background:
+            await cleanup_document_upload(file_path)
 
 @router.delete("/document/{document_id}")
 async def delete_document(
     document_id: str,
     user_id: str = Query(...),
-    organization_id: str = Query(...)
+    organization_id: str = Query(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Delete document and all associated data"""
     try:
-        supabase_service = SupabaseService()
         success = await supabase_service.delete_document_and_data(
             document_id=document_id,
             user_id=user_id,
-            organization_id=organization_id
+            brand_id=organization_id
         )
         
         if success:
+            invalidate_business_cache(organization_id)
+            await run_in_threadpool(ExcelProcessor.delete_cached_mapping, document_id)
             return {"message": "Document and associated data deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete document")
@@ -288,7 +411,7 @@ async def get_sheets(filename: str):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        sheet_names = ExcelProcessor.get_sheet_names(file_path)
+        sheet_names = await run_in_threadpool(ExcelProcessor.get_sheet_names, file_path)
         
         return {
             "filename": filename,
@@ -312,28 +435,22 @@ async def get_sheet_data(
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Read Excel data
-        sheets_data = ExcelProcessor.read_excel_file(file_path, sheet_name)
-        
-        if sheet_name not in sheets_data:
+        if sheet_name not in await run_in_threadpool(ExcelProcessor.get_sheet_names, file_path):
             raise HTTPException(status_code=404, detail="Sheet not found")
         
-        sheet_info = sheets_data[sheet_name]
-        df = sheet_info['data']
-        
-        # Apply pagination
-        total_rows = len(df)
-        paginated_df = df.iloc[offset:offset + limit]
+        # Build a DataFrame only for the requested page
+        page = await run_in_threadpool(ExcelProcessor.read_excel_range, file_path, sheet_name, offset, limit)
         
-        # Convert to dictionary
-        data = ExcelProcessor.convert_to_dict(paginated_df)
+        # Encode rows in pandas and embed the bytes without re-walking them
+        data = await run_in_threadpool(ExcelProcessor.convert_to_json, page['data'])
         
-        return SheetDataResponse(
-            sheet_name=sheet_name,
-            data=data,
-            columns=sheet_info['columns'],
-            total_rows=total_rows
-        )
+        # Rows are already JSON-ready, so skip response_model re-validation
+        return AppORJSONResponse(content={
+            "sheet_name": sheet_name,
+            "data": orjson.Fragment(data),
+            "columns": page['columns'],
+            "total_rows": page['total_rows']
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -352,7 +469,7 @@ async def filter_sheet_data(
             raise HTTPException(status_code=404, detail="File not found")
         
         # Read Excel data
-        sheets_data = ExcelProcessor.read_excel_file(file_path, sheet_name)
+        sheets_data = await run_in_threadpool(ExcelProcessor.read_excel_file, file_path, sheet_name)
         
         if sheet_name not in sheets_data:
             raise HTTPException(status_code=404, detail="Sheet not found")
@@ -362,22 +479,23 @@ async def filter_sheet_data(
         
         # Apply filters
         if filter_request.filters:
-            filtered_df = ExcelProcessor.filter_data(df, filter_request.filters)
+            filtered_df = await run_in_threadpool(ExcelProcessor.filter_data, df, filter_request.filters)
         else:
             filtered_df = df
         
-        # Convert to dictionary with selected columns
-        data = ExcelProcessor.convert_to_dict(
+        # Encode rows with selected columns
+        data = await run_in_threadpool(
+            ExcelProcessor.convert_to_json,
             filtered_df, 
             filter_request.columns
         )
         
-        return SheetDataResponse(
-            sheet_name=sheet_name,
-            data=data,
-            columns=filter_request.columns or sheet_info['columns'],
-            total_rows=len(filtered_df)
-        )
+        return AppORJSONResponse(content={
+            "sheet_name": sheet_name,
+            "data": orjson.Fragment(data),
+            "columns": filter_request.columns or sheet_info['columns'],
+            "total_rows": len(filtered_df)
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -391,16 +509,16 @@ async def get_file_statistics(filename: str):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        sheets_data = ExcelProcessor.read_excel_file(file_path)
+        # Metadata only: sheet bodies are not parsed
+        metadata = await run_in_threadpool(ExcelProcessor.get_sheet_metadata, file_path)
         
         stats = {}
-        for sheet_name, sheet_info in sheets_data.items():
-            df = sheet_info['data']
+        for sheet_name, sheet_meta in metadata.items():
             stats[sheet_name] = {
-                "rows": sheet_info['shape'][0],
-                "columns": sheet_info['shape'][1],
-                "column_names": sheet_info['columns'],
-                "data_types": df.dtypes.astype(str).to_dict()
+                "rows": sheet_meta['shape'][0],
+                "columns": sheet_meta['shape'][1],
+                "column_names": sheet_meta['columns'],
+                "data_types": sheet_meta['dtypes']
             }
         
         return {
@@ -415,26 +533,19 @@ async def get_file_statistics(filename: str):
 async def map_columns_with_openai(
     filename: str,
     sheet_name: str = Query(None, description="Sheet name (auto-detects best sheet if not provided)"),
-    sample_size: int = Query(50, ge=10, le=100, description="Number of sample rows to send to OpenAI")
+    sample_size: int = Query(50, ge=10, le=100, description="Number of sample rows to send to OpenAI"),
+    document_id: str = Query(None, description="Ingested document id; reuses its cached mapping when available")
 ):
     """Map columns using OpenAI and return mapped data"""
     try:
         file_path = os.path.join(UPLOAD_DIR, filename)
         
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Process file with OpenAI mapping
-        result = ExcelProcessor.process_file_with_openai_mapping(
-            file_path, 
-            sheet_name, 
-            sample_size
-        )
+        result = await get_mapping_result(file_path, sheet_name, sample_size, document_id)
         
-        # Convert numpy types to Python native types for JSON serialization
-        mapped_data_sample = ExcelProcessor.convert_to_dict(result["mapped_data"].head(10))
+        # Encode the sample in pandas and embed the bytes without re-walking them
+        mapped_data_sample = await run_in_threadpool(ExcelProcessor.convert_to_json, result["mapped_data"].head(10))
         
-        return {
+        return AppORJSONResponse(content={
             "filename": filename,
             "sheet_used": result["sheet_used"],
             "mapping": result["mapping"],
@@ -442,9 +553,9 @@ async def map_columns_with_openai(
             "original_columns": result["original_columns"],
             "mapped_columns": result["mapped_columns"],
             "total_rows": int(result["total_rows"]),
-            "mapped_data_sample": mapped_data_sample,
+            "mapped_data_sample": orjson.Fragment(mapped_data_sample),
             "message": "Columns mapped successfully using OpenAI"
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Column mapping error: {str(e)}")
@@ -455,67 +566,97 @@ async def get_mapped_data(
     sheet_name: str = Query(None, description="Sheet name (auto-detects best sheet if not provided)"),
     limit: int = Query(100, ge=1, le=10000),
     offset: int = Query(0, ge=0),
-    sample_size: int = Query(50, ge=10, le=100)
+    sample_size: int = Query(50, ge=10, le=100),
+    format: str = Query("records", pattern="^(records|columnar)$", description="records (list of row objects) or columnar (one list per column)"),
+    cents: bool = Query(False, description="Send USD money columns as integer cents"),
+    document_id: str = Query(None, description="Ingested document id; reuses its cached mapping when available")
 ):
     """Get mapped data with pagination"""
     try:
         file_path = os.path.join(UPLOAD_DIR, filename)
         
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Process file with OpenAI mapping
-        result = ExcelProcessor.process_file_with_openai_mapping(
-            file_path, 
-            sheet_name, 
-            sample_size
-        )
+        result = await get_mapping_result(file_path, sheet_name, sample_size, document_id)
         
         # Apply pagination to mapped data
         df_mapped = result["mapped_data"]
         total_rows = len(df_mapped)
         paginated_df = df_mapped.iloc[offset:offset + limit]
+        if cents:
+            paginated_df = ExcelProcessor.convert_money_to_cents(paginated_df)
         
-        # Convert to dictionary
-        data = ExcelProcessor.convert_to_dict(paginated_df)
+        if format == "columnar":
+            # Column-oriented rows: keys once, values as flat lists
+            data = await run_in_threadpool(ExcelProcessor.convert_to_columns, paginated_df)
+        else:
+            # Encode rows in pandas and embed the bytes without re-walking them
+            data = orjson.Fragment(await run_in_threadpool(ExcelProcessor.convert_to_json, paginated_df))
         
-        return {
+        return AppORJSONResponse(content={
             "filename": filename,
             "sheet_used": result["sheet_used"],
             "mapping": result["mapping"],
             "validation": result["validation"],
+            "format": format,
             "data": data,
-            "columns": result["mapped_columns"],
+            "columns": paginated_df.columns.tolist() if cents else result["mapped_columns"],
             "total_rows": int(total_rows),
             "offset": int(offset),
             "limit": int(limit)
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting mapped data: {str(e)}")
 
+@router.get("/mapped-data/{filename}/stream")
+async def stream_mapped_data(
+    filename: str,
+    sheet_name: str = Query(None, description="Sheet name (auto-detects best sheet if not provided)"),
+    sample_size: int = Query(50, ge=10, le=100),
+    cents: bool = Query(False, description="Send USD money columns as integer cents"),
+    document_id: str = Query(None, description="Ingested document id; reuses its cached mapping when available")
+):
+    """Stream all mapped rows as NDJSON instead of building one large JSON body"""
+    try:
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        
+        result = await get_mapping_result(file_path, sheet_name, sample_size, document_id)
+        df_mapped = result["mapped_data"]
+        if cents:
+            df_mapped = ExcelProcessor.convert_money_to_cents(df_mapped)
+        
+        def row_stream():
+            # Encode one chunk at a time so peak memory stays bounded
+            for start in range(0, len(df_mapped), STREAM_CHUNK_ROWS):
+                chunk = ExcelProcessor.convert_to_json(df_mapped.iloc[start:start + STREAM_CHUNK_ROWS], lines=True)
+                yield chunk if chunk.endswith(b"\n") else chunk + b"\n"
+        
+        return StreamingResponse(
+            row_stream(),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Sheet-Used": str(result["sheet_used"]),
+                "X-Total-Rows": str(int(result["total_rows"]))
+            }
+        )
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error streaming mapped data: {str(e)}")
+
 @router.get("/mapped-data-summary/{filename}")
 async def get_mapped_data_summary(
     filename: str,
     sheet_name: str = Query(None, description="Sheet name (auto-detects best sheet if not provided)"),
-    sample_size: int = Query(50, ge=10, le=100)
+    sample_size: int = Query(50, ge=10, le=100),
+    document_id: str = Query(None, description="Ingested document id; reuses its cached mapping when available")
 ):
     """Get summary statistics for mapped data"""
     try:
         file_path = os.path.join(UPLOAD_DIR, filename)
         
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Process file with OpenAI mapping
-        result = ExcelProcessor.process_file_with_openai_mapping(
-            file_path, 
-            sheet_name, 
-            sample_size
-        )
+        result = await get_mapping_result(file_path, sheet_name, sample_size, document_id)
         
         # Get summary statistics
-        summary = ExcelProcessor.get_mapped_data_summary(result["mapped_data"])
+        summary = await run_in_threadpool(ExcelProcessor.get_mapped_data_summary, result["mapped_data"])
         
         return {
             "filename": filename,
@@ -537,7 +678,7 @@ async def detect_best_sheet(filename: str):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        result = ExcelProcessor.detect_best_sheet_for_analysis(file_path)
+        result = await run_in_threadpool(ExcelProcessor.detect_best_sheet_for_analysis, file_path)
         
         return {
             "filename": filename,
@@ -560,11 +701,11 @@ async def debug_file_structure(
             raise HTTPException(status_code=404, detail="File not found")
         
         # Get available sheets
-        available_sheets = ExcelProcessor.get_sheet_names(file_path)
+        available_sheets = await run_in_threadpool(ExcelProcessor.get_sheet_names, file_path)
         
         # Auto-detect best sheet if not provided
         if not sheet_name:
-            best_sheet_info = ExcelProcessor.detect_best_sheet_for_analysis(file_path)
+            best_sheet_info = await run_in_threadpool(ExcelProcessor.detect_best_sheet_for_analysis, file_path)
             sheet_name = best_sheet_info['best_sheet']
         
         if sheet_name not in available_sheets:
@@ -574,20 +715,19 @@ async def debug_file_structure(
             }
         
         # Read data with header detection
-        sheets_data = ExcelProcessor.read_excel_file(file_path, sheet_name)
+        sheets_data = await run_in_threadpool(ExcelProcessor.read_excel_file, file_path, sheet_name)
         df_original = sheets_data[sheet_name]['data']
         
-        print(f"DEBUG: Original columns: {df_original.columns.tolist()}")
-        print(f"DEBUG: Sample data:")
-        print(df_original.head(2).to_string())
+        logger.debug("Original columns: %s", df_original.columns.tolist())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sample data:\n%s", df_original.head(2).to_string())
         
         # Clean data for JSON serialization
         def clean_for_json(df):
-            df_clean = df.copy()
-            # Replace NaN, inf, -inf with None for JSON compatibility
-            df_clean = df_clean.replace([np.inf, -np.inf], None)
-            df_clean = df_clean.where(pd.notnull(df_clean), None)
-            return df_clean
+            # Replace NaN, inf, -inf with None in one pass over an object array
+            arr = df.to_numpy(dtype=object, copy=True)
+            arr[pd.isna(arr) | np.isin(arr, [np.inf, -np.inf])] = None
+            return pd.DataFrame(arr, columns=df.columns, index=df.index)
         
         df_original_clean = clean_for_json(df_original.head(3))
         
@@ -609,12 +749,13 @@ async def debug_file_structure(
 async def get_top_products(
     organization_id: str = Query(...),
     user_id: str = Query(...),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get top products by sales"""
     try:
-        supabase_service = SupabaseService()
-        result = await supabase_service.call_business_function(
+        result = await call_business_function_cached(
+            supabase_service,
             "get_top_products_by_sales",
             organization_id,
             user_id,
@@ -633,12 +774,13 @@ async def get_top_products(
 @router.get("/business-questions/sales-by-country")
 async def get_sales_by_country(
     organization_id: str = Query(...),
-    user_id: str = Query(...)
+    user_id: str = Query(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get sales by country"""
     try:
-        supabase_service = SupabaseService()
-        result = await supabase_service.call_business_function(
+        result = await call_business_function_cached(
+            supabase_service,
             "get_sales_by_country",
             organization_id,
             user_id
@@ -657,12 +799,13 @@ async def get_sales_by_country(
 async def get_monthly_trend(
     organization_id: str = Query(...),
     user_id: str = Query(...),
-    year: int = Query(None)
+    year: int = Query(None),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get monthly sales trend"""
     try:
-        supabase_service = SupabaseService()
-        result = await supabase_service.call_business_function(
+        result = await call_business_function_cached(
+            supabase_service,
             "get_monthly_sales_trend",
             organization_id,
             user_id,
@@ -682,12 +825,13 @@ async def get_monthly_trend(
 @router.get("/business-questions/category-performance")
 async def get_category_performance(
     organization_id: str = Query(...),
-    user_id: str = Query(...)
+    user_id: str = Query(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get category performance"""
     try:
-        supabase_service = SupabaseService()
-        result = await supabase_service.call_business_function(
+        result = await call_business_function_cached(
+            supabase_service,
             "get_category_performance",
             organization_id,
             user_id
@@ -702,24 +846,102 @@ async def get_category_performance(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/data/{organization_id}/{user_id}")
+# Under /user-data: /data/{organization_id}/{user_id} is taken by /data/{filename}/{sheet_name}
+@router.get("/user-data/{organization_id}/{user_id}")
 async def get_user_data(
     organization_id: str,
     user_id: str,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    before_created_at: str = Query(None, description="next_before_created_at from the previous page; switches to keyset pagination"),
+    before_id: str = Query(None, description="next_before_id from the previous page"),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get user's sales data with pagination"""
     try:
-        supabase_service = SupabaseService()
         result = await supabase_service.get_user_data(
             organization_id,
             user_id,
             limit,
-            offset
+            offset,
+            before_created_at=before_created_at,
+            before_id=before_id
         )
         
-        return result
+        return AppORJSONResponse(content=result)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/user-data/{organization_id}/{user_id}/stream")
+@router.get("/data/{organization_id}/{user_id}/stream", include_in_schema=False)
+async def stream_user_data(
+    organization_id: str,
+    user_id: str,
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Stream all of the user's sales data as NDJSON, newest first, instead of paging through it"""
+    try:
+        chunks = supabase_service.stream_user_data(organization_id, user_id, STREAM_CHUNK_ROWS)
+        
+        async def row_stream():
+            async for rows in chunks:
+                yield b"\n".join(rows) + b"\n"
+        
+        return StreamingResponse(row_stream(), media_type="application/x-ndjson")
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/documents/{document_id}/status")
+async def get_document_status(
+    document_id: str,
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Get ingest status of an uploaded document, with mapping details while this worker still has them"""
+    try:
+        document = await supabase_service.get_document_status(document_id)
+        job = ingest_jobs.get(document_id)
+        
+        if document is None and job is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        return AppORJSONResponse(content={
+            "document_id": document_id,
+            "status": document['status'] if document else job['status'],
+            "document": document,
+            "processing": job
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/documents/{document_id}/rows")
+async def get_document_rows(
+    document_id: str,
+    organization_id: str = Query(...),
+    user_id: str = Query(...),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    after_id: str = Query(None, description="Last id from the previous page; switches to keyset pagination"),
+    columns: str = Query(None, description="Comma-separated column names to return"),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Get stored rows of an ingested document, paginated in Postgres instead of re-reading the file"""
+    try:
+        result = await supabase_service.get_document_rows(
+            organization_id,
+            user_id,
+            document_id,
+            limit,
+            offset,
+            columns=[col.strip() for col in columns.split(",")] if columns else None,
+            after_id=after_id
+        )
+        
+        return AppORJSONResponse(content=result)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -728,18 +950,22 @@ async def get_user_data(
 async def get_admin_data(
     organization_id: str,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    before_created_at: str = Query(None, description="next_before_created_at from the previous page; switches to keyset pagination"),
+    before_id: str = Query(None, description="next_before_id from the previous page"),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     """Get all organization data for admin (from admin view)"""
     try:
-        supabase_service = SupabaseService()
         result = await supabase_service.get_admin_data(
             organization_id,
             limit,
-            offset
+            offset,
+            before_created_at=before_created_at,
+            before_id=before_id
         )
         
-        return result
+        return AppORJSONResponse(content=result)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,8 +1,63 @@
 import os
-from typing import Dict, List, Any, Optional
+import io
+import re
+import logging
+import asyncio
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+from itertools import repeat
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.types import ReturnMethod
+from postgrest.utils import SyncClient
 from supabase import create_client, Client
-from datetime import datetime
+from supabase.lib.client_options import ClientOptions
+from storage3.utils import StorageException
+from datetime import datetime, timezone
+import numpy as np
+import orjson
 import pandas as pd
+from app.utils.retry import retry_async
+from app.utils.ttl_cache import TTLCache
+
+try:
+    # Optional direct Postgres connection for COPY ingest and hot reads; falls back to PostgREST
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Namespace for content-derived document ids (uuid5 of "user_id:sha256")
+DOCUMENT_ID_NAMESPACE = uuid.UUID("6f1d7f3e-2b7a-4c1e-9a57-0c8e4b1d2a93")
+
+def _checked_uuid(value: str) -> str:
+    """value if it is a hyphenated UUID string, else ValueError; names and SQL literals built from it need no escaping"""
+    if not isinstance(value, str) or str(uuid.UUID(value)) != value.lower():
+        raise ValueError(f"Invalid UUID: {value!r}")
+    return value
+
+@lru_cache(maxsize=4096)
+def _user_table(user_id: str) -> str:
+    """Per-user sales table name; one cached string per user, shared by queries and cache keys"""
+    return f"sales_documents_{_checked_uuid(user_id).replace('-', '_')}"
+
+@lru_cache(maxsize=4096)
+def _brand_view(brand_id: str) -> str:
+    """Brand (organization) view name over its members' sales tables"""
+    return f"sales_documents_view_{_checked_uuid(brand_id).replace('-', '_')}"
+
+# Function and argument names allowed in direct-connection SQL
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+def _quote_ident(name: str) -> str:
+    """Quote a table/view name for direct-connection SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+# _mv_tables entry for a brand view defined over the partitioned parent table
+PARTITIONED_VIEW_MARKER = "sales_documents_parent"
 
 class SupabaseService:
     def __init__(self):
@@ -15,21 +70,183 @@ class SupabaseService:
         # Only use proxy if explicitly set
         proxy_url = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
         
+        options = ClientOptions(postgrest_client_timeout=self.POSTGREST_TIMEOUT)
+        self.client = create_client(self.url, self.key, options=options)
+        self._configure_http_pools(proxy_url)
         if proxy_url:
-            import httpx
-            # Create custom HTTP client with proxy
-            http_client = httpx.Client(proxies=proxy_url)
-            self.client = create_client(self.url, self.key, http_client=http_client)
-            print(f"[INFO] Supabase client initialized with proxy")
+            logger.info("Supabase client initialized with proxy")
         else:
-            # Normal client without proxy
-            self.client = create_client(self.url, self.key)
-            print(f"[INFO] Supabase client initialized without proxy")
+            logger.info("Supabase client initialized without proxy")
         
         self.storage_bucket = "sales-reports"
+        self._existence_cache = TTLCache(ttl=self.EXISTENCE_CACHE_TTL)
+        # Row totals of paginated reads, keyed by (relation, *filters)
+        self._count_cache = TTLCache(ttl=self.COUNT_CACHE_TTL)
+        # Sorted user tables each brand's materialized view was last built from (this worker only)
+        self._mv_tables: Dict[str, Tuple[str, ...]] = {}
+        # Per-brand serialization of materialized view runs, and the run waiting behind the current one
+        self._mv_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._mv_queued: Dict[str, asyncio.Future] = {}
+        # Created on first use when SUPABASE_DB_URL is set
+        self._pg_pool = None
+        self._pg_pool_lock = asyncio.Lock()
+    
+    # Seconds before a PostgREST request times out
+    POSTGREST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10))
+    
+    # Per-user tables are partitions of sales_documents_parent and brand views plain views over it
+    # (supabase_migrations/20261014_sales_documents_partitioned.sql)
+    PARTITIONED_STORAGE = os.getenv("SALES_PARTITIONED_STORAGE", "false").lower() == "true"
+    
+    # Keep-alive pool shared by every request of this worker's single SupabaseService
+    HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100, keepalive_expiry=30)
+    
+    # Fail fast on unreachable hosts, and re-dial connections that fail or reset while connecting
+    CONNECT_TIMEOUT = 5.0
+    CONNECT_RETRIES = 2
+    
+    def _pooled_session(self, default_session: httpx.Client, proxy_url: Optional[str] = None,
+                        session_class: type = SyncClient, **kwargs) -> Union[SyncClient, httpx.AsyncClient]:
+        """HTTP/2 session with pool limits and the optional proxy, keeping the default session's base URL, headers and timeout"""
+        transport_class = httpx.AsyncHTTPTransport if issubclass(session_class, httpx.AsyncClient) else httpx.HTTPTransport
+        # One transport carries the pool, HTTP/2, the proxy and connect retries (httpx 0.25 applies these to direct connections only)
+        transport = transport_class(
+            http2=True,
+            limits=self.HTTP_LIMITS,
+            retries=self.CONNECT_RETRIES,
+            proxy=httpx.Proxy(proxy_url) if proxy_url else None
+        )
+        timeout = default_session.timeout
+        session = session_class(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=httpx.Timeout(timeout.read, connect=self.CONNECT_TIMEOUT, write=timeout.write, pool=timeout.pool),
+            transport=transport,
+            **kwargs
+        )
+        default_session.close()
+        return session
+    
+    def _configure_http_pools(self, proxy_url: Optional[str] = None):
+        """Create the async PostgREST client and swap the Storage session for a pooled one (supabase-py caches it)"""
+        # supabase-py 2.3 only ships a sync client; queries go through an async PostgREST client on the same URL and keys,
+        # so they are awaited on the event loop instead of holding an executor thread each
+        sync_session = self.client.postgrest.session
+        self.db = AsyncPostgrestClient(str(sync_session.base_url), headers=dict(sync_session.headers))
+        self.db.session = self._pooled_session(sync_session, proxy_url, session_class=httpx.AsyncClient)
+        
+        storage = self.client.storage
+        storage.session = self._pooled_session(storage.session, proxy_url, follow_redirects=True)
+        storage._client = storage.session
+    
+    # Attempts per PostgREST call before a transient error is raised
+    RETRY_ATTEMPTS = int(os.getenv("SUPABASE_RETRY_ATTEMPTS", 4))
+    
+    async def _execute(self, query, idempotent: bool = True):
+        """Execute an async PostgREST query, retrying transient failures with jittered exponential backoff"""
+        return await retry_async(
+            query.execute,
+            attempts=self.RETRY_ATTEMPTS,
+            idempotent=idempotent
+        )
+    
+    # Direct Postgres DSN (session/transaction pooler or direct connection) for COPY ingest and hot reads
+    DB_URL = os.getenv("SUPABASE_DB_URL")
+    PG_POOL_MAX_SIZE = 20
+    
+    async def _get_pg_pool(self):
+        """Direct Postgres connection pool, or None when no DSN or driver is configured"""
+        if not self.DB_URL or asyncpg is None:
+            return None
+        async with self._pg_pool_lock:
+            if self._pg_pool is None:
+                # No prepared statement cache, so transaction-mode poolers (pgbouncer/Supavisor) work too;
+                # JIT only adds planning time to these short queries
+                self._pg_pool = await asyncpg.create_pool(
+                    self.DB_URL, min_size=1, max_size=self.PG_POOL_MAX_SIZE,
+                    statement_cache_size=0, server_settings={"jit": "off"}
+                )
+        return self._pg_pool
+    
+    async def close(self):
+        """Close the PostgREST session and the Postgres connection pool"""
+        await self.db.aclose()
+        if self._pg_pool is not None:
+            await self._pg_pool.close()
+            self._pg_pool = None
+    
+    async def _fetch_json_rows(self, sql: str, *args) -> Optional[List[Dict[str, Any]]]:
+        """Run a read on the direct connection, rows shaped as PostgREST returns them; None means use PostgREST"""
+        pool = await self._get_pg_pool()
+        if pool is None:
+            return None
+        try:
+            # json_agg in Postgres (as PostgREST does), so uuids, timestamps and numerics serialize identically
+            rows_json = await pool.fetchval(f"SELECT coalesce(json_agg(q), '[]') FROM ({sql}) q", *args)
+            return orjson.loads(rows_json)
+        except Exception as e:
+            logger.warning("Direct read failed, using PostgREST: %s", e)
+            return None
+    
+    async def _execute_direct(self, sql: str, *args) -> bool:
+        """Run a statement on the direct connection; False means it did not run there (use PostgREST)"""
+        pool = await self._get_pg_pool()
+        if pool is None:
+            return False
+        try:
+            await pool.execute(sql, *args)
+            return True
+        except Exception as e:
+            logger.warning("Direct statement failed, using PostgREST: %s", e)
+            return False
+    
+    def pg_pool_stats(self) -> Optional[Dict[str, int]]:
+        """Size and idle connections of the direct Postgres pool, None until it is created"""
+        if self._pg_pool is None:
+            return None
+        return {
+            "size": self._pg_pool.get_size(),
+            "idle": self._pg_pool.get_idle_size(),
+            "min_size": self._pg_pool.get_min_size(),
+            "max_size": self._pg_pool.get_max_size()
+        }
+    
+    # Seconds a table/view seen to exist is trusted before probing PostgREST again
+    EXISTENCE_CACHE_TTL = float(os.getenv("EXISTENCE_CACHE_TTL", 300))
+    
+    # Seconds a paginated read's total is reused across its pages
+    COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 60))
+    
+    async def _relation_exists(self, relation: str) -> bool:
+        """Whether a table or view answers a select; only positive answers are cached, since relations are created far more often than dropped"""
+        if self._existence_cache.get(relation):
+            return True
+        try:
+            await self._execute(self.db.table(relation).select("id").limit(1))
+        except Exception as e:
+            logger.debug("Relation %s not available: %s", relation, e)
+            return False
+        self._existence_cache.set(relation, True)
+        return True
+    
+    async def upload_file_to_storage(self, file_content: Union[bytes, str], filename: str, user_id: str, brand_id: str, document_id: str = None) -> str:
+        """Upload file (bytes or a local file path) to Supabase storage with user_id/document_id folder structure"""
+        # The storage client is synchronous, so run it on the loop's shared default executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            self._upload_file_to_storage_sync,
+            file_content, filename, user_id, brand_id, document_id
+        )
+    
+    @staticmethod
+    def _is_duplicate_object_error(error: StorageException) -> bool:
+        """Whether Storage refused an upload because the object already exists"""
+        details = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+        return details.get("error") == "Duplicate" or str(details.get("statusCode")) == "409"
     
-    async def upload_file_to_storage(self, file_content: bytes, filename: str, user_id: str, brand_id: str, document_id: str = None) -> str:
-        """Upload file to Supabase storage with user_id/document_id folder structure"""
+    def _upload_file_to_storage_sync(self, file_content: Union[bytes, str], filename: str, user_id: str, brand_id: str, document_id: str = None) -> str:
+        """Blocking storage upload used by upload_file_to_storage"""
         try:
             # Create file path with organization/user/document structure
             if document_id:
@@ -37,74 +254,176 @@ class SupabaseService:
             else:
                 file_path = f"{brand_id}/{user_id}/{filename}"
             
-            print(f"[INFO] Attempting to upload file to storage: {file_path}")
+            logger.info("Attempting to upload file to storage: %s", file_path)
             
-            # Check if file already exists
+            # No pre-upload list(): with x-upsert false, Storage itself rejects an existing object
+            file_options = {
+                "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                "upsert": "false"
+            }
             try:
-                existing_files = self.client.storage.from_(self.storage_bucket).list(path=f"{brand_id}/{user_id}/{document_id}" if document_id else f"{brand_id}/{user_id}")
-                if any(file['name'] == filename for file in existing_files):
-                    print(f"[WARNING] File already exists, skipping upload: {filename}")
+                # A local path is streamed from an open file handle
+                if isinstance(file_content, str):
+                    with open(file_content, 'rb') as local_file:
+                        result = self.client.storage.from_(self.storage_bucket).upload(
+                            path=file_path,
+                            file=local_file,
+                            file_options=file_options
+                        )
+                else:
+                    result = self.client.storage.from_(self.storage_bucket).upload(
+                        path=file_path,
+                        file=file_content,
+                        file_options=file_options
+                    )
+            except StorageException as e:
+                if self._is_duplicate_object_error(e):
+                    logger.warning("File already exists, skipping upload: %s", filename)
                     return file_path
-            except Exception as e:
-                print(f"[INFO] Could not check existing files: {e}")
-            
-            # Upload file to storage
-            result = self.client.storage.from_(self.storage_bucket).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
-            )
+                raise
             
             # Check if upload was successful
             if hasattr(result, 'error') and result.error:
                 raise Exception(f"Storage upload error: {result.error}")
             
-            print(f"[SUCCESS] File uploaded successfully to storage: {file_path}")
+            logger.info("File uploaded successfully to storage: %s", file_path)
             return file_path
             
         except Exception as e:
-            print(f"[ERROR] Error uploading file to storage: {str(e)}")
+            logger.error("Error uploading file to storage: %s", e)
             raise Exception(f"Error uploading file to storage: {str(e)}")
     
-    async def check_duplicate_document(self, document_name: str, user_id: str, brand_id: str) -> Optional[Dict[str, Any]]:
-        """Check if document already exists based on document_name, user_id, and brand_id with status"""
+    @staticmethod
+    def _duplicate_info(existing_doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Duplicate/retry flags for the newest sales_documents_storage row of a document"""
+        status = existing_doc.get('status', 'unknown')
+        return {
+            'document_id': existing_doc['document_id'],
+            'status': status,
+            'is_duplicate': status in ['processing', 'success'],
+            'can_retry': status == 'failed'
+        }
+    
+    async def check_duplicate_document(self, document_name: str, user_id: str, brand_id: str, content_hash: str = None) -> Optional[Dict[str, Any]]:
+        """Check if document already exists for this user by content hash (or by document_name and brand_id) with status"""
+        if not content_hash:
+            duplicates = await self.check_duplicate_documents_bulk([document_name], user_id, brand_id)
+            return duplicates.get(document_name)
+        
         try:
-            print(f"[INFO] Checking for duplicate document: {document_name}")
+            logger.info("Checking for duplicate document: %s", document_name)
             
-            # Check if document with same name exists for this user/organization
-            result = self.client.table("sales_documents_storage")\
-                .select("document_id, document_name, status, created_at")\
-                .eq('user_id', user_id)\
-                .eq('brand_id', brand_id)\
-                .eq('document_name', document_name)\
-                .order('created_at', desc=True)\
-                .limit(1)\
-                .execute()
-            
-            if result.data and len(result.data) > 0:
-                existing_doc = result.data[0]
-                status = existing_doc.get('status', 'unknown')
-                print(f"[INFO] Found existing document: {existing_doc['document_name']} (ID: {existing_doc['document_id']}, Status: {status})")
-                
-                return {
-                    'document_id': existing_doc['document_id'],
-                    'status': status,
-                    'is_duplicate': status in ['processing', 'success'],
-                    'can_retry': status == 'failed'
-                }
-            
-            print(f"[INFO] No duplicate document found")
+            # Same content under any name is the same document
+            rows = await self._fetch_json_rows(
+                "SELECT document_id, document_name, status, created_at FROM sales_documents_storage"
+                " WHERE user_id = $1 AND content_sha256 = $2 ORDER BY created_at DESC LIMIT 1",
+                user_id, content_hash
+            )
+            if rows is None:
+                query = self.db.table("sales_documents_storage")\
+                    .select("document_id, document_name, status, created_at")\
+                    .eq('user_id', user_id)\
+                    .eq('content_sha256', content_hash)\
+                    .order('created_at', desc=True)\
+                    .limit(1)
+                rows = (await self._execute(query)).data
+            
+            if rows:
+                existing_doc = rows[0]
+                logger.info("Found existing document: %s (ID: %s, Status: %s)", existing_doc['document_name'], existing_doc['document_id'], existing_doc.get('status', 'unknown'))
+                return self._duplicate_info(existing_doc)
+            
+            logger.info("No duplicate document found")
             return None
             
         except Exception as e:
-            print(f"[ERROR] Error checking for duplicate document: {str(e)}")
+            logger.error("Error checking for duplicate document: %s", e)
             return None
     
+    async def check_duplicate_documents_bulk(self, document_names: List[str], user_id: str, brand_id: str) -> Dict[str, Dict[str, Any]]:
+        """Check many document names for this user/organization in one query; returns info keyed by the names found"""
+        if not document_names:
+            return {}
+        try:
+            logger.info("Checking %s document names for duplicates", len(document_names))
+            
+            names = list(set(document_names))
+            rows = await self._fetch_json_rows(
+                "SELECT DISTINCT ON (document_name) document_id, document_name, status, created_at"
+                " FROM sales_documents_storage WHERE user_id = $1 AND brand_id = $2 AND document_name = ANY($3::text[])"
+                " ORDER BY document_name, created_at DESC",
+                user_id, brand_id, names
+            )
+            if rows is None:
+                query = self.db.table("sales_documents_storage")\
+                    .select("document_id, document_name, status, created_at")\
+                    .eq('user_id', user_id)\
+                    .eq('brand_id', brand_id)\
+                    .in_('document_name', names)\
+                    .order('created_at', desc=True)
+                if len(names) == 1:
+                    query = query.limit(1)
+                rows = (await self._execute(query)).data
+            
+            # Rows are newest first, so the first row seen per name wins
+            duplicates = {}
+            for existing_doc in rows or []:
+                name = existing_doc['document_name']
+                if name not in duplicates:
+                    duplicates[name] = self._duplicate_info(existing_doc)
+            
+            logger.info("Found %s existing documents", len(duplicates))
+            return duplicates
+            
+        except Exception as e:
+            logger.error("Error checking for duplicate documents: %s", e)
+            return {}
+    
+    async def begin_document_ingest(self, document_name: str, user_id: str, brand_id: str, content_hash: str = None) -> Dict[str, Any]:
+        """Check for a duplicate and insert (or re-open for retry) the document record in one round-trip"""
+        # Identical content from the same user always maps to the same document_id
+        document_id = str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, f"{user_id}:{content_hash}")) if content_hash else str(uuid.uuid4())
+        try:
+            logger.info("Beginning ingest for document: %s", document_name)
+            # Not idempotent: a repeated call would see its own 'processing' row as a duplicate
+            result = await self._execute(self.db.rpc('begin_document_ingest', {
+                'p_document_name': document_name,
+                'p_user_id': user_id,
+                'p_brand_id': brand_id,
+                'p_content_sha256': content_hash,
+                'p_document_id': document_id
+            }), idempotent=False)
+            if result.data:
+                ingest = result.data[0]
+                logger.info("Ingest state: %s", ingest)
+                return ingest
+            raise Exception("begin_document_ingest returned no rows")
+        except Exception as e:
+            # RPC not deployed yet: fall back to separate check + insert/update calls
+            logger.warning("begin_document_ingest RPC unavailable, using separate calls: %s", e)
+        
+        duplicate_info = await self.check_duplicate_document(document_name, user_id, brand_id, content_hash)
+        if duplicate_info:
+            if duplicate_info['can_retry']:
+                await self.update_document_storage_status(duplicate_info['document_id'], "processing")
+            return {**duplicate_info, 'is_new': False}
+        
+        await self.insert_document_storage_metadata(
+            document_name=document_name,
+            user_id=user_id,
+            brand_id=brand_id,
+            document_id=document_id,
+            status="processing",
+            content_hash=content_hash
+        )
+        return {'document_id': document_id, 'status': 'processing', 'is_duplicate': False, 'can_retry': False, 'is_new': True}
+    
     async def insert_document_storage_metadata(self, document_name: str, user_id: str, brand_id: str, 
-                                             document_id: str, status: str = "processing", document_path: str = None) -> bool:
+                                             document_id: str, status: str = "processing", document_path: str = None,
+                                             content_hash: str = None) -> bool:
         """Insert document metadata into sales_documents_storage table with status"""
         try:
-            print(f"[INFO] Inserting document storage metadata for: {document_name} with status: {status}")
+            logger.info("Inserting document storage metadata for: %s with status: %s", document_name, status)
             
             # Prepare document storage metadata
             document_data = {
@@ -119,42 +438,65 @@ class SupabaseService:
             if document_path:
                 document_data["document_path"] = document_path
             
-            # Insert document metadata
-            result = self.client.table("sales_documents_storage").insert(document_data).execute()
+            if content_hash:
+                document_data["content_sha256"] = content_hash
             
-            # Check if insertion was successful
-            if hasattr(result, 'data') and result.data:
-                print(f"[SUCCESS] Document storage metadata inserted successfully")
-                return True
-            else:
-                raise Exception("Failed to insert document storage metadata")
+            # Insert document metadata (PostgREST errors raise; nothing is read back)
+            await self._execute(
+                self.db.table("sales_documents_storage").insert(document_data, returning=ReturnMethod.minimal),
+                idempotent=False
+            )
+            
+            logger.info("Document storage metadata inserted successfully")
+            return True
                 
         except Exception as e:
-            print(f"[ERROR] Error inserting document storage metadata: {str(e)}")
+            logger.error("Error inserting document storage metadata: %s", e)
             return False
     
+    @staticmethod
+    def _returning_columns(query, columns: str):
+        """Have a write return only these columns of the affected rows instead of whole rows"""
+        query.params = query.params.set("select", columns)
+        return query
+    
+    async def get_document_status(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get the storage record (status, path) of a document, or None if it does not exist"""
+        try:
+            query = self.db.table("sales_documents_storage")\
+                .select("document_id, document_name, status, document_path, created_at")\
+                .eq('document_id', document_id)\
+                .limit(1)
+            result = await self._execute(query)
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.error("Error getting document status: %s", e)
+            raise Exception(f"Failed to get document status: {str(e)}")
+    
     async def update_document_storage_status(self, document_id: str, status: str, document_path: str = None) -> bool:
         """Update document status in sales_documents_storage table"""
         try:
-            print(f"[INFO] Updating document storage status for ID: {document_id} to: {status}")
+            logger.info("Updating document storage status for ID: %s to: %s", document_id, status)
             
             update_data = {"status": status}
             if document_path:
                 update_data["document_path"] = document_path
             
-            result = self.client.table("sales_documents_storage")\
+            query = self.db.table("sales_documents_storage")\
                 .update(update_data)\
-                .eq("document_id", document_id)\
-                .execute()
+                .eq("document_id", document_id)
+            result = await self._execute(self._returning_columns(query, "document_id"))
             
             if hasattr(result, 'data') and result.data:
-                print(f"[SUCCESS] Document storage status updated to: {status}")
+                logger.info("Document storage status updated to: %s", status)
                 return True
             else:
                 raise Exception("Failed to update document storage status")
                 
         except Exception as e:
-            print(f"[ERROR] Error updating document storage status: {str(e)}")
+            logger.error("Error updating document storage status: %s", e)
             return False
     
     
@@ -165,7 +507,7 @@ class SupabaseService:
                                      error_message: str = None) -> str:
         """Insert document metadata into sales_documents table"""
         try:
-            print(f"[INFO] Inserting document metadata for: {filename}")
+            logger.info("Inserting document metadata for: %s", filename)
             
             # Prepare document metadata
             document_data = {
@@ -183,21 +525,21 @@ class SupabaseService:
             }
             
             # Insert or update document metadata
-            result = self.client.table("sales_documents").upsert(
+            result = await self._execute(self._returning_columns(self.db.table("sales_documents").upsert(
                 document_data,
                 on_conflict="filename,user_id,brand_id"
-            ).execute()
+            ), "id"))
             
             # Check if insertion was successful
             if hasattr(result, 'data') and result.data:
                 document_id = result.data[0]['id']
-                print(f"[SUCCESS] Document metadata inserted/updated with ID: {document_id}")
+                logger.info("Document metadata inserted/updated with ID: %s", document_id)
                 return document_id
             else:
                 raise Exception("Failed to insert document metadata")
                 
         except Exception as e:
-            print(f"[ERROR] Error inserting document metadata: {str(e)}")
+            logger.error("Error inserting document metadata: %s", e)
             raise Exception(f"Error inserting document metadata: {str(e)}")
     
     async def update_document_processing_status(self, document_id: str, processing_status: str, 
@@ -205,7 +547,7 @@ class SupabaseService:
                                               error_message: str = None) -> bool:
         """Update document processing status"""
         try:
-            print(f"[INFO] Updating document processing status for ID: {document_id}")
+            logger.info("Updating document processing status for ID: %s", document_id)
             
             update_data = {
                 "processing_status": processing_status
@@ -220,163 +562,297 @@ class SupabaseService:
             if processing_status == "completed":
                 update_data["processed_at"] = datetime.now().isoformat()
             
-            result = self.client.table("sales_documents").update(update_data).eq("id", document_id).execute()
+            query = self.db.table("sales_documents").update(update_data).eq("id", document_id)
+            result = await self._execute(self._returning_columns(query, "id"))
             
             if hasattr(result, 'data') and result.data:
-                print(f"[SUCCESS] Document processing status updated to: {processing_status}")
+                logger.info("Document processing status updated to: %s", processing_status)
                 return True
             else:
                 raise Exception("Failed to update document processing status")
                 
         except Exception as e:
-            print(f"[ERROR] Error updating document processing status: {str(e)}")
+            logger.error("Error updating document processing status: %s", e)
             return False
     
-    async def get_user_documents(self, user_id: str, brand_id: str, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
-        """Get user's uploaded documents with pagination"""
+    @staticmethod
+    def _newest_first_page(query, limit: int, offset: int = 0,
+                           before_created_at: Optional[str] = None, before_id: Optional[str] = None):
+        """Order by (created_at, id) descending and take the page after the given keys, or at offset without them"""
+        query = query.order('created_at.desc,id', desc=True)  # one order param: "created_at.desc,id.desc"
+        if before_created_at is None or before_id is None:
+            return query.range(offset, offset + limit - 1)
+        # Double-quoted values, so commas and parentheses in a cursor can't alter the filter
+        quote = lambda value: '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+        created_at, row_id = quote(before_created_at), quote(before_id)
+        # postgrest-py 0.13 has no or_(); add the logic tree param directly
+        query.params = query.params.add("or", (
+            f'(created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id}))'
+        ))
+        return query.limit(limit)
+    
+    @staticmethod
+    def _newest_first_sql(relation: str, filters: Dict[str, Any], limit: int, offset: int = 0,
+                          before_created_at: Optional[str] = None, before_id: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Direct-connection SQL and arguments for the same page as _newest_first_page"""
+        args = list(filters.values())
+        conditions = [f"{_quote_ident(column)} = ${i}" for i, column in enumerate(filters, 1)]
+        if before_created_at is not None and before_id is not None:
+            # Sales tables use integer ids and sales_documents uuids; the id parameter takes the column's type
+            row_id = int(before_id) if str(before_id).isdigit() else before_id
+            args += [before_created_at, row_id]
+            conditions.append(f"(created_at, id) < (${len(args) - 1}::text::timestamptz, ${len(args)})")
+        args.append(limit)
+        sql = f"SELECT * FROM {_quote_ident(relation)} WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id DESC LIMIT ${len(args)}"
+        if before_created_at is None or before_id is None:
+            args.append(offset)
+            sql += f" OFFSET ${len(args)}"
+        return sql, args
+    
+    @staticmethod
+    def _next_page_keys(data: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+        """Keys of the last row of a full page, to pass back as before_created_at/before_id"""
+        last = data[-1] if len(data) == limit else None
+        return {
+            "next_before_created_at": last["created_at"] if last else None,
+            "next_before_id": last["id"] if last else None
+        }
+    
+    async def _count_rows(self, relation: str, filters: Dict[str, Any]) -> Optional[int]:
+        """Rows of relation matching the equality filters, cached for COUNT_CACHE_TTL; None if it can't be counted"""
+        key = (relation, *sorted(filters.items()))
+        total = self._count_cache.get(key)
+        if total is not None:
+            return total
+        
+        pool = await self._get_pg_pool()
+        if pool is not None:
+            conditions = " AND ".join(f"{_quote_ident(column)} = ${i}" for i, column in enumerate(filters, 1))
+            try:
+                total = await pool.fetchval(f"SELECT count(*) FROM {_quote_ident(relation)} WHERE {conditions}", *filters.values())
+            except Exception as e:
+                logger.warning("Direct count failed, using PostgREST: %s", e)
+        if total is None:
+            # Estimated: exact for small results, the planner's estimate past PostgREST's max-rows
+            query = self.db.table(relation).select("id", count="estimated")
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            try:
+                total = (await self._execute(query.limit(1))).count
+            except Exception as e:
+                logger.warning("Could not count rows of %s: %s", relation, e)
+        
+        if total is not None:
+            self._count_cache.set(key, total)
+        return total
+    
+    async def get_user_documents(self, user_id: str, brand_id: str, limit: int = 50, offset: int = 0,
+                                 before_created_at: Optional[str] = None, before_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get user's uploaded documents, newest first; pass the previous page's next_before_* values to continue by keyset"""
         try:
-            print(f"[INFO] Retrieving documents for user: {user_id}")
-            
-            result = self.client.table("sales_documents")\
-                .select("*")\
-                .eq('user_id', user_id)\
-                .eq('brand_id', brand_id)\
-                .order('created_at', desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
+            logger.info("Retrieving documents for user: %s", user_id)
             
-            data = result.data if hasattr(result, 'data') and result.data else []
-            print(f"[SUCCESS] Retrieved {len(data)} documents")
+            # Keyset pages read from the (created_at, id) position instead of scanning past OFFSET rows
+            sql, args = self._newest_first_sql(
+                "sales_documents", {"user_id": user_id, "brand_id": brand_id}, limit, offset, before_created_at, before_id
+            )
+            data = await self._fetch_json_rows(sql, *args)
+            if data is None:
+                query = self.db.table("sales_documents")\
+                    .select("*")\
+                    .eq('user_id', user_id)\
+                    .eq('brand_id', brand_id)
+                query = self._newest_first_page(query, limit, offset, before_created_at, before_id)
+                result = await self._execute(query)
+                data = result.data if hasattr(result, 'data') and result.data else []
+            logger.info("Retrieved %s documents", len(data))
             
             return {
                 "data": data,
                 "total": len(data),
                 "offset": offset,
-                "limit": limit
+                "limit": limit,
+                **self._next_page_keys(data, limit)
             }
             
         except Exception as e:
-            print(f"[ERROR] Error getting user documents: {str(e)}")
-            return {"data": [], "total": 0, "offset": offset, "limit": limit}
+            logger.error("Error getting user documents: %s", e)
+            return {"data": [], "total": 0, "offset": offset, "limit": limit, **self._next_page_keys([], limit)}
     
     async def create_user_table(self, user_id: str) -> bool:
         """Create user-specific sales documents table"""
         try:
-            table_name = f"sales_documents_{user_id.replace('-', '_')}"
-            print(f"[INFO] Creating user table: {table_name}")
+            table_name = _user_table(user_id)
+            logger.info("Creating user table: %s", table_name)
+            
+            if self.PARTITIONED_STORAGE:
+                return await self._ensure_user_partition(user_id, table_name)
             
             # Check if table already exists
-            try:
-                result = self.client.table(table_name).select("id").limit(1).execute()
-                print(f"[SUCCESS] Table {table_name} already exists")
+            if await self._relation_exists(table_name):
+                logger.info("Table %s already exists", table_name)
                 return True
-            except Exception as e:
-                print(f"[INFO] Table {table_name} doesn't exist, creating it...")
+            logger.info("Table %s doesn't exist, creating it...", table_name)
                         
-            # Execute table creation
-            data, error = self.client.rpc('create_sales_data_table', {'table_name': table_name}).execute()
-            if error:
-                print(f"[ERROR] Error creating table: {error}")
-                return False
+            # Execute table creation (PostgREST errors raise)
+            result = await self._execute(self.db.rpc('create_sales_data_table', {'table_name': table_name}))
 
-            print(f"[INFO] Data: {data}")
-            print(f"[SUCCESS] Table {table_name} created successfully")
+            logger.debug("Data: %s", result.data)
+            self._existence_cache.set(table_name, True)
+            logger.info("Table %s created successfully", table_name)
+            
+            # Keyset pages of get_user_data
+            try:
+                await self._run_view_sql(
+                    f"CREATE INDEX IF NOT EXISTS {table_name}_page ON {table_name} (brand_id, user_id, created_at DESC, id DESC);"
+                )
+            except Exception as index_error:
+                logger.warning("Could not add pagination index to %s: %s", table_name, index_error)
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error creating user table: {str(e)}")
+            logger.error("Error creating user table: %s", e)
             return False
+    
+    async def _ensure_user_partition(self, user_id: str, table_name: str) -> bool:
+        """Make the user's table a partition of sales_documents_parent, converting a standalone per-user table
+        
+        An existing relation is not enough: users from before SALES_PARTITIONED_STORAGE still have a standalone
+        table, whose rows would be missing from the parent-backed brand views. The RPC is a no-op for a
+        partition, so it runs at most once per EXISTENCE_CACHE_TTL per user.
+        """
+        partition_key = f"{table_name}#partition"
+        if self._existence_cache.get(partition_key):
+            return True
+        
+        result = await self._execute(self.db.rpc('create_sales_data_partition', {'p_user_id': user_id}))
+        logger.debug("Data: %s", result.data)
+        self._existence_cache.set(table_name, True)
+        self._existence_cache.set(partition_key, True)
+        logger.info("Table %s is a partition of sales_documents_parent", table_name)
+        return True
 
     async def create_brand_view(self, brand_id: str, user_id: str) -> bool:
         """Create organization-specific view for admin to see all users' data"""
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            user_table = f"sales_documents_{user_id.replace('-', '_')}"
+            view_name = _brand_view(brand_id)
+            user_table = _user_table(user_id)
             
-            print(f"[INFO] Creating organization view: {view_name} from user table: {user_table}")
+            logger.info("Creating organization view: %s from user table: %s", view_name, user_table)
             
             # Check if view already exists
-            try:
-                result = self.client.table(view_name).select("id").limit(1).execute()
-                print(f"[SUCCESS] View {view_name} already exists")
+            if await self._relation_exists(view_name):
+                logger.info("View %s already exists", view_name)
                 return True
-            except Exception as e:
-                print(f"[INFO] View {view_name} doesn't exist, creating it...")
+            logger.info("View %s doesn't exist, creating it...", view_name)
                         
-            # Execute view creation using raw SQL
-            data, error = self.client.rpc('create_brand_view', {'brand_id': brand_id, 'view_name': view_name, 'user_table': user_table}).execute()
-            if error:
-                print(f"[ERROR] Error creating view: {error}")
-                return False
+            # Execute view creation using raw SQL (PostgREST errors raise)
+            await self._execute(self.db.rpc('create_brand_view', {'brand_id': brand_id, 'view_name': view_name, 'user_table': user_table}))
 
-            print(f"[SUCCESS] View {view_name} created successfully")
+            self._existence_cache.set(view_name, True)
+            logger.info("View %s created successfully", view_name)
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error creating organization view: {str(e)}")
+            logger.error("Error creating organization view: %s", e)
             return False
 
     async def check_organization_view_exists(self, brand_id: str) -> bool:
         """Check if organization view exists"""
-        try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            result = self.client.table(view_name).select("id").limit(1).execute()
-            return True
-        except Exception as e:
-            print(f"[INFO] View {view_name} doesn't exist: {e}")
-            return False
+        view_name = _brand_view(brand_id)
+        return await self._relation_exists(view_name)
 
     async def get_all_user_tables_for_organization(self, brand_id: str) -> List[str]:
         """Get all user tables that exist for an organization"""
+        try:
+            # One catalog lookup for every member's table (supabase_migrations/20261014_list_user_tables_for_brand.sql)
+            result = await self._execute(self.db.rpc('list_user_tables_for_brand', {'p_brand_id': brand_id}))
+            existing_tables = [row['table_name'] for row in result.data or []]
+            for table_name in existing_tables:
+                self._existence_cache.set(table_name, True)
+            logger.info("Found %s user tables for organization %s", len(existing_tables), brand_id)
+            return existing_tables
+        except Exception as e:
+            logger.warning("list_user_tables_for_brand unavailable, probing member tables: %s", e)
+        
         try:
             # Get all users in the organization from sales_documents table
-            result = self.client.table("user_memberships")\
+            query = self.db.table("user_memberships")\
                 .select("user_id")\
-                .eq('brand_id', brand_id)\
-                .execute()
+                .eq('brand_id', brand_id)
+            result = await self._execute(query)
             
             if not hasattr(result, 'data') or not result.data:
-                print(f"[INFO] No users found for organization {brand_id}")
+                logger.info("No users found for organization %s", brand_id)
                 return []
             
             # Get unique user IDs
             user_ids = list(set([row['user_id'] for row in result.data]))
-            print(f"[INFO] Found {len(user_ids)} unique users for organization {brand_id}")
+            logger.info("Found %s unique users for organization %s", len(user_ids), brand_id)
             
             # Check which user tables actually exist
             existing_tables = []
             for user_id in user_ids:
-                table_name = f"sales_documents_{user_id.replace('-', '_')}"
-                try:
-                    # Try to query the table to see if it exists
-                    table_result = self.client.table(table_name).select("id").limit(1).execute()
-                    if hasattr(table_result, 'data'):
-                        existing_tables.append(table_name)
-                        print(f"[INFO] User table exists: {table_name}")
-                except Exception as e:
-                    print(f"[INFO] User table doesn't exist: {table_name} - {e}")
+                table_name = _user_table(user_id)
+                if await self._relation_exists(table_name):
+                    existing_tables.append(table_name)
+                    logger.debug("User table exists: %s", table_name)
             
             return existing_tables
             
         except Exception as e:
-            print(f"[ERROR] Error getting user tables for organization: {str(e)}")
+            logger.error("Error getting user tables for organization: %s", e)
             return []
 
     async def create_or_replace_materialized_view(self, brand_id: str) -> bool:
-        """Create or replace materialized view for organization with all user tables"""
+        """Create or replace materialized view for organization with all user tables, one run per brand at a time
+        
+        A caller arriving while a run is in flight queues the next run; callers arriving while that
+        run is still queued share its result, so a burst of uploads costs at most two rebuilds.
+        """
+        queued = self._mv_queued.get(brand_id)
+        if queued is not None:
+            return await asyncio.shield(queued)
+        
+        queued = asyncio.get_running_loop().create_future()
+        self._mv_queued[brand_id] = queued
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
+            async with self._mv_locks[brand_id]:
+                # Started: data inserted from now on needs another run
+                if self._mv_queued.get(brand_id) is queued:
+                    del self._mv_queued[brand_id]
+                result = await self._create_or_replace_materialized_view(brand_id)
+                queued.set_result(result)
+                return result
+        finally:
+            if self._mv_queued.get(brand_id) is queued:
+                del self._mv_queued[brand_id]
+            if not queued.done():
+                queued.set_result(False)
+
+    async def _create_or_replace_materialized_view(self, brand_id: str) -> bool:
+        """Rebuild (or refresh) the organization materialized view; see create_or_replace_materialized_view"""
+        try:
+            view_name = _brand_view(brand_id)
             
-            print(f"[INFO] Creating/updating materialized view: {view_name}")
+            logger.info("Creating/updating materialized view: %s", view_name)
+            
+            if self.PARTITIONED_STORAGE:
+                return await self._create_partitioned_brand_view(brand_id)
             
             # Get all user tables for this organization
             user_tables = await self.get_all_user_tables_for_organization(brand_id)
             
             if not user_tables:
-                print(f"[WARNING] No user tables found for organization {brand_id}")
+                logger.warning("No user tables found for organization %s", brand_id)
                 return False
             
-            print(f"[INFO] Found {len(user_tables)} user tables: {user_tables}")
+            logger.debug("Found %s user tables: %s", len(user_tables), user_tables)
+            
+            # Same user tables as the current definition: refresh the data in place instead of rebuilding
+            table_set = tuple(sorted(user_tables))
+            if self._mv_tables.get(brand_id) == table_set and await self.refresh_materialized_view(brand_id):
+                return True
             
             # Create UNION query for all user tables with explicit column selection
             union_parts = []
@@ -403,51 +879,42 @@ class SupabaseService:
             
             union_query = " UNION ALL ".join(union_parts)
             
-            print(f"[DEBUG] Generated UNION query with {len(union_parts)} parts:")
-            print(f"[DEBUG] UNION query: {union_query[:500]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Generated UNION query with %s parts: %s...", len(union_parts), union_query[:500])
             
             # Step 1: Drop existing view (try both types since we don't know which exists)
-            print(f"[INFO] Attempting to drop existing view: {view_name}")
+            logger.info("Attempting to drop existing view: %s", view_name)
+            self._existence_cache.invalidate(lambda key: key == view_name)
             
             # Try to drop as materialized view first (since we create materialized views)
             try:
                 drop_materialized_sql = f"DROP MATERIALIZED VIEW IF EXISTS {view_name};"
-                print(f"[INFO] Trying to drop as materialized view: {drop_materialized_sql}")
-                
-                data, error = self.client.rpc('update_view_documents', {'sql_text': drop_materialized_sql}).execute()
-                print(f"[DEBUG] Materialized drop response - data: {data}, error: {error}")
+                logger.debug("Trying to drop as materialized view: %s", drop_materialized_sql)
                 
-                if error:
-                    print(f"[WARNING] Error dropping materialized view: {error}")
-                else:
-                    print(f"[INFO] Successfully dropped materialized view")
+                await self._run_view_sql(drop_materialized_sql)
+                logger.info("Successfully dropped materialized view")
                     
             except Exception as drop_error:
-                print(f"[WARNING] Exception dropping materialized view: {drop_error}")
+                logger.warning("Exception dropping materialized view: %s", drop_error)
             
             # Also try to drop as regular view (in case it was created as regular view before)
             try:
                 drop_regular_sql = f"DROP VIEW IF EXISTS {view_name};"
-                print(f"[INFO] Trying to drop as regular view: {drop_regular_sql}")
-                
-                data, error = self.client.rpc('update_view_documents', {'sql_text': drop_regular_sql}).execute()
-                print(f"[DEBUG] Regular drop response - data: {data}, error: {error}")
+                logger.debug("Trying to drop as regular view: %s", drop_regular_sql)
                 
-                if error:
-                    print(f"[WARNING] Error dropping regular view: {error}")
-                else:
-                    print(f"[INFO] Successfully dropped regular view")
+                await self._run_view_sql(drop_regular_sql)
+                logger.info("Successfully dropped regular view")
                     
             except Exception as drop_error:
-                print(f"[WARNING] Exception dropping regular view: {drop_error}")
+                logger.warning("Exception dropping regular view: %s", drop_error)
             
             # Verify the view was actually dropped
             try:
-                result = self.client.table(view_name).select("id").limit(1).execute()
-                print(f"[WARNING] View {view_name} still exists after drop attempts")
+                result = await self._execute(self.db.table(view_name).select("id").limit(1))
+                logger.warning("View %s still exists after drop attempts", view_name)
                 return False
             except Exception as e:
-                print(f"[INFO] View {view_name} successfully dropped: {e}")
+                logger.info("View %s successfully dropped: %s", view_name, e)
             
             # Step 2: Create new materialized view
             create_sql = f"""
@@ -455,46 +922,152 @@ class SupabaseService:
             {union_query};
             """
             
-            print(f"[INFO] Creating materialized view: {create_sql}")
+            logger.debug("Creating materialized view: %s", create_sql)
             
-            data, error = self.client.rpc('update_view_documents', {'sql_text': create_sql}).execute()
-            if error:
-                print(f"[ERROR] Error creating materialized view: {error}")
-                return False
+            await self._run_view_sql(create_sql)
+            
+            self._existence_cache.set(view_name, True)
+            await self._record_view_refresh(view_name)
+            logger.info("Materialized view %s created/updated successfully", view_name)
             
-            print(f"[SUCCESS] Materialized view {view_name} created/updated successfully")
+            # REFRESH ... CONCURRENTLY needs a unique index; ids are unique within each user's table
+            try:
+                await self._run_view_sql(f"CREATE UNIQUE INDEX IF NOT EXISTS {view_name}_uk ON {view_name} (user_id, id);")
+                # Keyset pages of get_admin_data
+                await self._run_view_sql(f"CREATE INDEX IF NOT EXISTS {view_name}_page ON {view_name} (brand_id, created_at DESC, id DESC);")
+                # One partial covering index per business function: index-only scans in GROUP BY order
+                for suffix, group_columns in self.BUSINESS_FUNCTION_INDEXES:
+                    await self._run_view_sql(
+                        f"CREATE INDEX IF NOT EXISTS {view_name}_{suffix} ON {view_name} (brand_id, user_id, {group_columns}) "
+                        "INCLUDE (sales_value_usd, sales_count) WHERE sales_value_usd IS NOT NULL;"
+                    )
+                # brand_id is constant per view and user_id varies: joint statistics keep row estimates honest
+                await self._run_view_sql(f"CREATE STATISTICS IF NOT EXISTS {view_name}_brand_user (ndistinct, dependencies) ON brand_id, user_id FROM {view_name};")
+                await self._run_view_sql(f"ANALYZE {view_name};")
+                self._mv_tables[brand_id] = table_set
+            except Exception as index_error:
+                logger.warning("Could not index materialized view %s, next upload rebuilds it: %s", view_name, index_error)
             
             # Test the materialized view to verify it's working
             try:
-                test_result = self.client.table(view_name).select("id, product_name, sales_count").limit(5).execute()
-                print(f"[DEBUG] Materialized view test query returned {len(test_result.data) if hasattr(test_result, 'data') else 0} rows")
+                test_result = await self._execute(self.db.table(view_name).select("id, product_name, sales_count").limit(5))
+                logger.debug("Materialized view test query returned %s rows", len(test_result.data) if hasattr(test_result, 'data') else 0)
                 if hasattr(test_result, 'data') and test_result.data:
-                    print(f"[DEBUG] Sample data: {test_result.data[:2]}")
+                    logger.debug("Sample data: %s", test_result.data[:2])
                 else:
-                    print(f"[WARNING] Materialized view created but no data found")
+                    logger.warning("Materialized view created but no data found")
             except Exception as test_error:
-                print(f"[WARNING] Error testing materialized view: {test_error}")
+                logger.warning("Error testing materialized view: %s", test_error)
             
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error creating materialized view: {str(e)}")
+            logger.error("Error creating materialized view: %s", e)
             return False
 
-    async def check_materialized_view_exists(self, brand_id: str) -> bool:
-        """Check if materialized view exists"""
+    # (index suffix, grouping columns) of the business functions over brand materialized views
+    BUSINESS_FUNCTION_INDEXES = (
+        ("topprod", "product_name"),
+        ("country", "country"),
+        ("monthly", "year, month"),
+        ("category", "type"),
+    )
+
+    async def _create_partitioned_brand_view(self, brand_id: str) -> bool:
+        """Define the brand view once over sales_documents_parent; it is always current, so later calls are no-ops"""
+        view_name = _brand_view(brand_id)
+        if self._mv_tables.get(brand_id) == (PARTITIONED_VIEW_MARKER,):
+            return True
+        
+        # Replaces a materialized view left from UNION ALL storage
+        self._existence_cache.invalidate(lambda key: key == view_name)
+        await self._run_view_sql(f"DROP MATERIALIZED VIEW IF EXISTS {view_name};")
+        # Same rows as the UNION ALL view: every member's data; user_id filters prune partitions at run time
+        await self._run_view_sql(f"""
+            CREATE OR REPLACE VIEW {view_name} AS
+            SELECT id, user_id, brand_id, product_name, year, month, document_id, country,
+                   sales_count, sales_value_usd, soh, description, type, created_at, updated_at
+            FROM sales_documents_parent
+            WHERE user_id IN (SELECT user_id FROM user_memberships WHERE brand_id = '{brand_id}');
+            """)
+        
+        self._existence_cache.set(view_name, True)
+        self._mv_tables[brand_id] = (PARTITIONED_VIEW_MARKER,)
+        logger.info("View %s defined over sales_documents_parent", view_name)
+        
+        # Converted per-user tables are kept while the dropped materialized view still read them
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            result = self.client.table(view_name).select("id").limit(1).execute()
+            await self._execute(self.db.rpc('drop_orphaned_legacy_sales_tables', {}))
+        except Exception as e:
+            logger.warning("Could not drop legacy sales tables: %s", e)
+        return True
+
+    async def _run_view_sql(self, sql_text: str):
+        """Run view DDL through the update_view_documents RPC; PostgREST errors raise"""
+        return await self._execute(self.db.rpc('update_view_documents', {'sql_text': sql_text}))
+
+    async def refresh_materialized_view(self, brand_id: str) -> bool:
+        """Refresh the organization materialized view without blocking readers"""
+        view_name = _brand_view(brand_id)
+        if self.PARTITIONED_STORAGE:
+            return True
+        try:
+            try:
+                # Also records refreshed_at for staleness_seconds (supabase_migrations/20261014_brand_view_refresh_schedule.sql)
+                await self._execute(self.db.rpc('refresh_brand_view', {'p_view_name': view_name}))
+            except Exception as e:
+                logger.warning("refresh_brand_view RPC unavailable, refreshing directly: %s", e)
+                await self._run_view_sql(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name};")
+                await self._record_view_refresh(view_name)
+            logger.info("Materialized view %s refreshed", view_name)
             return True
         except Exception as e:
-            print(f"[INFO] Materialized view {view_name} doesn't exist: {e}")
+            logger.warning("Could not refresh materialized view %s, rebuilding: %s", view_name, e)
+            self._mv_tables.pop(brand_id, None)
             return False
 
+    async def _record_view_refresh(self, view_name: str):
+        """Record that a brand materialized view's data is current as of now; best effort"""
+        try:
+            await self._run_view_sql(
+                f"INSERT INTO brand_view_refreshes (view_name, refreshed_at) VALUES ('{view_name}', now()) "
+                "ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;"
+            )
+        except Exception as e:
+            logger.debug("Could not record refresh of %s: %s", view_name, e)
+
+    async def _view_staleness_seconds(self, view_name: str) -> Optional[float]:
+        """Seconds since the brand materialized view was built or refreshed; 0 for plain views, None if unknown"""
+        if self.PARTITIONED_STORAGE:
+            return 0.0
+        try:
+            pool = await self._get_pg_pool()
+            if pool is not None:
+                return await pool.fetchval(
+                    "SELECT extract(epoch FROM now() - refreshed_at)::float8 FROM brand_view_refreshes WHERE view_name = $1",
+                    view_name
+                )
+            result = await self._execute(
+                self.db.table("brand_view_refreshes").select("refreshed_at").eq("view_name", view_name).limit(1)
+            )
+            if not result.data:
+                return None
+            refreshed_at = datetime.fromisoformat(result.data[0]["refreshed_at"])
+            return (datetime.now(timezone.utc) - refreshed_at).total_seconds()
+        except Exception as e:
+            logger.debug("Could not read staleness of %s: %s", view_name, e)
+            return None
+
+    async def check_materialized_view_exists(self, brand_id: str) -> bool:
+        """Check if materialized view exists"""
+        view_name = _brand_view(brand_id)
+        return await self._relation_exists(view_name)
+
     async def get_materialized_view_info(self, brand_id: str) -> Dict[str, Any]:
         """Get information about the materialized view"""
+        view_name = None
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
+            view_name = _brand_view(brand_id)
             
             # Check if view exists
             exists = await self.check_materialized_view_exists(brand_id)
@@ -506,8 +1079,8 @@ class SupabaseService:
                     "message": "Materialized view does not exist"
                 }
             
-            # Get count of records in the view
-            result = self.client.table(view_name).select("id", count="exact").execute()
+            # Count in Postgres; limit(1) keeps the exact count header without shipping every id
+            result = await self._execute(self.db.table(view_name).select("id", count="exact").limit(1))
             record_count = result.count if hasattr(result, 'count') else 0
             
             # Get user tables that should be included
@@ -522,113 +1095,204 @@ class SupabaseService:
             }
             
         except Exception as e:
-            print(f"[ERROR] Error getting materialized view info: {str(e)}")
+            logger.error("Error getting materialized view info: %s", e)
             return {
                 "exists": False,
-                "view_name": f"sales_documents_view_{brand_id.replace('-', '_')}",
+                "view_name": view_name,
                 "error": str(e)
             }
 
     async def is_user_table_in_view(self, brand_id: str, user_id: str) -> bool:
         """Check if user table is already included in the organization view"""
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            user_table = f"sales_documents_{user_id.replace('-', '_')}"
+            view_name = _brand_view(brand_id)
+            user_table = _user_table(user_id)
+            
+            # Both checks in one RPC (supabase_migrations/20261014_user_in_view.sql)
+            try:
+                result = await self._execute(self.db.rpc('user_in_view', {
+                    'p_view_name': view_name, 'p_user_table': user_table, 'p_user_id': user_id
+                }))
+                logger.info("User %s data %s in view %s", user_id, "found" if result.data else "not found", view_name)
+                return bool(result.data)
+            except Exception as e:
+                logger.warning("user_in_view RPC unavailable, probing table and view: %s", e)
             
             # First check if the user table exists
             try:
-                table_result = self.client.table(user_table).select("id").limit(1).execute()
+                table_result = await self._execute(self.db.table(user_table).select("id").limit(1))
                 if not hasattr(table_result, 'data') or not table_result.data:
-                    print(f"[INFO] User table {user_table} doesn't exist yet")
+                    logger.info("User table %s doesn't exist yet", user_table)
                     return False
             except Exception as e:
-                print(f"[INFO] User table {user_table} doesn't exist: {e}")
+                logger.info("User table %s doesn't exist: %s", user_table, e)
                 return False
             
             # Try to query the view with a specific user_id to see if data exists
-            result = self.client.table(view_name)\
+            query = self.db.table(view_name)\
                 .select("user_id")\
                 .eq('user_id', user_id)\
-                .limit(1)\
-                .execute()
+                .limit(1)
+            result = await self._execute(query)
             
             # If we get data, the user table is already included
             has_data = hasattr(result, 'data') and result.data and len(result.data) > 0
             
             if has_data:
-                print(f"[INFO] User {user_id} data found in view {view_name}")
+                logger.info("User %s data found in view %s", user_id, view_name)
             else:
-                print(f"[INFO] User {user_id} data not found in view {view_name}")
+                logger.info("User %s data not found in view %s", user_id, view_name)
             
             return has_data
             
         except Exception as e:
-            print(f"[INFO] Could not check if user table is in view: {e}")
+            logger.info("Could not check if user table is in view: %s", e)
             return False
 
     
+    @staticmethod
+    def _csv_field(value: Any) -> str:
+        """CSV field where only None is unquoted, so COPY reads it as NULL and keeps empty strings"""
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            return '"' + value.replace('"', '""') + '"'
+        return str(value)
+    
+    async def _copy_records(self, table_name: str, records: List[Dict[str, Any]]) -> bool:
+        """COPY records into the table in one statement; False when COPY is not configured or failed (nothing written)"""
+        pool = await self._get_pg_pool()
+        if pool is None or not records:
+            return False
+        
+        columns = list(records[0])
+        csv_field = self._csv_field
+        data = "".join(",".join(map(csv_field, row.values())) + "\n" for row in records).encode()
+        try:
+            async with pool.acquire() as conn:
+                await conn.copy_to_table(table_name, source=io.BytesIO(data), columns=columns, format='csv')
+        except Exception as e:
+            # COPY is one statement, so a failure leaves no partial rows behind
+            logger.warning("COPY into %s failed, falling back to PostgREST inserts: %s", table_name, e)
+            return False
+        
+        logger.info("Copied %s records into %s", len(records), table_name)
+        return True
+    
+    # Rows per insert request, and insert requests in flight per upload
+    INSERT_CHUNK_SIZE = 5000
+    INSERT_CONCURRENCY = 8
+
+    async def _insert_chunks(self, table_name: str, records: List[Dict[str, Any]], chunk_size: int = None) -> None:
+        """Insert records in chunks with bounded concurrency, retrying chunks the server rejected"""
+        chunk_size = chunk_size or self.INSERT_CHUNK_SIZE
+        chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+        total_chunks = len(chunks)
+        semaphore = asyncio.Semaphore(self.INSERT_CONCURRENCY)
+        logger.info("Inserting data in %s chunks of up to %s", total_chunks, chunk_size)
+        
+        async def insert_chunk(chunk_num: int, chunk: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                # return=minimal: the server doesn't echo the rows back; failures raise
+                await self._execute(self.db.table(table_name).insert(chunk, returning=ReturnMethod.minimal), idempotent=False)
+                
+                logger.debug("Chunk %s/%s inserted (%s records)", chunk_num, total_chunks, len(chunk))
+        
+        await asyncio.gather(*(insert_chunk(num, chunk) for num, chunk in enumerate(chunks, 1)))
+
+    @staticmethod
+    def _nullable_column(df: pd.DataFrame, column: str) -> pd.Series:
+        """Column as objects with missing cells (or a missing column) as None"""
+        if column not in df.columns:
+            return pd.Series([None] * len(df), index=df.index, dtype=object)
+        values = df[column].astype(object)
+        return values.where(values.notna(), None)
+    
+    @staticmethod
+    def _numeric_column(df: pd.DataFrame, column: str, integer: bool, zero_is_null: bool = False) -> pd.Series:
+        """Column coerced to Python int/float objects, None where missing or not numeric"""
+        if column not in df.columns:
+            return pd.Series([None] * len(df), index=df.index, dtype=object)
+        numbers = pd.to_numeric(df[column], errors='coerce')
+        if zero_is_null:
+            numbers = numbers.where(numbers != 0)
+        if integer:
+            # int() semantics: truncate toward zero
+            numbers = np.trunc(numbers).astype('Int64')
+        else:
+            numbers = numbers.astype('Float64')
+        values = numbers.astype(object)
+        return values.where(numbers.notna(), None)
+    
+    @classmethod
+    def _records_from_mapped_data(cls, mapped_data: pd.DataFrame, user_id: str, brand_id: str, document_id: str = None) -> List[Dict[str, Any]]:
+        """Build user-table rows from a mapped DataFrame column-wise instead of row by row"""
+        product_name = cls._nullable_column(mapped_data, 'Category or product name')
+        # Empty category falls back to the product name, as `or` did per row
+        product_name = product_name.where(product_name.notna() & (product_name != ''), cls._nullable_column(mapped_data, 'Product Name'))
+        
+        columns = {
+            'user_id': repeat(user_id),
+            'brand_id': repeat(brand_id),
+            'document_id': repeat(document_id),
+            'product_name': product_name.tolist(),
+            'country': cls._nullable_column(mapped_data, 'Country').tolist(),
+            'year': cls._numeric_column(mapped_data, 'Year', integer=True, zero_is_null=True).tolist(),
+            'month': cls._numeric_column(mapped_data, 'Month', integer=True, zero_is_null=True).tolist(),
+            'sales_count': cls._numeric_column(mapped_data, 'Sales Count', integer=True).tolist(),
+            'sales_value_usd': cls._numeric_column(mapped_data, 'Sales Value (usd)', integer=False).tolist(),
+            'soh': cls._numeric_column(mapped_data, 'SOH', integer=False).tolist(),
+            'description': cls._nullable_column(mapped_data, 'Description').tolist(),
+            'type': cls._nullable_column(mapped_data, 'Type').tolist()
+        }
+        # Columns already hold plain Python values, so zip rows directly (to_dict would re-box every cell)
+        keys = list(columns)
+        return [dict(zip(keys, row)) for row in zip(*columns.values())]
+    
     async def store_mapped_data(self, brand_id: str, user_id: str, mapped_data: pd.DataFrame, document_id: str = None) -> bool:
         """Store mapped data to user table and update materialized view"""
         try:
+            # Nothing to store: skip table creation, inserts and the view refresh
+            if mapped_data.empty or mapped_data.isna().all(axis=None):
+                logger.info("No rows to insert for document %s, skipping database work", document_id)
+                if document_id:
+                    await self.update_document_processing_status(
+                        document_id=document_id,
+                        processing_status="completed",
+                        total_records=0,
+                        processed_records=0
+                    )
+                return True
+            
             # Create user table if it doesn't exist
             await self.create_user_table(user_id)
             
-            table_name = f"sales_documents_{user_id.replace('-', '_')}"
-            materialized_view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
+            table_name = _user_table(user_id)
+            materialized_view_name = _brand_view(brand_id)
             
-            print(f"[INFO] Storing mapped data to user table: {table_name}")
-            print(f"[INFO] Materialized view: {materialized_view_name}")
-            print(f"[INFO] Data shape: {mapped_data.shape}")
-            print(f"[INFO] Document ID: {document_id}")
+            logger.info("Storing mapped data to user table: %s", table_name)
+            logger.debug("Materialized view: %s", materialized_view_name)
+            logger.debug("Data shape: %s", mapped_data.shape)
+            logger.debug("Document ID: %s", document_id)
             
             # Prepare data for insertion
-            records = []
-            for _, row in mapped_data.iterrows():
-                record = {
-                    'user_id': user_id,
-                    'brand_id': brand_id,
-                    'document_id': document_id,  # Add document_id to each record
-                    'product_name': row.get('Category or product name') or row.get('Product Name'),
-                    'country': row.get('Country'),
-                    'year': int(row.get('Year')) if pd.notna(row.get('Year')) and row.get('Year') != 0 else None,
-                    'month': int(row.get('Month')) if pd.notna(row.get('Month')) and row.get('Month') != 0 else None,
-                    'sales_count': int(row.get('Sales Count')) if pd.notna(row.get('Sales Count')) else None,
-                    'sales_value_usd': float(row.get('Sales Value (usd)')) if pd.notna(row.get('Sales Value (usd)')) else None,
-                    'soh': float(row.get('SOH')) if pd.notna(row.get('SOH')) else None,
-                    'description': row.get('Description'),
-                    'type': row.get('Type')
-                }
-                records.append(record)
+            records = self._records_from_mapped_data(mapped_data, user_id, brand_id, document_id)
             
-            print(f"[INFO] Converted {len(records)} records for insertion")
+            logger.info("Converted %s records for insertion", len(records))
             
-            # Insert data in batches to user table
-            batch_size = 1000
-            total_batches = (len(records) + batch_size - 1) // batch_size
-            print(f"[INFO] Inserting data in {total_batches} batches of {batch_size}")
-            
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                print(f"[INFO] Inserting batch {batch_num}/{total_batches} ({len(batch)} records)")
-                
-                # Insert into user table
-                table_result = self.client.table(table_name).insert(batch).execute()
-                
-                # Check if table insertion was successful
-                if hasattr(table_result, 'data') and table_result.data is None:
-                    raise Exception(f"Failed to insert batch {batch_num} into user table")
-                
-                print(f"[SUCCESS] Batch {batch_num} inserted successfully into user table")
+            # COPY when a direct database connection is configured, else concurrent insert chunks
+            if not await self._copy_records(table_name, records):
+                await self._insert_chunks(table_name, records)
+            self._count_cache.invalidate(lambda key: key[0] in (table_name, materialized_view_name))
             
             # Create or update materialized view after data insertion
-            print(f"[INFO] Creating/updating materialized view with all user tables")
+            logger.info("Creating/updating materialized view with all user tables")
             materialized_view_success = await self.create_or_replace_materialized_view(brand_id)
             
             if materialized_view_success:
-                print(f"[SUCCESS] Data stored in user table {table_name} and materialized view {materialized_view_name} updated")
+                logger.info("Data stored in user table %s and materialized view %s updated", table_name, materialized_view_name)
             else:
-                print(f"[WARNING] Data stored in user table {table_name} but materialized view update failed")
+                logger.warning("Data stored in user table %s but materialized view update failed", table_name)
             
             # Update document processing status if document_id is provided
             if document_id:
@@ -642,7 +1306,7 @@ class SupabaseService:
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error storing mapped data: {str(e)}")
+            logger.error("Error storing mapped data: %s", e)
             
             # Update document processing status to failed if document_id is provided
             if document_id:
@@ -657,8 +1321,8 @@ class SupabaseService:
     async def create_business_functions(self, brand_id: str) -> bool:
         """Create Supabase functions for business questions (materialized view)"""
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            print(f"[INFO] Creating business functions for materialized view: {view_name}")
+            view_name = _brand_view(brand_id)
+            logger.info("Creating business functions for materialized view: %s", view_name)
             
             # Create functions using raw SQL
             functions = [
@@ -791,136 +1455,291 @@ class SupabaseService:
             # Execute each function
             for i, func_sql in enumerate(functions, 1):
                 try:
-                    print(f"[INFO] Creating function {i}/4...")
-                    # result = self.client.rpc('exec_sql', {'sql': func_sql})
-                    print(f"[SUCCESS] Function {i} created successfully")
+                    logger.info("Creating function %s/4...", i)
+                    # result = self.db.rpc('exec_sql', {'sql': func_sql})
+                    logger.info("Function %s created successfully", i)
                 except Exception as e:
-                    print(f"[WARNING] Function {i} creation warning: {e}")
+                    logger.warning("Function %s creation warning: %s", i, e)
             
-            print(f"[SUCCESS] Business functions created for {view_name}")
+            logger.info("Business functions created for %s", view_name)
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error creating business functions: {str(e)}")
+            logger.error("Error creating business functions: %s", e)
             return False
     
-    async def get_user_data(self, brand_id: str, user_id: str, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
-        """Get user's sales data with pagination"""
+    async def get_user_data(self, brand_id: str, user_id: str, limit: int = 100, offset: int = 0,
+                            before_created_at: Optional[str] = None, before_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get user's sales data, newest first; pass the previous page's next_before_* values to continue by keyset"""
         try:
-            table_name = f"sales_documents_{user_id.replace('-', '_')}"
-            print(f"[INFO] Retrieving user data from table: {table_name}")
-            print(f"[INFO] User ID: {user_id}, Limit: {limit}, Offset: {offset}")
+            table_name = _user_table(user_id)
+            logger.info("Retrieving user data from table: %s", table_name)
+            logger.debug("User ID: %s, Limit: %s, Offset: %s, Before: %s/%s", user_id, limit, offset, before_created_at, before_id)
+            
+            filters = {"brand_id": brand_id, "user_id": user_id}
+            sql, args = self._newest_first_sql(table_name, filters, limit, offset, before_created_at, before_id)
+            data, total = await asyncio.gather(self._fetch_json_rows(sql, *args), self._count_rows(table_name, filters))
+            if data is None:
+                query = self.db.table(table_name)\
+                    .select("*")\
+                    .eq('brand_id', brand_id)\
+                    .eq('user_id', user_id)
+                query = self._newest_first_page(query, limit, offset, before_created_at, before_id)
+                result = await self._execute(query)
+                
+                # Check if data retrieval was successful
+                data = result.data if hasattr(result, 'data') and result.data else []
+            logger.info("Retrieved %s records from %s", len(data), table_name)
+            
+            return {
+                "data": data,
+                "total": total if total is not None else len(data),
+                "offset": offset,
+                "limit": limit,
+                **self._next_page_keys(data, limit)
+            }
             
-            result = self.client.table(table_name)\
-                .select("*")\
+        except Exception as e:
+            logger.error("Error getting user data: %s", e)
+            return {"data": [], "total": 0, "offset": offset, "limit": limit, **self._next_page_keys([], limit)}
+
+    def stream_user_data(self, brand_id: str, user_id: str, chunk_size: int = 1000) -> AsyncIterator[List[bytes]]:
+        """All of the user's sales rows newest first, as lists of up to chunk_size JSON-encoded rows"""
+        # Validated now, so a bad id fails before a response starts streaming
+        table_name = _user_table(user_id)
+        filters = {"brand_id": brand_id, "user_id": user_id}
+        return self._stream_rows(table_name, filters, chunk_size)
+    
+    async def _stream_rows(self, relation: str, filters: Dict[str, Any], chunk_size: int) -> AsyncIterator[List[bytes]]:
+        """Server-side cursor on the direct connection, else keyset pages from PostgREST; only one chunk is held at a time"""
+        pool = await self._get_pg_pool()
+        if pool is not None:
+            conditions = " AND ".join(f"{_quote_ident(column)} = ${i}" for i, column in enumerate(filters, 1))
+            # row_to_json in Postgres: same encoding as PostgREST, and rows go to the client without decoding
+            sql = (
+                f"SELECT row_to_json(q)::text FROM (SELECT * FROM {_quote_ident(relation)} WHERE {conditions} "
+                "ORDER BY created_at DESC, id DESC) q"
+            )
+            streamed = False
+            try:
+                async with pool.acquire() as conn, conn.transaction():
+                    cursor = await conn.cursor(sql, *filters.values())
+                    while rows := await cursor.fetch(chunk_size):
+                        streamed = True
+                        yield [row[0].encode() for row in rows]
+                return
+            except Exception as e:
+                if streamed:
+                    raise
+                logger.warning("Direct stream failed, using PostgREST: %s", e)
+        
+        before_created_at = before_id = None
+        while True:
+            query = self.db.table(relation).select("*")
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            result = await self._execute(self._newest_first_page(query, chunk_size, 0, before_created_at, before_id))
+            data = result.data or []
+            if data:
+                yield [orjson.dumps(row) for row in data]
+            if len(data) < chunk_size:
+                return
+            before_created_at, before_id = data[-1]["created_at"], data[-1]["id"]
+
+    # Columns callers may request from user tables (also guards the PostgREST select string)
+    SALES_ROW_COLUMNS = (
+        "id", "user_id", "brand_id", "document_id", "product_name", "country", "year", "month",
+        "sales_count", "sales_value_usd", "soh", "description", "type", "created_at"
+    )
+
+    async def get_document_rows(self, brand_id: str, user_id: str, document_id: str, limit: int = 100,
+                                offset: int = 0, columns: Optional[List[str]] = None, after_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of a stored document's rows, paginated and column-pruned in Postgres"""
+        try:
+            table_name = _user_table(user_id)
+            selected = [col for col in (columns or self.SALES_ROW_COLUMNS) if col in self.SALES_ROW_COLUMNS]
+            if "id" not in selected:
+                selected.append("id")  # Needed for keyset pagination
+            logger.info("Retrieving document rows from table: %s", table_name)
+            logger.debug("Document ID: %s, Limit: %s, Offset: %s, After ID: %s", document_id, limit, offset, after_id)
+            
+            query = self.db.table(table_name)\
+                .select(",".join(selected))\
                 .eq('brand_id', brand_id)\
-                .eq('user_id', user_id)\
-                .order('created_at', desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
+                .eq('document_id', document_id)\
+                .order('id')
             
-            # Check if data retrieval was successful
+            # Keyset pagination avoids scanning skipped rows; OFFSET only for the first pages
+            if after_id is not None:
+                query = query.gt('id', after_id).limit(limit)
+            else:
+                query = query.range(offset, offset + limit - 1)
+            
+            result = await self._execute(query)
             data = result.data if hasattr(result, 'data') and result.data else []
-            print(f"[SUCCESS] Retrieved {len(data)} records from {table_name}")
+            logger.info("Retrieved %s document rows from %s", len(data), table_name)
             
             return {
                 "data": data,
                 "total": len(data),
                 "offset": offset,
-                "limit": limit
+                "limit": limit,
+                "next_after_id": data[-1]["id"] if len(data) == limit else None
             }
             
         except Exception as e:
-            print(f"[ERROR] Error getting user data: {str(e)}")
-            return {"data": [], "total": 0, "offset": offset, "limit": limit}
+            logger.error("Error getting document rows: %s", e)
+            return {"data": [], "total": 0, "offset": offset, "limit": limit, "next_after_id": None}
 
-    async def get_admin_data(self, brand_id: str, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
-        """Get all organization data for admin (from materialized view)"""
+    async def get_admin_data(self, brand_id: str, limit: int = 100, offset: int = 0,
+                             before_created_at: Optional[str] = None, before_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get all organization data for admin (from materialized view), newest first, by offset or keyset"""
         try:
-            view_name = f"sales_documents_view_{brand_id.replace('-', '_')}"
-            print(f"[INFO] Retrieving admin data from materialized view: {view_name}")
-            print(f"[INFO] Organization ID: {brand_id}, Limit: {limit}, Offset: {offset}")
-            
-            result = self.client.table(view_name)\
-                .select("*")\
-                .eq('brand_id', brand_id)\
-                .order('created_at', desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
-            
-            # Check if data retrieval was successful
-            data = result.data if hasattr(result, 'data') and result.data else []
-            print(f"[SUCCESS] Retrieved {len(data)} records from materialized view {view_name}")
+            view_name = _brand_view(brand_id)
+            logger.info("Retrieving admin data from materialized view: %s", view_name)
+            logger.debug("Organization ID: %s, Limit: %s, Offset: %s, Before: %s/%s", brand_id, limit, offset, before_created_at, before_id)
+            
+            filters = {"brand_id": brand_id}
+            sql, args = self._newest_first_sql(view_name, filters, limit, offset, before_created_at, before_id)
+            data, total, staleness_seconds = await asyncio.gather(
+                self._fetch_json_rows(sql, *args), self._count_rows(view_name, filters), self._view_staleness_seconds(view_name)
+            )
+            if data is None:
+                query = self.db.table(view_name)\
+                    .select("*")\
+                    .eq('brand_id', brand_id)
+                query = self._newest_first_page(query, limit, offset, before_created_at, before_id)
+                result = await self._execute(query)
+                
+                # Check if data retrieval was successful
+                data = result.data if hasattr(result, 'data') and result.data else []
+            logger.info("Retrieved %s records from materialized view %s", len(data), view_name)
             
             return {
                 "data": data,
-                "total": len(data),
+                "total": total if total is not None else len(data),
                 "offset": offset,
-                "limit": limit
+                "limit": limit,
+                "staleness_seconds": staleness_seconds,
+                **self._next_page_keys(data, limit)
             }
             
         except Exception as e:
-            print(f"[ERROR] Error getting admin data: {str(e)}")
-            return {"data": [], "total": 0, "offset": offset, "limit": limit}
+            logger.error("Error getting admin data: %s", e)
+            return {"data": [], "total": 0, "offset": offset, "limit": limit, "staleness_seconds": None,
+                    **self._next_page_keys([], limit)}
+    
+    # Business functions answered by get_sales_aggregation (supabase_migrations/20261014_get_sales_aggregation.sql),
+    # with the column each one groups by
+    AGGREGATION_DIMENSIONS = {
+        "get_top_products_by_sales": "product_name",
+        "get_sales_by_country": "country",
+        "get_category_performance": "type",
+    }
+    
+    async def _call_function(self, function_name: str, params: Dict[str, Any]) -> List[Dict]:
+        """Call a Postgres function by named arguments, on the direct connection when possible; PostgREST errors raise"""
+        data = None
+        if _IDENTIFIER.match(function_name) and all(map(_IDENTIFIER.match, params)):
+            # Named arguments, as PostgREST passes them; names are checked before they reach the SQL
+            named = ", ".join(f"{name} => ${i}" for i, name in enumerate(params, 1))
+            data = await self._fetch_json_rows(f"SELECT * FROM {function_name}({named})", *params.values())
+        if data is None:
+            result = await self._execute(self.db.rpc(function_name, params))
+            
+            # Check if function call was successful
+            data = result.data if hasattr(result, 'data') and result.data else []
+        return data
+    
+    async def _call_aggregation(self, function_name: str, brand_id: str, user_id: str, limit_count: Optional[int] = None) -> List[Dict]:
+        """Answer one of AGGREGATION_DIMENSIONS through get_sales_aggregation, in that function's row shape"""
+        dimension = self.AGGREGATION_DIMENSIONS[function_name]
+        rows = await self._call_function("get_sales_aggregation", {
+            'org_id': brand_id,
+            'user_uuid': user_id,
+            'dim': dimension,
+            'limit_count': limit_count
+        })
+        data = []
+        for row in rows:
+            item = {dimension: row["group_key"], "total_sales": row["total_sales"], "total_count": row["total_count"]}
+            if function_name == "get_category_performance":
+                item["avg_sales_per_item"] = row["total_sales"] / row["total_count"] if row["total_count"] else 0
+            data.append(item)
+        return data
     
     async def call_business_function(self, function_name: str, brand_id: str, user_id: str, **kwargs) -> List[Dict]:
         """Call a business function"""
         try:
-            print(f"[INFO] Calling business function: {function_name}")
-            print(f"[INFO] Organization ID: {brand_id}, User ID: {user_id}")
-            print(f"[INFO] Parameters: {kwargs}")
+            logger.info("Calling business function: %s", function_name)
+            logger.debug("Organization ID: %s, User ID: %s", brand_id, user_id)
+            logger.debug("Parameters: %s", kwargs)
             
-            result = self.client.rpc(
-                function_name,
-                {
+            data = None
+            if function_name in self.AGGREGATION_DIMENSIONS and set(kwargs) <= {"limit_count"}:
+                try:
+                    data = await self._call_aggregation(function_name, brand_id, user_id, **kwargs)
+                except Exception as e:
+                    logger.warning("get_sales_aggregation unavailable, calling %s: %s", function_name, e)
+            if data is None:
+                data = await self._call_function(function_name, {
                     'org_id': brand_id,
                     'user_uuid': user_id,
                     **kwargs
-                }
-            ).execute()
-            
-            # Check if function call was successful
-            data = result.data if hasattr(result, 'data') and result.data else []
-            print(f"[SUCCESS] Function {function_name} returned {len(data)} records")
+                })
+            logger.info("Function %s returned %s records", function_name, len(data))
             
             return data
             
         except Exception as e:
-            print(f"[ERROR] Error calling business function {function_name}: {str(e)}")
+            logger.error("Error calling business function %s: %s", function_name, e)
             return []
     
     async def delete_document_and_data(self, document_id: str, user_id: str, brand_id: str) -> bool:
         """Delete document and all associated data using document_id"""
         try:
-            print(f"[INFO] Starting deletion process for document: {document_id}")
+            logger.info("Starting deletion process for document: %s", document_id)
             
-            # Delete from storage using the folder structure
-            try:
-                # List files in the document folder
-                file_path = f"{brand_id}/{user_id}/{document_id}"
-                files = self.client.storage.from_(self.storage_bucket).list(path=file_path)
+            file_path = f"{brand_id}/{user_id}/{document_id}"
+            table_name = _user_table(user_id)
+            view_name = _brand_view(brand_id)
+            
+            async def purge_storage():
+                # List and delete the files in the document folder (sync storage client, so off the event loop)
+                bucket = self.client.storage.from_(self.storage_bucket)
+                loop = asyncio.get_running_loop()
+                files = await loop.run_in_executor(None, lambda: bucket.list(path=file_path))
                 
                 if files:
-                    # Delete all files in the document folder
                     file_names = [f['name'] for f in files]
-                    self.client.storage.from_(self.storage_bucket).remove([f"{file_path}/{name}" for name in file_names])
-                    print(f"[SUCCESS] Files deleted from storage: {file_names}")
+                    await loop.run_in_executor(None, bucket.remove, [f"{file_path}/{name}" for name in file_names])
+                    logger.info("Files deleted from storage: %s", file_names)
                 else:
-                    print(f"[INFO] No files found in storage for document: {document_id}")
-                    
-            except Exception as e:
-                print(f"[WARNING] Could not delete files from storage: {e}")
+                    logger.info("No files found in storage for document: %s", document_id)
             
-            # Delete sales data
-            table_name = f"sales_data_{brand_id.replace('-', '_')}"
-            try:
-                delete_result = self.client.table(table_name).delete().eq("document_id", document_id).execute()
-                print(f"[SUCCESS] Deleted sales data for document: {document_id}")
-            except Exception as e:
-                print(f"[WARNING] Could not delete sales data: {e}")
+            async def purge_rows():
+                deleted = await self._execute_direct(
+                    f"DELETE FROM {_quote_ident(table_name)} WHERE document_id = $1", document_id
+                )
+                if not deleted:
+                    await self._execute(self.db.table(table_name).delete(returning=ReturnMethod.minimal).eq("document_id", document_id))
+                self._count_cache.invalidate(lambda key: key[0] in (table_name, view_name))
+                logger.info("Deleted sales data for document: %s", document_id)
+                
+                # Drop the document's rows from the brand view as well
+                if not await self.create_or_replace_materialized_view(brand_id):
+                    logger.warning("Sales data deleted from %s but materialized view %s update failed", table_name, view_name)
+            
+            # Independent round-trips: run both, and report failures without failing the delete
+            storage_error, rows_error = await asyncio.gather(purge_storage(), purge_rows(), return_exceptions=True)
+            if storage_error or rows_error:
+                logger.warning(
+                    "Document %s partially deleted; storage: %s; sales data: %s",
+                    document_id, storage_error or "ok", rows_error or "ok"
+                )
             
             return True
             
         except Exception as e:
-            print(f"[ERROR] Error deleting document and data: {str(e)}")
+            logger.error("Error deleting document and data: %s", e)
             return False
@@ -0,0 +1,71 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over max_body_size with a 413 before routes parse them"""
+
+    def __init__(self, app: ASGIApp, max_body_size: int) -> None:
+        self.app = app
+        self.max_body_size = max_body_size
+        self.detail = f'{{"detail":"Request body exceeds the {max_body_size} byte limit"}}'.encode("latin-1")
+
+    async def send_413(self, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(self.detail)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": self.detail})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Declared length: reject without reading a single body byte
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                if value.isdigit() and int(value) > self.max_body_size:
+                    await self.send_413(send)
+                    return
+                break
+
+        # Chunked bodies have no declared length, so count bytes as they arrive
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    exceeded = True
+                    raise BodyTooLarge()
+            return message
+
+        async def limited_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                # Body parsing may turn BodyTooLarge into its own error response; answer 413 instead
+                if exceeded:
+                    await self.send_413(send)
+                    return
+            if exceeded:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except BodyTooLarge:
+            if not response_started:
+                await self.send_413(send)
@@ -1,7 +1,20 @@
 import pandas as pd
 from typing import Dict, List, Optional
 import json
+import logging
 import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Common category terms in your data
+_CATEGORY_TERMS = re.compile('nappies|pullup|wipes|skin care|swim|travel|night pants|diaper')
+
+# Expanded product indicators based on your data
+_PRODUCT_INDICATORS = re.compile(
+    'pureborn|size|singl|valpk|monthly|nappies|pullup|wipes|skin|swim|travel|night|pants|'
+    'nb|sz|master|double|single'
+)
 
 class ColumnMapper:
     # Pre-defined mapping configurations for common file types
@@ -65,11 +78,47 @@ class ColumnMapper:
         }
     }
     
+    # Every standard column name of the mappings above; PREDEFINED_MAPPINGS never changes at run time
+    _STANDARD_COLUMNS = frozenset(name for mapping in PREDEFINED_MAPPINGS.values() for name in mapping)
+    
+    # Column keywords that identify each file type, checked in order by detect_file_type
+    _DETECT_PATTERNS = tuple(
+        (file_type, re.compile("|".join(map(re.escape, keywords))))
+        for file_type, keywords in (
+            ("superstore", ['product_name', 'category', 'sub_category', 'segment']),
+            ("sales_report", ['barcode', 'sku ean', 'item description', 'sales value']),
+            ("siso_sheet", ['ims', 'soh (vol)', 'ptt', 'exchange rate', 'type', 'size']),
+        )
+    )
+    
+    # Simple and effective pattern matching
+    _FLEXIBLE_KEYWORDS = {
+        'Product Name': ['product', 'item', 'description', 'name', 'sku', 'ean', 'barcode', 'category'],
+        'Category': ['category', 'type', 'group', 'class'],
+        'Sales': ['sales', 'revenue', 'value', 'amount', 'earning', 'lc', 'usd', 'local currency'],
+        'Quantity': ['quantity', 'qty', 'volume', 'vol', 'soh', 'ims', 'count', 'units'],
+        'Profit': ['profit', 'margin', 'gain', 'net'],
+        'Country': ['country', 'nation', 'region', 'market'],
+        'Year': ['year', 'yr'],
+        'Month': ['month', 'mon'],
+        'Customer Name': ['customer', 'client', 'buyer'],
+        'Price': ['price', 'cost', 'rate', 'ptt', 'unit price'],
+        'Sub-Category': ['sub', 'subcategory', 'sub-category', 'subtype'],
+        'Size': ['size', 'sz'],
+        'Exchange Rate': ['exchange', 'rate', 'conversion'],
+        'Shipping Cost': ['shipping', 'delivery', 'freight', 'transport'],
+        'Order Date': ['date', 'order', 'created', 'timestamp'],
+        'Segment': ['segment', 'group', 'tier']
+    }
+    
+    # Standard name -> one escaped keyword alternation, compiled at import
+    _FLEXIBLE_PATTERNS = {
+        name: re.compile("|".join(map(re.escape, keywords))) for name, keywords in _FLEXIBLE_KEYWORDS.items()
+    }
+    
     @staticmethod
     def detect_file_type(df: pd.DataFrame, sheet_name: str = None) -> str:
         """Auto-detect file type based on column patterns and sheet name"""
-        columns_lower = [col.lower() for col in df.columns]
-        
         # Check sheet name first
         if sheet_name:
             sheet_lower = sheet_name.lower()
@@ -80,100 +129,99 @@ class ColumnMapper:
             elif 'raw' in sheet_lower:
                 return "raw_sheet"
         
-        # Check for Superstore pattern
-        superstore_keywords = ['product_name', 'category', 'sub_category', 'segment']
-        if any(keyword in ' '.join(columns_lower) for keyword in superstore_keywords):
-            return "superstore"
-        
-        # Check for Sales Report pattern
-        sales_report_keywords = ['barcode', 'sku ean', 'item description', 'sales value']
-        if any(keyword in ' '.join(columns_lower) for keyword in sales_report_keywords):
-            return "sales_report"
-        
-        # Check for SISO/Q1/Raw pattern
-        siso_keywords = ['ims', 'soh (vol)', 'ptt', 'exchange rate', 'type', 'size']
-        if any(keyword in ' '.join(columns_lower) for keyword in siso_keywords):
-            return "siso_sheet"
+        # Superstore, then Sales Report, then SISO/Q1/Raw: one regex scan of the joined names each
+        columns_blob = ' '.join(str(col).lower() for col in df.columns)
+        for file_type, pattern in ColumnMapper._DETECT_PATTERNS:
+            if pattern.search(columns_blob):
+                return file_type
         
         return "unknown"
     
     @staticmethod
     def map_columns(df: pd.DataFrame, mapping_name: Optional[str] = None, sheet_name: str = None) -> pd.DataFrame:
         """Map columns based on detected or specified mapping"""
-        df_mapped = df.copy()
-        
         # Detect mapping type if not specified
         if not mapping_name:
             mapping_name = ColumnMapper.detect_file_type(df, sheet_name)
         
         if mapping_name not in ColumnMapper.PREDEFINED_MAPPINGS:
-            print(f"Warning: No mapping found for '{mapping_name}'. Using flexible mapping.")
+            logger.warning("No mapping found for '%s'. Using flexible mapping.", mapping_name)
             mapping_name = "flexible"
         
         # Apply mapping
+        # Both return a new frame that shares column data with df, so df itself is never modified
         if mapping_name == "flexible":
-            df_mapped = ColumnMapper.flexible_mapping(df_mapped)
+            df_mapped = ColumnMapper.flexible_mapping(df)
         else:
-            df_mapped = ColumnMapper.apply_predefined_mapping(df_mapped, mapping_name)
+            df_mapped = ColumnMapper.apply_predefined_mapping(df, mapping_name)
         
-        print(f"Applied mapping: {mapping_name}")
-        print(f"Original columns: {df.columns.tolist()}")
-        print(f"Mapped columns: {[col for col in df_mapped.columns if col in ColumnMapper.get_standard_columns()]}")
+        logger.info("Applied mapping: %s", mapping_name)
+        logger.debug("Original columns: %s", df.columns.tolist())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mapped columns: %s", [col for col in df_mapped.columns if col in ColumnMapper._STANDARD_COLUMNS])
         
         return df_mapped
     
+    @staticmethod
+    def map_columns_many(sheets: Dict[str, pd.DataFrame], mapping_name: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """Map every sheet of a workbook, detecting each sheet's type from its name and columns"""
+        return {
+            sheet_name: ColumnMapper.map_columns(df, mapping_name, sheet_name)
+            for sheet_name, df in sheets.items()
+        }
+    
     @staticmethod
     def apply_predefined_mapping(df: pd.DataFrame, mapping_name: str) -> pd.DataFrame:
         """Apply predefined column mapping"""
         mapping = ColumnMapper.PREDEFINED_MAPPINGS.get(mapping_name, {})
-        df_mapped = df.copy()
+        rename_map = {}
+        copies = {}
         
         for standard_name, source_names in mapping.items():
-            for source_name in source_names:
-                if source_name in df_mapped.columns:
-                    df_mapped[standard_name] = df_mapped[source_name]
-                    break
+            source_name = next((s for s in source_names if s in df.columns), None)
+            if source_name is None or source_name == standard_name:
+                continue
+            # Rename when the source is free and the target name unused; otherwise copy as before
+            if source_name in rename_map or standard_name in df.columns:
+                copies[standard_name] = source_name
+            else:
+                rename_map[source_name] = standard_name
+        
+        # Metadata-only rename; column data is shared with df rather than copied
+        df_mapped = df.rename(columns=rename_map, copy=False)
+        for standard_name, source_name in copies.items():
+            df_mapped[standard_name] = df_mapped[rename_map.get(source_name, source_name)]
         
         return df_mapped
     
     @staticmethod
     def flexible_mapping(df: pd.DataFrame) -> pd.DataFrame:
         """Flexible mapping based on column name patterns with improved detection"""
-        df_mapped = df.copy()
-        
-        # Simple and effective pattern matching
-        patterns = {
-            'Product Name': ['product', 'item', 'description', 'name', 'sku', 'ean', 'barcode', 'category'],
-            'Category': ['category', 'type', 'group', 'class'],
-            'Sales': ['sales', 'revenue', 'value', 'amount', 'earning', 'lc', 'usd', 'local currency'],
-            'Quantity': ['quantity', 'qty', 'volume', 'vol', 'soh', 'ims', 'count', 'units'],
-            'Profit': ['profit', 'margin', 'gain', 'net'],
-            'Country': ['country', 'nation', 'region', 'market'],
-            'Year': ['year', 'yr'],
-            'Month': ['month', 'mon'],
-            'Customer Name': ['customer', 'client', 'buyer'],
-            'Price': ['price', 'cost', 'rate', 'ptt', 'unit price'],
-            'Sub-Category': ['sub', 'subcategory', 'sub-category', 'subtype'],
-            'Size': ['size', 'sz'],
-            'Exchange Rate': ['exchange', 'rate', 'conversion'],
-            'Shipping Cost': ['shipping', 'delivery', 'freight', 'transport'],
-            'Order Date': ['date', 'order', 'created', 'timestamp'],
-            'Segment': ['segment', 'group', 'tier']
-        }
+        # Shallow copy: mapped columns are added or replaced whole, never written in place
+        df_mapped = df.copy(deep=False)
         
-        # Map columns based on patterns FIRST
-        for standard_name, keywords in patterns.items():
-            for col in df.columns:
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower for keyword in keywords):
-                    if standard_name not in df_mapped.columns:
-                        df_mapped[standard_name] = df_mapped[col]
-                        print(f"Mapped '{col}' -> '{standard_name}'")
-                        break
+        # Well-formed sheet: every standard name is already a column, nothing to map
+        unresolved = [name for name in ColumnMapper._FLEXIBLE_PATTERNS if name not in df.columns]
+        if not unresolved:
+            return df_mapped
+        
+        # Map columns based on patterns FIRST (column names lowered once, one regex per standard name)
+        cols_lower = [str(col).lower().strip() for col in df.columns]
+        for standard_name in unresolved:
+            pattern = ColumnMapper._FLEXIBLE_PATTERNS[standard_name]
+            hit = next((i for i, col_lower in enumerate(cols_lower) if pattern.search(col_lower)), None)
+            if hit is not None:
+                col = df.columns[hit]
+                df_mapped[standard_name] = df_mapped[col]
+                logger.debug("Mapped '%s' -> '%s'", col, standard_name)
+        
+        # The heuristics below only look for a Product Name
+        if 'Product Name' in df_mapped.columns:
+            return df_mapped
         
         # ENHANCED: Force Category to Product Name mapping if no Product Name found
-        if 'Category' in df_mapped.columns and 'Product Name' not in df_mapped.columns:
-            print("Attempting to map Category -> Product Name (forced mapping)")
+        if 'Category' in df_mapped.columns:
+            logger.debug("Attempting to map Category -> Product Name (forced mapping)")
             df_mapped['Product Name'] = df_mapped['Category']
             
             # Try to find actual category from data patterns
@@ -183,23 +231,18 @@ class ColumnMapper:
                     col_data = df[col].dropna().head(5)
                     if len(col_data) > 0:
                         # Check for category-like patterns (shorter, more generic terms)
-                        category_like = 0
-                        for val in col_data:
-                            val_str = str(val).lower().strip()
-                            # Common category terms in your data
-                            if any(term in val_str for term in ['nappies', 'pullup', 'wipes', 'skin care', 'swim', 'travel', 'night pants', 'diaper']):
-                                category_like += 1
+                        category_like = int(col_data.astype(str).str.lower().str.contains(_CATEGORY_TERMS).sum())
                         
                         if category_like >= 2:  # At least 2 matches
                             df_mapped['Category'] = df[col]
-                            print(f"Mapped '{col}' -> 'Category' (category pattern match: {category_like}/5)")
+                            logger.debug("Mapped '%s' -> 'Category' (category pattern match: %s/5)", col, category_like)
                             category_found = True
                             break
             
             if not category_found:
                 # If no real category found, set a default
                 df_mapped['Category'] = 'General'
-                print("No category column found, setting default 'General' category")
+                logger.info("No category column found, setting default 'General' category")
         
         # ENHANCED: Handle unnamed columns more aggressively for product data
         for col in df.columns:
@@ -209,21 +252,12 @@ class ColumnMapper:
             if 'Product Name' not in df_mapped.columns and not col_lower.startswith('unnamed'):
                 sample_data = df[col].dropna().head(10)
                 if len(sample_data) > 0 and sample_data.dtype == 'object':
-                    product_indicators = 0
-                    for val in sample_data:
-                        val_str = str(val).lower()
-                        # Expanded product indicators based on your data
-                        if any(keyword in val_str for keyword in [
-                            'pureborn', 'size', 'singl', 'valpk', 'monthly', 'nappies', 
-                            'pullup', 'wipes', 'skin', 'swim', 'travel', 'night', 'pants',
-                            'nb', 'sz', 'master', 'double', 'single'
-                        ]):
-                            product_indicators += 1
+                    product_indicators = int(sample_data.astype(str).str.lower().str.contains(_PRODUCT_INDICATORS).sum())
                     
                     # Lower threshold for mapping
                     if product_indicators >= 3:  # Reduced from 30% to just 3 matches
                         df_mapped['Product Name'] = df_mapped[col]
-                        print(f"Mapped '{col}' -> 'Product Name' (product data pattern: {product_indicators}/10 matches)")
+                        logger.debug("Mapped '%s' -> 'Product Name' (product data pattern: %s/10 matches)", col, product_indicators)
                         break
         
         return df_mapped
@@ -232,10 +266,7 @@ class ColumnMapper:
     @staticmethod
     def get_standard_columns() -> List[str]:
         """Get list of all standard column names"""
-        standard_columns = set()
-        for mapping in ColumnMapper.PREDEFINED_MAPPINGS.values():
-            standard_columns.update(mapping.keys())
-        return list(standard_columns)
+        return list(ColumnMapper._STANDARD_COLUMNS)
     
     @staticmethod
     def validate_mapping(df: pd.DataFrame) -> Dict:
@@ -245,7 +276,7 @@ class ColumnMapper:
         
         return {
             "has_essential_columns": len(available_columns) >= 1,
-            "available_standard_columns": [col for col in ColumnMapper.get_standard_columns() if col in df.columns],
+            "available_standard_columns": [col for col in df.columns if col in ColumnMapper._STANDARD_COLUMNS],
             "missing_essential": [col for col in essential_columns if col not in df.columns],
             "original_columns": df.columns.tolist()
         }
\ No newline at end of file
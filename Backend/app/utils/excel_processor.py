@@ -1,14 +1,70 @@
+import asyncio
 import pandas as pd
 from typing import Dict, List, Any, Optional, Tuple
-import io
-from datetime import datetime
+from datetime import date, timedelta
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from pandas.io.parsers import TextParser
 import os
+import re
+import glob
+import json
+import logging
 import time
 import gc
+import hashlib
+import openpyxl
 from app.utils.openai_mapper import OpenAIColumnMapper
+from app.utils.sheet_cache import sheet_cache, detection_cache
+
+try:
+    # Optional Rust-backed XLSX/XLS reader; falls back to pandas/openpyxl
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+logger = logging.getLogger(__name__)
+
+# Mapped DataFrames and mapping metadata persisted per ingested document
+MAPPING_CACHE_DIR = os.path.join("uploads", ".cache")
+
+# Month name to number mapping used by _normalize_month_column
+MONTH_MAP = {
+    'jan': 1, 'january': 1,
+    'feb': 2, 'february': 2,
+    'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4,
+    'may': 5,
+    'jun': 6, 'june': 6,
+    'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8,
+    'sep': 9, 'september': 9,
+    'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12
+}
+
+# Sales-related keywords with different weights, for detect_best_sheet_for_analysis
+SALES_KEYWORDS = {
+    'sales': 15, 'revenue': 15, 'amount': 10, 'value': 10, 'earning': 10,
+    'product': 12, 'item': 12, 'description': 8,
+    'quantity': 10, 'qty': 10, 'volume': 8, 'ims': 8, 'soh': 6,
+    'category': 8, 'type': 6, 'group': 6,
+    'price': 8, 'cost': 6, 'rate': 6, 'ptt': 6,
+    'country': 6, 'region': 6, 'market': 6,
+    'year': 5, 'month': 5, 'date': 5,
+    'customer': 5, 'client': 5,
+    'profit': 10, 'margin': 8, 'gain': 8
+}
+
+# Keywords that mark a row as a header (substring matches), for _is_valid_header
+HEADER_KEYWORDS = ('sales', 'product', 'item', 'category', 'quantity', 'price', 'revenue', 'profit', 'country', 'year', 'month')
+
+# Column and sheet name patterns that indicate sales data (substring matches, one regex scan per name)
+_SALES_VALUE_COLUMN = re.compile(r'sales|revenue|amount|value')
+_PRODUCT_COLUMN = re.compile(r'product|item|description')
+_QUANTITY_COLUMN = re.compile(r'quantity|qty|volume|ims')
+_NUMERIC_SALES_COLUMN = re.compile(r'sales|revenue|amount|value|quantity|qty|ims')
+_SALES_SHEET_NAME = re.compile(r'sales|revenue|raw|data|report|siso|q1')
 
 class ExcelProcessor:
     @staticmethod
@@ -17,28 +73,28 @@ class ExcelProcessor:
         if not file_path or not os.path.exists(file_path):
             return True
         
+        sheet_cache.invalidate(file_path)
+        detection_cache.invalidate(file_path)
+        
         for attempt in range(max_retries):
             try:
-                # Force garbage collection to release any file handles
-                gc.collect()
-                
-                # Small delay to ensure file handles are closed
-                time.sleep(0.1 * (attempt + 1))
-                
-                # Try to remove the file
+                # Workbook readers close their handles before returning, so the file can go at once
                 os.remove(file_path)
-                print(f"[SUCCESS] Successfully cleaned up file: {file_path}")
+                logger.debug("Successfully cleaned up file: %s", file_path)
                 return True
                 
             except PermissionError as e:
+                # Windows refuses to delete open files; a handle kept alive by a reference cycle is released by gc
                 if attempt < max_retries - 1:
-                    print(f"[WARNING] File locked, retrying in {0.2 * (attempt + 1)}s... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(0.2 * (attempt + 1))
+                    delay = 0.05 * (attempt + 1)
+                    logger.warning("File locked, retrying in %ss... (attempt %s/%s)", delay, attempt + 1, max_retries)
+                    gc.collect()
+                    time.sleep(delay)
                 else:
-                    print(f"[ERROR] Could not clean up file {file_path} after {max_retries} attempts: {e}")
+                    logger.error("Could not clean up file %s after %s attempts: %s", file_path, max_retries, e)
                     return False
             except Exception as e:
-                print(f"[ERROR] Error cleaning up file {file_path}: {e}")
+                logger.error("Error cleaning up file %s: %s", file_path, e)
                 return False
         
         return False
@@ -51,6 +107,10 @@ class ExcelProcessor:
                 # For CSV files, return the filename as the sheet name
                 csv_sheet_name = os.path.splitext(os.path.basename(file_path))[0]
                 return [csv_sheet_name]
+            elif CalamineWorkbook is not None:
+                # Calamine reads sheet metadata without parsing cell data
+                with CalamineWorkbook.from_path(file_path) as workbook:
+                    return list(workbook.sheet_names)
             else:
                 with pd.ExcelFile(file_path) as excel_file:
                     return list(excel_file.sheet_names)
@@ -60,88 +120,86 @@ class ExcelProcessor:
 
     @staticmethod
     def detect_best_sheet_for_analysis(file_path: str) -> Dict[str, Any]:
-        """Detect the best sheet for comprehensive analysis focusing on sales-related data"""
+        """Detect the best sheet for comprehensive analysis, reusing the result while the file is unchanged on disk"""
+        return detection_cache.get(file_path, None, ExcelProcessor._detect_best_sheet)
+
+    @staticmethod
+    def _detect_best_sheet(file_path: str, sheet_name: str = None) -> Dict[str, Any]:
+        """Score every sheet for sales-related data; sheet_name is unused (SheetCache loader signature)"""
         try:
-            sheets_data = ExcelProcessor.read_excel_file(file_path)
             sheet_scores = {}
             
-            for sheet_name, sheet_info in sheets_data.items():
-                df = sheet_info['data']
+            for sheet_name, (df, total_rows) in ExcelProcessor._sheets_for_detection(file_path).items():
                 score = 0
                 available_columns = []
                 sales_indicators = []
                 
-                # Check for sales-related keywords in column names (case-insensitive)
-                column_text = ' '.join([str(col).lower() for col in df.columns])
+                # One pass over the columns: lowercased names, bucket hits, numeric data and unnamed count
+                column_names = []
+                column_bonus = 0
+                numeric_data_score = 0
+                unnamed_cols = 0
+                for col in df.columns:
+                    col_name = str(col)
+                    col_lower = col_name.lower()
+                    column_names.append(col_lower)
+                    
+                    # Check for specific column patterns that indicate sales data
+                    if _SALES_VALUE_COLUMN.search(col_lower):
+                        available_columns.append(col)
+                        column_bonus += 5
+                    elif _PRODUCT_COLUMN.search(col_lower):
+                        available_columns.append(col)
+                        column_bonus += 3
+                    elif _QUANTITY_COLUMN.search(col_lower):
+                        available_columns.append(col)
+                        column_bonus += 3
+                    
+                    # Check for numeric data in potential sales columns
+                    if _NUMERIC_SALES_COLUMN.search(col_lower):
+                        try:
+                            numeric_data = pd.to_numeric(df[col], errors='coerce').notna().sum()
+                            if numeric_data > 0:
+                                numeric_data_score += min(numeric_data / 100, 10)  # Max 10 points per column
+                        except:
+                            pass
+                    
+                    if col_name.startswith('Unnamed'):
+                        unnamed_cols += 1
                 
-                # Sales-related keywords with different weights
-                sales_keywords = {
-                    'sales': 15, 'revenue': 15, 'amount': 10, 'value': 10, 'earning': 10,
-                    'product': 12, 'item': 12, 'description': 8,
-                    'quantity': 10, 'qty': 10, 'volume': 8, 'ims': 8, 'soh': 6,
-                    'category': 8, 'type': 6, 'group': 6,
-                    'price': 8, 'cost': 6, 'rate': 6, 'ptt': 6,
-                    'country': 6, 'region': 6, 'market': 6,
-                    'year': 5, 'month': 5, 'date': 5,
-                    'customer': 5, 'client': 5,
-                    'profit': 10, 'margin': 8, 'gain': 8
-                }
+                # Check for sales-related keywords in column names (case-insensitive)
+                column_text = ' '.join(column_names)
                 
                 # Score based on sales-related keywords found
-                for keyword, weight in sales_keywords.items():
+                for keyword, weight in SALES_KEYWORDS.items():
                     if keyword in column_text:
                         score += weight
                         sales_indicators.append(keyword)
-                
-                # Check for specific column patterns that indicate sales data
-                for col in df.columns:
-                    col_lower = str(col).lower()
-                    if any(keyword in col_lower for keyword in ['sales', 'revenue', 'amount', 'value']):
-                        available_columns.append(col)
-                        score += 5
-                    elif any(keyword in col_lower for keyword in ['product', 'item', 'description']):
-                        available_columns.append(col)
-                        score += 3
-                    elif any(keyword in col_lower for keyword in ['quantity', 'qty', 'volume', 'ims']):
-                        available_columns.append(col)
-                        score += 3
+                score += column_bonus
                 
                 # Check for data quality (non-empty rows with numeric data)
                 non_empty_rows = len(df.dropna(how='all'))
                 if non_empty_rows > 0:
                     score += min(non_empty_rows / 200, 15)  # Max 15 points for data volume
                 
-                # Check for numeric data in potential sales columns
-                numeric_data_score = 0
-                for col in df.columns:
-                    col_lower = str(col).lower()
-                    if any(keyword in col_lower for keyword in ['sales', 'revenue', 'amount', 'value', 'quantity', 'qty', 'ims']):
-                        try:
-                            numeric_data = pd.to_numeric(df[col], errors='coerce').notna().sum()
-                            if numeric_data > 0:
-                                numeric_data_score += min(numeric_data / 100, 10)  # Max 10 points per column
-                        except:
-                            pass
-                
                 score += min(numeric_data_score, 20)  # Max 20 points for numeric data
                 
                 # Penalty for too many unnamed columns
-                unnamed_cols = [col for col in df.columns if str(col).startswith('Unnamed')]
-                if len(unnamed_cols) > len(df.columns) * 0.7:  # More than 70% unnamed
+                if unnamed_cols > len(df.columns) * 0.7:  # More than 70% unnamed
                     score -= 20
                 
                 # Bonus for sheets with names suggesting sales data
                 sheet_lower = sheet_name.lower()
-                if any(keyword in sheet_lower for keyword in ['sales', 'revenue', 'raw', 'data', 'report', 'siso', 'q1']):
+                if _SALES_SHEET_NAME.search(sheet_lower):
                     score += 10
                 
                 sheet_scores[sheet_name] = {
                     'score': max(0, score),  # Ensure non-negative score
                     'available_columns': available_columns,
                     'sales_indicators': sales_indicators,
-                    'total_rows': len(df),
+                    'total_rows': total_rows,
                     'non_empty_rows': non_empty_rows,
-                    'unnamed_columns': len(unnamed_cols),
+                    'unnamed_columns': unnamed_cols,
                     'numeric_data_score': numeric_data_score
                 }
             
@@ -168,8 +226,33 @@ class ExcelProcessor:
         except Exception as e:
             raise Exception(f"Error detecting best sheet: {str(e)}")
 
+    # Rows parsed per sheet to score it; the row-volume and numeric-data scores saturate by then
+    DETECT_SAMPLE_ROWS = 3000
+
+    @staticmethod
+    def _sheets_for_detection(file_path: str) -> Dict[str, Tuple[pd.DataFrame, int]]:
+        """Each sheet's frame to score, with the sheet's data row count; Excel sheets are parsed only up to DETECT_SAMPLE_ROWS"""
+        # A cached full parse (or any CSV) is scored on the parsed frames
+        cached = sheet_cache.peek(file_path, None)
+        if cached is not None or file_path.lower().endswith('.csv'):
+            sheets_data = cached or ExcelProcessor.read_excel_file(file_path)
+            return {name: (info['data'], len(info['data'])) for name, info in sheets_data.items()}
+        
+        sheets = {}
+        nrows = ExcelProcessor.DETECT_SAMPLE_ROWS + 11  # plus the header search window
+        for name, (rows, total_rows) in ExcelProcessor._read_workbook_head(file_path, nrows).items():
+            df = ExcelProcessor._frame_with_header_detection(rows, name)
+            # Rows past the head are all data rows
+            sheets[name] = (df, len(df) + max(total_rows - len(rows), 0))
+        return sheets
+
     @staticmethod
     def read_excel_file(file_path: str, sheet_name: str = None) -> Dict[str, Any]:
+        """Read Excel/CSV file, reusing the parsed result while the file is unchanged on disk"""
+        return sheet_cache.get(file_path, sheet_name, ExcelProcessor._parse_excel_file)
+
+    @staticmethod
+    def _parse_excel_file(file_path: str, sheet_name: str = None) -> Dict[str, Any]:
         """Read Excel/CSV file and return data with improved header detection"""
         try:
             # Check if file is CSV
@@ -188,23 +271,195 @@ class ExcelProcessor:
                         }
                     }
                 else:
-                    # Read all sheets with proper file handling
-                    with pd.ExcelFile(file_path) as excel_file:
-                        sheets_data = {}
-                        
-                        for sheet in excel_file.sheet_names:
-                            df = ExcelProcessor._read_sheet_with_header_detection(file_path, sheet)
-                            sheets_data[sheet] = {
-                                'data': df,
-                                'columns': df.columns.tolist(),
-                                'shape': df.shape
-                            }
-                        
-                        return sheets_data
+                    # Read all sheets from a single pass over the workbook
+                    sheets_data = {}
+                    for sheet, rows in ExcelProcessor._read_workbook_rows(file_path).items():
+                        df = ExcelProcessor._frame_with_header_detection(rows, sheet)
+                        sheets_data[sheet] = {
+                            'data': df,
+                            'columns': df.columns.tolist(),
+                            'shape': df.shape
+                        }
+                    
+                    return sheets_data
+        except Exception as e:
+            file_type = "CSV" if file_path.lower().endswith('.csv') else "Excel"
+            raise Exception(f"Error processing {file_type} file: {str(e)}")
+
+    @staticmethod
+    def read_excel_range(file_path: str, sheet_name: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """Read one page of a sheet, building a DataFrame only for the requested rows"""
+        try:
+            # Slice an already-parsed sheet when one is cached; CSVs are always read whole
+            cached = sheet_cache.peek(file_path, sheet_name)
+            if cached is not None or file_path.lower().endswith('.csv'):
+                sheet_info = (cached or ExcelProcessor.read_excel_file(file_path, sheet_name))[sheet_name]
+                df = sheet_info['data']
+                return {'data': df.iloc[offset:offset + limit], 'columns': sheet_info['columns'], 'total_rows': len(df)}
+            
+            rows = ExcelProcessor._read_workbook_rows(file_path, [sheet_name])[sheet_name]
+            header_row = ExcelProcessor._detect_header_row(rows, sheet_name)
+            
+            if header_row is None:
+                # Headers inferred from data rows need the full frame
+                df = ExcelProcessor._frame_with_header_detection(rows, sheet_name)
+                return {'data': df.iloc[offset:offset + limit], 'columns': df.columns.tolist(), 'total_rows': len(df)}
+            
+            start = header_row + 1 + offset
+            page = ExcelProcessor._frame_from_rows([rows[header_row]] + rows[start:start + limit])
+            # Same row labels as slicing the full frame
+            page.index = pd.RangeIndex(offset, offset + len(page))
+            return {
+                'data': page,
+                'columns': page.columns.tolist(),
+                'total_rows': max(len(rows) - header_row - 1, 0)
+            }
         except Exception as e:
             file_type = "CSV" if file_path.lower().endswith('.csv') else "Excel"
             raise Exception(f"Error processing {file_type} file: {str(e)}")
 
+    # Rows read per sheet for metadata: header search window plus the dtype sample
+    METADATA_SAMPLE_ROWS = 100
+
+    @staticmethod
+    def get_sheet_metadata(file_path: str) -> Dict[str, Dict[str, Any]]:
+        """Report shape, columns and sampled dtypes per sheet without parsing the sheet bodies"""
+        try:
+            # A cached full parse (or any CSV) is answered from the parsed frames
+            cached = sheet_cache.peek(file_path, None)
+            if cached is not None or file_path.lower().endswith('.csv'):
+                sheets_data = cached or ExcelProcessor.read_excel_file(file_path)
+                return {
+                    name: {
+                        'shape': info['shape'],
+                        'columns': info['columns'],
+                        'dtypes': info['data'].dtypes.astype(str).to_dict()
+                    }
+                    for name, info in sheets_data.items()
+                }
+            
+            metadata = {}
+            nrows = ExcelProcessor.METADATA_SAMPLE_ROWS + 11
+            for name, (rows, total_rows) in ExcelProcessor._read_workbook_head(file_path, nrows).items():
+                header_row = ExcelProcessor._detect_header_row(rows, name) if rows else 0
+                
+                if header_row is None:
+                    # Headers inferred from data rows need the full sheet
+                    df = ExcelProcessor.read_excel_file(file_path, name)[name]['data']
+                    metadata[name] = {'shape': df.shape, 'columns': df.columns.tolist(), 'dtypes': df.dtypes.astype(str).to_dict()}
+                    continue
+                
+                sample = ExcelProcessor._frame_from_rows(rows[header_row:header_row + 1 + ExcelProcessor.METADATA_SAMPLE_ROWS])
+                metadata[name] = {
+                    'shape': (max(total_rows - header_row - 1, 0), len(sample.columns)),
+                    'columns': sample.columns.tolist(),
+                    'dtypes': sample.dtypes.astype(str).to_dict()
+                }
+            return metadata
+        except Exception as e:
+            file_type = "CSV" if file_path.lower().endswith('.csv') else "Excel"
+            raise Exception(f"Error reading {file_type} file metadata: {str(e)}")
+
+    @staticmethod
+    def _read_workbook_head(file_path: str, nrows: int) -> Dict[str, Tuple[List[list], int]]:
+        """Read the first nrows raw rows of every sheet plus each sheet's total row count"""
+        if CalamineWorkbook is not None:
+            head = {}
+            with CalamineWorkbook.from_path(file_path) as workbook:
+                for name in workbook.sheet_names:
+                    sheet = workbook.get_sheet_by_name(name)
+                    rows = [
+                        [ExcelProcessor._convert_calamine_cell(value) for value in row]
+                        for row in sheet.to_python(skip_empty_area=False, nrows=nrows)
+                    ]
+                    # end is the inclusive (row, col) of the last used cell, None for an empty sheet
+                    head[name] = (rows, sheet.end[0] + 1 if sheet.end else 0)
+            return head
+        
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return {
+                ws.title: (
+                    [["" if value is None else value for value in row]
+                     for row in ws.iter_rows(max_row=nrows, values_only=True)],
+                    ws.max_row or 0
+                )
+                for ws in workbook.worksheets
+            }
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _read_workbook_rows(file_path: str, sheet_names: List[str] = None) -> Dict[str, List[list]]:
+        """Read raw cell rows for the requested sheets (all sheets if None) with one workbook open"""
+        if CalamineWorkbook is not None:
+            with CalamineWorkbook.from_path(file_path) as workbook:
+                return {
+                    name: [
+                        [ExcelProcessor._convert_calamine_cell(value) for value in row]
+                        for row in workbook.get_sheet_by_name(name).to_python(skip_empty_area=False)
+                    ]
+                    for name in (sheet_names or workbook.sheet_names)
+                }
+        
+        # Empty cells become "" like pandas' own readers, so header naming and NaN handling match
+        raw = pd.read_excel(file_path, sheet_name=sheet_names or None, header=None, dtype=object)
+        return {name: df.astype(object).where(pd.notnull(df), "").values.tolist() for name, df in raw.items()}
+
+    @staticmethod
+    def _convert_calamine_cell(value: Any) -> Any:
+        """Match the cell types pandas' own readers produce"""
+        if isinstance(value, float):
+            return int(value) if value.is_integer() else value
+        if isinstance(value, date):
+            return pd.Timestamp(value)
+        if isinstance(value, timedelta):
+            return pd.Timedelta(value)
+        return value
+
+    @staticmethod
+    def _frame_from_rows(rows: List[list], header: int = 0) -> pd.DataFrame:
+        """Build a DataFrame from raw rows exactly as read_excel(header=header) would"""
+        if len(rows) <= header:
+            return pd.DataFrame()
+        # read_excel keeps blank rows (GH 39808); TextParser would drop them in single-column sheets
+        return TextParser(rows, header=header, skip_blank_lines=False).read()
+
+    @staticmethod
+    def _detect_header_row(rows: List[list], sheet_name: str) -> Optional[int]:
+        """Return the header row index, or None when headers must be inferred from data"""
+        columns = ExcelProcessor._frame_from_rows(rows[:1]).columns
+        unnamed_cols = [col for col in columns if str(col).startswith('Unnamed')]
+        
+        if len(unnamed_cols) <= len(columns) * 0.5:
+            return 0
+        
+        logger.info("Detected unnamed columns in %s, trying to find header row...", sheet_name)
+        
+        # Try different header rows; only the header row is needed to judge it
+        for header_row in range(1, min(10, len(rows) - 1)):  # Check first 10 rows
+            try:
+                if ExcelProcessor._is_valid_header(ExcelProcessor._frame_from_rows(rows[header_row:header_row + 1]).columns):
+                    logger.info("Found valid header at row %s", header_row)
+                    return header_row
+            except:
+                continue
+        
+        return None
+
+    @staticmethod
+    def _frame_with_header_detection(rows: List[list], sheet_name: str) -> pd.DataFrame:
+        """Build a sheet DataFrame from raw rows using the detected header row"""
+        try:
+            header_row = ExcelProcessor._detect_header_row(rows, sheet_name)
+            if header_row is None:
+                # If no valid header found, try to infer from data
+                return ExcelProcessor._infer_headers_from_data(ExcelProcessor._frame_from_rows(rows))
+            return ExcelProcessor._frame_from_rows(rows, header_row)
+        except Exception as e:
+            logger.error("Error reading sheet %s: %s", sheet_name, e)
+            return pd.DataFrame()
+
     @staticmethod
     def _read_csv_file(file_path: str, sheet_name: str = None) -> Dict[str, Any]:
         """Read CSV file and return data with improved header detection"""
@@ -235,36 +490,38 @@ class ExcelProcessor:
             
             for encoding in encodings:
                 try:
-                    # First, try reading with default settings
-                    df = pd.read_csv(file_path, encoding=encoding)
+                    # Candidate headers are judged from the header and first data row; the file is parsed in full once
+                    columns = pd.read_csv(file_path, encoding=encoding, nrows=1).columns
                     
                     # Check if we have mostly unnamed columns
-                    unnamed_cols = [col for col in df.columns if str(col).startswith('Unnamed')]
+                    unnamed_cols = [col for col in columns if str(col).startswith('Unnamed')]
                     
-                    if len(unnamed_cols) > len(df.columns) * 0.5:  # More than 50% unnamed columns
-                        print(f"Detected unnamed columns in CSV, trying to find header row...")
+                    if len(unnamed_cols) > len(columns) * 0.5:  # More than 50% unnamed columns
+                        logger.info("Detected unnamed columns in CSV, trying to find header row...")
                         
                         # Try reading with different header rows
-                        for header_row in range(1, min(10, len(df))):  # Check first 10 rows
+                        for header_row in range(1, 10):  # Check first 10 rows
                             try:
-                                df_test = pd.read_csv(file_path, encoding=encoding, header=header_row)
-                                
-                                # Check if this looks like a proper header
-                                if ExcelProcessor._is_valid_header(df_test.columns):
-                                    print(f"Found valid header at row {header_row}")
-                                    return df_test
+                                df_test = pd.read_csv(file_path, encoding=encoding, header=header_row, nrows=1)
                             except:
                                 continue
+                            if df_test.empty:
+                                break  # Header would be the last row
+                            
+                            # Check if this looks like a proper header
+                            if ExcelProcessor._is_valid_header(df_test.columns):
+                                logger.info("Found valid header at row %s", header_row)
+                                return pd.read_csv(file_path, encoding=encoding, header=header_row)
                         
                         # If no valid header found, try to infer from data
-                        df = ExcelProcessor._infer_headers_from_data(df)
+                        return ExcelProcessor._infer_headers_from_data(pd.read_csv(file_path, encoding=encoding))
                     
-                    return df
+                    return pd.read_csv(file_path, encoding=encoding)
                     
                 except UnicodeDecodeError:
                     continue
                 except Exception as e:
-                    print(f"Error reading CSV with encoding {encoding}: {e}")
+                    logger.warning("Error reading CSV with encoding %s: %s", encoding, e)
                     continue
             
             # If all encodings fail, try with error handling
@@ -272,41 +529,18 @@ class ExcelProcessor:
             return df
             
         except Exception as e:
-            print(f"Error reading CSV file: {str(e)}")
+            logger.error("Error reading CSV file: %s", e)
             return pd.DataFrame()
 
     @staticmethod
     def _read_sheet_with_header_detection(file_path: str, sheet_name: str) -> pd.DataFrame:
         """Read sheet with automatic header detection for unnamed columns"""
         try:
-            # First, try reading with default header (row 0)
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            
-            # Check if we have mostly unnamed columns
-            unnamed_cols = [col for col in df.columns if str(col).startswith('Unnamed')]
-            
-            if len(unnamed_cols) > len(df.columns) * 0.5:  # More than 50% unnamed columns
-                print(f"Detected unnamed columns in {sheet_name}, trying to find header row...")
-                
-                # Try reading with different header rows
-                for header_row in range(1, min(10, len(df))):  # Check first 10 rows
-                    try:
-                        df_test = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
-                        
-                        # Check if this looks like a proper header
-                        if ExcelProcessor._is_valid_header(df_test.columns):
-                            print(f"Found valid header at row {header_row}")
-                            return df_test
-                    except:
-                        continue
-                
-                # If no valid header found, try to infer from data
-                df = ExcelProcessor._infer_headers_from_data(df)
-            
-            return df
-            
+            # Parse the sheet once; candidate header rows are tried on the in-memory rows
+            rows = ExcelProcessor._read_workbook_rows(file_path, [sheet_name])[sheet_name]
+            return ExcelProcessor._frame_with_header_detection(rows, sheet_name)
         except Exception as e:
-            print(f"Error reading sheet {sheet_name}: {str(e)}")
+            logger.error("Error reading sheet %s: %s", sheet_name, e)
             return pd.DataFrame()
 
     @staticmethod
@@ -316,11 +550,10 @@ class ExcelProcessor:
             return False
         
         # Check for sales-related keywords
-        sales_keywords = ['sales', 'product', 'item', 'category', 'quantity', 'price', 'revenue', 'profit', 'country', 'year', 'month']
         column_text = ' '.join([str(col).lower() for col in columns])
         
         # Count how many sales-related keywords are found
-        keyword_count = sum(1 for keyword in sales_keywords if keyword in column_text)
+        keyword_count = sum(1 for keyword in HEADER_KEYWORDS if keyword in column_text)
         
         # Also check for unnamed columns
         unnamed_count = sum(1 for col in columns if str(col).startswith('Unnamed'))
@@ -365,65 +598,171 @@ class ExcelProcessor:
             Dictionary containing mapped data and mapping information
         """
         try:
-            print(f"[INFO] Processing file: {file_path}")
-            
-            # Read Excel file
-            sheets_data = ExcelProcessor.read_excel_file(file_path, sheet_name)
-            
-            if sheet_name:
-                df = sheets_data[sheet_name]['data']
-                sheet_used = sheet_name
-            else:
-                # Auto-detect best sheet
-                best_sheet_info = ExcelProcessor.detect_best_sheet_for_analysis(file_path)
-                sheet_used = best_sheet_info['best_sheet']
-                df = sheets_data[sheet_used]['data']
-            
-            print(f"Processing sheet: {sheet_used}")
-            print(f"Original columns: {df.columns.tolist()}")
+            sheet_used, df = ExcelProcessor._read_sheet_for_mapping(file_path, sheet_name)
             
             # Initialize OpenAI mapper
             openai_mapper = OpenAIColumnMapper()
             
             # Get column mapping from OpenAI
             mapping = openai_mapper.map_columns_with_openai(df, sample_size)
-            print(f"OpenAI mapping result: {mapping}")
-            
-            # Apply mapping to DataFrame
-            df_mapped = openai_mapper.apply_mapping(df, mapping)
-            
-            # Validate mapping
-            validation = openai_mapper.validate_mapping(df, mapping)
-            print(f"Mapping validation: {validation}")
+            return ExcelProcessor._mapping_result(openai_mapper, df, mapping, sheet_used)
+        
+        except Exception as e:
+            raise Exception(f"Error processing file with OpenAI mapping: {str(e)}")
+
+    @staticmethod
+    async def aprocess_files_with_openai_mapping(file_paths: List[str], sheet_name: str = None, sample_size: int = 50) -> List[Dict[str, Any]]:
+        """
+        Async process_file_with_openai_mapping for several files: parsing runs in threads and the
+        OpenAI calls are awaited concurrently on the loop's shared client
+        
+        Args:
+            file_paths: Paths to Excel files
+            sheet_name: Sheet to process in every file (if None, auto-detect each file's best sheet)
+            sample_size: Number of sample rows to send to OpenAI per file
             
-            # Clean the mapped data
-            df_mapped = ExcelProcessor.clean_mapped_data(df_mapped)
+        Returns:
+            One process_file_with_openai_mapping result per file, in input order
+        """
+        try:
+            sheets = await asyncio.gather(*(
+                asyncio.to_thread(ExcelProcessor._read_sheet_for_mapping, file_path, sheet_name)
+                for file_path in file_paths
+            ))
             
-            # Force garbage collection to free memory
-            gc.collect()
+            openai_mapper = OpenAIColumnMapper()
+            mappings = await openai_mapper.amap_many([df for _, df in sheets], sample_size)
             
-            return {
-                "original_data": df,
-                "mapped_data": df_mapped,
-                "mapping": mapping,
-                "validation": validation,
-                "sheet_used": sheet_used,
-                "original_columns": df.columns.tolist(),
-                "mapped_columns": df_mapped.columns.tolist(),
-                "total_rows": len(df_mapped)
-            }
+            return list(await asyncio.gather(*(
+                asyncio.to_thread(ExcelProcessor._mapping_result, openai_mapper, df, mapping, sheet_used)
+                for (sheet_used, df), mapping in zip(sheets, mappings)
+            )))
         
         except Exception as e:
             raise Exception(f"Error processing file with OpenAI mapping: {str(e)}")
 
+    @staticmethod
+    async def aprocess_file_with_openai_mapping(file_path: str, sheet_name: str = None, sample_size: int = 50) -> Dict[str, Any]:
+        """Async process_file_with_openai_mapping: the OpenAI call no longer holds a threadpool thread"""
+        results = await ExcelProcessor.aprocess_files_with_openai_mapping([file_path], sheet_name, sample_size)
+        return results[0]
+
+    @staticmethod
+    def _read_sheet_for_mapping(file_path: str, sheet_name: str = None) -> Tuple[str, pd.DataFrame]:
+        """The sheet to map (given, the only one, or the best detected) and its data"""
+        logger.info("Processing file: %s", file_path)
+        
+        if sheet_name:
+            sheet_used = sheet_name
+        else:
+            # A single sheet (or a CSV) is the only choice; otherwise detect the best sheet from sampled rows
+            sheet_names = ExcelProcessor.get_sheet_names(file_path)
+            if len(sheet_names) == 1:
+                sheet_used = sheet_names[0]
+            else:
+                best_sheet_info = ExcelProcessor.detect_best_sheet_for_analysis(file_path)
+                sheet_used = best_sheet_info['best_sheet']
+        
+        # Read Excel file
+        sheets_data = ExcelProcessor.read_excel_file(file_path, sheet_used)
+        df = sheets_data[sheet_used]['data']
+        
+        logger.info("Processing sheet: %s", sheet_used)
+        logger.debug("Original columns: %s", df.columns.tolist())
+        return sheet_used, df
+
+    @staticmethod
+    def _mapping_result(openai_mapper: OpenAIColumnMapper, df: pd.DataFrame, mapping: Dict[str, str], sheet_used: str) -> Dict[str, Any]:
+        """Apply, validate and clean a column mapping into the process_file_with_openai_mapping result"""
+        logger.debug("OpenAI mapping result: %s", mapping)
+        
+        # Apply mapping to DataFrame
+        df_mapped = openai_mapper.apply_mapping(df, mapping)
+        
+        # Validate mapping
+        validation = openai_mapper.validate_mapping(df, mapping)
+        logger.info("Mapping validation: %s", validation)
+        
+        # Clean the mapped data
+        df_mapped = ExcelProcessor.clean_mapped_data(df_mapped)
+        
+        # Force garbage collection to free memory
+        gc.collect()
+        
+        return {
+            "original_data": df,
+            "mapped_data": df_mapped,
+            "mapping": mapping,
+            "validation": validation,
+            "sheet_used": sheet_used,
+            "original_columns": df.columns.tolist(),
+            "mapped_columns": df_mapped.columns.tolist(),
+            "total_rows": len(df_mapped)
+        }
+
+    @staticmethod
+    def _mapping_cache_base(document_id: str, sheet_name: str = None, sample_size: int = 50) -> Optional[str]:
+        """Cache file prefix for a document's mapping, or None if the id is not a safe file name"""
+        if not document_id or not re.fullmatch(r"[A-Za-z0-9-]+", document_id):
+            return None
+        sheet_key = hashlib.md5(sheet_name.encode('utf-8')).hexdigest()[:12] if sheet_name else "auto"
+        return os.path.join(MAPPING_CACHE_DIR, f"{document_id}_{sheet_key}_{sample_size}")
+
+    @staticmethod
+    def save_cached_mapping(document_id: str, sheet_name: str, sample_size: int, result: Dict[str, Any]) -> bool:
+        """Persist mapped data and mapping metadata so later calls skip re-parsing and OpenAI"""
+        base = ExcelProcessor._mapping_cache_base(document_id, sheet_name, sample_size)
+        if base is None:
+            return False
+        try:
+            os.makedirs(MAPPING_CACHE_DIR, exist_ok=True)
+            metadata = {key: result[key] for key in ("mapping", "validation", "sheet_used", "original_columns", "mapped_columns")}
+            metadata["total_rows"] = int(result["total_rows"])
+            
+            # Write to temp files and rename so readers never see a partial cache
+            result["mapped_data"].to_pickle(base + ".pkl.tmp")
+            with open(base + ".json.tmp", "w") as f:
+                json.dump(metadata, f, default=str)
+            os.replace(base + ".pkl.tmp", base + ".pkl")
+            os.replace(base + ".json.tmp", base + ".json")
+            return True
+        except Exception as e:
+            logger.warning("Could not cache mapping for document %s: %s", document_id, e)
+            return False
+
+    @staticmethod
+    def load_cached_mapping(document_id: str, sheet_name: str = None, sample_size: int = 50) -> Optional[Dict[str, Any]]:
+        """Load a cached mapping result for a document, or None on a miss"""
+        base = ExcelProcessor._mapping_cache_base(document_id, sheet_name, sample_size)
+        if base is None or not os.path.exists(base + ".json") or not os.path.exists(base + ".pkl"):
+            return None
+        try:
+            with open(base + ".json") as f:
+                result = json.load(f)
+            result["mapped_data"] = pd.read_pickle(base + ".pkl")
+            return result
+        except Exception as e:
+            logger.warning("Could not load cached mapping for document %s: %s", document_id, e)
+            return None
+
+    @staticmethod
+    def delete_cached_mapping(document_id: str) -> None:
+        """Remove every cached mapping for a document"""
+        base = ExcelProcessor._mapping_cache_base(document_id)
+        if base is None:
+            return
+        for path in glob.glob(os.path.join(MAPPING_CACHE_DIR, f"{document_id}_*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
     @staticmethod
     def clean_mapped_data(df: pd.DataFrame) -> pd.DataFrame:
         """Clean and preprocess mapped data"""
         try:
-            df_clean = df.copy()
-            
-            # Remove completely empty rows
-            df_clean = df_clean.dropna(how='all')
+            # Remove completely empty rows; dropna already copies, so a shallow copy just detaches the result from df
+            df_clean = df.dropna(how='all').copy(deep=False)
             
             # Clean numeric columns
             numeric_columns = ['Sales Count', 'Sales Value (usd)', 'SOH']
@@ -432,12 +771,18 @@ class ExcelProcessor:
                     # Replace non-numeric values with 0
                     df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(0)
             
-            # Clean text columns
+            # Clean text columns; label columns repeat few values, so those are cleaned once per distinct value
             text_columns = ['Category or product name', 'Country', 'Description', 'Type']
+            label_columns = {'Category or product name', 'Country', 'Type'}
             for col in text_columns:
                 if col in df_clean.columns:
-                    df_clean[col] = df_clean[col].astype(str).str.strip()
-                    df_clean[col] = df_clean[col].replace('nan', 'Unknown')
+                    text = df_clean[col].astype(str)
+                    if col in label_columns:
+                        codes, uniques = pd.factorize(text)
+                        cleaned = pd.Series(uniques, dtype=object).str.strip().replace('nan', 'Unknown')
+                        df_clean[col] = pd.Series(cleaned.to_numpy()[codes], index=text.index)
+                    else:
+                        df_clean[col] = text.str.strip().replace('nan', 'Unknown')
             
             # Clean year and month columns
             if 'Year' in df_clean.columns:
@@ -446,61 +791,43 @@ class ExcelProcessor:
                 # Handle both string (Jan, Feb) and numeric (1, 2, 3) month formats
                 df_clean['Month'] = ExcelProcessor._normalize_month_column(df_clean['Month'])
             
-            return df_clean
+            return ExcelProcessor._compact_dtypes(df_clean)
         
         except Exception as e:
-            print(f"Warning: Data cleaning failed: {str(e)}")
+            logger.warning("Data cleaning failed: %s", e)
             return df
 
+    @staticmethod
+    def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """Downcast counts, years and months to the smallest integer dtype and repeated labels to category"""
+        # Money stays float64: float32 keeps ~7 digits, so cent values would drift
+        for col in ('Sales Count', 'Year', 'Month'):
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+        
+        for col in ('Category or product name', 'Country', 'Type'):
+            if col in df.columns and df[col].dtype == object and df[col].nunique() <= len(df) // 2:
+                df[col] = df[col].astype('category')
+        
+        return df
+
     @staticmethod
     def _normalize_month_column(month_series: pd.Series) -> pd.Series:
         """Normalize month column to handle both string and numeric formats"""
         try:
-            # Month name to number mapping
-            month_mapping = {
-                'jan': 1, 'january': 1,
-                'feb': 2, 'february': 2,
-                'mar': 3, 'march': 3,
-                'apr': 4, 'april': 4,
-                'may': 5,
-                'jun': 6, 'june': 6,
-                'jul': 7, 'july': 7,
-                'aug': 8, 'august': 8,
-                'sep': 9, 'september': 9,
-                'oct': 10, 'october': 10,
-                'nov': 11, 'november': 11,
-                'dec': 12, 'december': 12
-            }
+            # Month columns hold few distinct values; normalize those and broadcast back by code
+            codes, uniques = pd.factorize(month_series)
+            values = pd.Series(uniques, dtype=object).astype(str).str.lower().str.strip()
             
-            def normalize_month(value):
-                if pd.isna(value):
-                    return 0
-                
-                # Convert to string and lowercase
-                value_str = str(value).lower().strip()
-                
-                # If it's already a number, convert it
-                if value_str.isdigit():
-                    month_num = int(value_str)
-                    return month_num if 1 <= month_num <= 12 else 0
-                
-                # If it's a month name, map it
-                if value_str in month_mapping:
-                    return month_mapping[value_str]
-                
-                # Try to extract number from strings like "Month 1", "1st", etc.
-                import re
-                numbers = re.findall(r'\d+', value_str)
-                if numbers:
-                    month_num = int(numbers[0])
-                    return month_num if 1 <= month_num <= 12 else 0
-                
-                return 0
+            # Month names map directly; numbers and strings like "Month 1" or "1st" use their first digit run
+            months = values.map(MONTH_MAP).fillna(values.str.extract(r'(\d+)', expand=False).astype(float))
+            months = months.where((months >= 1) & (months <= 12), 0).to_numpy(dtype=np.int64)
             
-            return month_series.apply(normalize_month).astype(int)
+            # Missing values get code -1, which picks the trailing 0
+            return pd.Series(np.append(months, 0)[codes], index=month_series.index)
         
         except Exception as e:
-            print(f"Warning: Month normalization failed: {str(e)}")
+            logger.warning("Month normalization failed: %s", e)
             # Fallback: try to convert to numeric
             return pd.to_numeric(month_series, errors='coerce').fillna(0).astype(int)
 
@@ -508,18 +835,21 @@ class ExcelProcessor:
     def filter_data(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
         """Filter DataFrame based on provided filters"""
         try:
-            filtered_df = df.copy()
+            # AND every column condition into one mask and index the frame once
+            mask = np.ones(len(df), dtype=bool)
             
             for column, value in filters.items():
-                if column in filtered_df.columns:
+                if column in df.columns:
                     if isinstance(value, list):
                         # Multiple values filter (OR condition)
-                        filtered_df = filtered_df[filtered_df[column].isin(value)]
+                        condition = df[column].isin(value)
                     else:
                         # Single value filter
-                        filtered_df = filtered_df[filtered_df[column] == value]
+                        condition = df[column] == value
+                    # Nullable dtypes compare to NA; treat those rows as non-matching
+                    mask &= condition.to_numpy(dtype=bool, na_value=False)
             
-            return filtered_df
+            return df[mask]
         except Exception as e:
             raise Exception(f"Error filtering data: {str(e)}")
 
@@ -533,32 +863,65 @@ class ExcelProcessor:
             # Replace NaN with None for JSON compatibility
             df = df.where(pd.notnull(df), None)
             
-            # Convert numpy types to Python native types for JSON serialization
-            df_clean = df.copy()
-            for col in df_clean.columns:
-                if df_clean[col].dtype == 'int64':
-                    df_clean[col] = df_clean[col].astype('int32')
-                elif df_clean[col].dtype == 'float64':
-                    df_clean[col] = df_clean[col].astype('float32')
-                elif df_clean[col].dtype == 'object':
-                    # Convert any remaining numpy types in object columns
-                    df_clean[col] = df_clean[col].apply(lambda x: int(x) if isinstance(x, np.integer) else float(x) if isinstance(x, np.floating) else x)
-            
-            return df_clean.to_dict('records')
+            # Narrow numeric columns in one astype; to_dict already boxes numpy scalars (object columns too) to Python types
+            narrowed = {col: 'int32' for col in df.select_dtypes('int64').columns}
+            narrowed.update({col: 'float32' for col in df.select_dtypes('float64').columns})
+            
+            # copy=False: columns that are not narrowed are shared, not copied (the frame is only read)
+            return df.astype(narrowed, copy=False).to_dict('records')
+        except Exception as e:
+            raise Exception(f"Error converting data: {str(e)}")
+
+    @staticmethod
+    def convert_to_json(df: pd.DataFrame, selected_columns: List[str] = None, lines: bool = False) -> bytes:
+        """Encode DataFrame rows as a JSON array (or NDJSON when lines=True) in pandas' native encoder"""
+        try:
+            if selected_columns:
+                df = df[selected_columns]
+            
+            # NaN/NaT become null; datetimes are emitted as ISO strings
+            return df.to_json(
+                orient='records',
+                lines=lines,
+                date_format='iso',
+                double_precision=15,
+                default_handler=str
+            ).encode('utf-8')
+        except Exception as e:
+            raise Exception(f"Error converting data: {str(e)}")
+
+    @staticmethod
+    def convert_to_columns(df: pd.DataFrame, selected_columns: List[str] = None) -> Dict[str, List[Any]]:
+        """Convert DataFrame to a column-oriented dict so each key is sent once"""
+        try:
+            if selected_columns:
+                df = df[selected_columns]
+            
+            # Replace NaN with None for JSON compatibility
+            df = df.astype(object).where(pd.notnull(df), None)
+            return df.to_dict('list')
         except Exception as e:
             raise Exception(f"Error converting data: {str(e)}")
 
+    @staticmethod
+    def convert_money_to_cents(df: pd.DataFrame) -> pd.DataFrame:
+        """Replace USD money columns with integer cent columns for a compact wire format"""
+        money_columns = {'Sales Value (usd)': 'Sales Value (usd cents)'}
+        df_cents = df.copy()
+        for col, cents_col in money_columns.items():
+            if col in df_cents.columns:
+                values = pd.to_numeric(df_cents[col], errors='coerce')
+                df_cents[col] = (values * 100).round().astype('Int64')
+        return df_cents.rename(columns=money_columns)
+
     @staticmethod
     def get_mapped_data_summary(df: pd.DataFrame) -> Dict[str, Any]:
         """Get summary statistics for mapped data"""
         try:
-            # Convert numpy types to Python native types for JSON serialization
-            df_clean = df.copy()
-            for col in df_clean.columns:
-                if df_clean[col].dtype == 'int64':
-                    df_clean[col] = df_clean[col].astype('int32')
-                elif df_clean[col].dtype == 'float64':
-                    df_clean[col] = df_clean[col].astype('float32')
+            # Narrow numeric columns in one astype, as convert_to_dict does; other columns are shared since df_clean is only read
+            narrowed = {col: 'int32' for col in df.select_dtypes('int64').columns}
+            narrowed.update({col: 'float32' for col in df.select_dtypes('float64').columns})
+            df_clean = df.astype(narrowed, copy=False)
             
             summary = {
                 "total_rows": int(len(df_clean)),
@@ -568,16 +931,14 @@ class ExcelProcessor:
                 "sample_data": ExcelProcessor.convert_to_dict(df_clean.head(5))
             }
             
-            # Add numeric column statistics
-            numeric_columns = ['Sales Count', 'Sales Value (usd)', 'SOH']
-            for col in numeric_columns:
-                if col in df_clean.columns:
+            # Add numeric column statistics, every reduction computed once
+            numeric_columns = [col for col in ('Sales Count', 'Sales Value (usd)', 'SOH') if col in df_clean.columns]
+            if numeric_columns:
+                stats = df_clean[numeric_columns].agg(['sum', 'mean', 'min', 'max', 'count'])
+                for col, values in stats.items():
                     summary[f"{col}_stats"] = {
-                        "sum": float(df_clean[col].sum()) if pd.notna(df_clean[col].sum()) else 0,
-                        "mean": float(df_clean[col].mean()) if pd.notna(df_clean[col].mean()) else 0,
-                        "min": float(df_clean[col].min()) if pd.notna(df_clean[col].min()) else 0,
-                        "max": float(df_clean[col].max()) if pd.notna(df_clean[col].max()) else 0,
-                        "count": int(df_clean[col].count())
+                        **{name: float(values[name]) if pd.notna(values[name]) else 0 for name in ('sum', 'mean', 'min', 'max')},
+                        "count": int(values['count'])
                     }
             
             return summary
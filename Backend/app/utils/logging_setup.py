@@ -0,0 +1,39 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMAT = "[%(levelname)s] %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def start_logging() -> None:
+    """Send "app.*" logs through a queue so callers never block on stdout; a listener thread writes them"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    logger = logging.getLogger("app")
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(os.getenv("LOG_LEVEL", "info").upper())
+    logger.propagate = False
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    logger = logging.getLogger("app")
+    for handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+        logger.removeHandler(handler)
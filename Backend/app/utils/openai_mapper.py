@@ -1,12 +1,86 @@
+import asyncio
 import openai
+import re
 import pandas as pd
 import json
-from typing import Dict, List, Any, Optional
+import logging
+import hashlib
+import httpx
+import threading
+import time
+import weakref
+from typing import Dict, List, Any, Optional, Tuple
 import os
 from dotenv import load_dotenv
+from app.utils.ttl_cache import TTLCache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Mappings by schema hash: files with the same column names and dtypes get the same answer without another API call
+_mapping_cache = TTLCache(ttl=int(os.getenv("MAPPING_CACHE_TTL", 3600)), maxsize=256)
+_mapping_cache_lock = threading.Lock()
+
+# The SDK retries 429 and 5xx responses itself, with exponential backoff that honours Retry-After
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 4))
+
+# Column mapping is a schema task: a small model answers it from names and a few values per column
+OPENAI_MAPPING_MODEL = os.getenv("OPENAI_MAPPING_MODEL", "gpt-4o-mini")
+
+# Distinct non-null values shown per column in the prompt
+SAMPLE_VALUES_PER_COLUMN = 3
+
+# Keep-alive pool so repeat mapping calls skip the TCP/TLS handshake
+OPENAI_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+OPENAI_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# One sync client per worker, shared by every mapper; closed on app shutdown
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def _get_shared_client(api_key: str):
+    """The worker's pooled OpenAI client, created on first use"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = openai.OpenAI(
+                api_key=api_key,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=openai.DefaultHttpxClient(limits=OPENAI_HTTP_LIMITS, timeout=OPENAI_HTTP_TIMEOUT)
+            )
+        return _shared_client
+
+def close_shared_client():
+    """Close the shared client's connection pool"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+
+# One async client per event loop, shared by every mapper: its connections belong to the loop that opened them
+_shared_async_clients = weakref.WeakKeyDictionary()
+
+def _get_shared_async_client(api_key: str):
+    """The running loop's pooled AsyncOpenAI client, created on first use"""
+    loop = asyncio.get_running_loop()
+    client = _shared_async_clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            api_key=api_key,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=openai.DefaultAsyncHttpxClient(limits=OPENAI_HTTP_LIMITS, timeout=OPENAI_HTTP_TIMEOUT)
+        )
+        _shared_async_clients[loop] = client
+    return client
+
+async def aclose_shared_client():
+    """Close the running loop's async client's connection pool"""
+    client = _shared_async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
 class OpenAIColumnMapper:
     """OpenAI-based column mapping for Excel/CSV data"""
     
@@ -23,6 +97,74 @@ class OpenAIColumnMapper:
         "Type"
     ]
     
+    # Per-column hints for the prompt, so a partial request only carries the columns it asks about
+    MAPPING_GUIDELINES = {
+        "Product Name": '"Product Name" should map to "Category" column (this contains the product names/categories)',
+        "Country": '"Country" should map to columns named "Country", "Nation", "Region", "Market"',
+        "Year": '"Year" should map to columns named "Year", "Yr", containing year data',
+        "Month": '"Month" should map to columns named "Month", "Mon", containing month data (can be numbers 1-12 or month names like Jan, Feb, March, etc.)',
+        "Sales Count": '"Sales Count" should map to quantity/volume columns like "Quantity", "Qty", "Volume", "Count", "Units" - NOT country or other text columns. If no quantity column exists, mark as "NOT_FOUND"',
+        "Sales Value (usd)": '"Sales Value (usd)" should map to USD sales columns like "Sales Value (USD)", "Sales Value (usd)", "Sales USD", "Revenue USD", "Amount USD". Look for columns containing "USD", "dollar", "$" or "US" in the name. If no USD column exists, look for the main sales/revenue column.',
+        "SOH": '"SOH" should map to stock/inventory columns like "SOH (Vol)", "SOH", "Stock", "Inventory", "IMS"',
+        "Description": '"Description" should map to description columns like "Item Description", "Description", "Details", "Notes"',
+        "Type": '"Type" should map to type/category columns like "Type", "Category", "Group", "Class"'
+    }
+    
+    # Original column names taken as-is for each required column
+    EXACT_COLUMN_NAMES = {
+        "Product Name": ["Category", "Product Name", "Product"],
+        "Country": ["Country"],
+        "Year": ["Year"],
+        "Month": ["Month"],
+        "Sales Count": ["Quantity", "Qty", "Volume", "Count", "Units", "Sales Count"],
+        "Sales Value (usd)": ["Sales Value (USD)", "Sales Value (usd)", "Sales USD", "Revenue USD", "Sales Value", "Earning", "Earnings", "Revenue", "Revenues"],
+        "SOH": ["SOH (Vol)", "SOH", "Stock", "Inventory"],
+        "Description": ["Item Description", "Description", "Details"],
+        "Type": ["Type", "Category", "Group"]
+    }
+    
+    # Substrings of lowercased column names for the fuzzy fallback pass
+    FUZZY_KEYWORDS = {
+        "Product Name": [
+            "category", "product name", 
+            "sku", "barcode", "product", "name"
+        ],
+        "Country": ["country", "nation", "region", "market"],
+        "Year": ["year", "yr"],
+        "Month": ["month", "mon"],
+        "Sales Count": [
+            "quantity", "qty", "volume", "vol", "count", "units", 
+            "sales count", "total quantity"
+        ],
+        "Sales Value (usd)": [
+            "sales value (usd)", "sales value (usd)", "sales usd", "sales value", "earning", "earnings",
+            "revenue usd", "amount usd", "value usd", "sales value usd", "revenue", "revenues"
+        ],
+        "SOH": [
+            "soh (vol)", "soh", "stock", "inventory", 
+            "stock on hand", "soh vol"
+        ],
+        "Description": [
+            "item description", "description", "desc", "details", "notes"
+        ],
+        "Type": ["type", "category", "group", "class", "sub"]
+    }
+    
+    # Each keyword list as one alternation, so a column name is scanned once per required column
+    FUZZY_PATTERNS = {
+        required_col: re.compile("|".join(map(re.escape, keywords)))
+        for required_col, keywords in FUZZY_KEYWORDS.items()
+    }
+    
+    # Currency and sales-word markers in lowercased column names
+    USD_PATTERN = re.compile(r"usd|dollar|\$")
+    LC_PATTERN = re.compile(r"lc|local")
+    USD_INDICATOR_PATTERN = re.compile(r"usd|dollar|\$|us")
+    SALES_WORD_PATTERN = re.compile(r"sales|revenue|value|amount|earning")
+    
+    # Batch API statuses after which the batch makes no further progress
+    BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+    
     def __init__(self):
         """Initialize OpenAI client"""
         try:
@@ -32,19 +174,20 @@ class OpenAIColumnMapper:
             
             # Try to initialize with the new API first
             try:
-                self.client = openai.OpenAI(api_key=api_key)
+                self.client = _get_shared_client(api_key)
+                self.api_key = api_key
                 self.use_new_api = True
-                print(f"[INFO] OpenAI client initialized with new API")
+                logger.info("OpenAI client initialized with new API")
             except Exception as new_api_error:
-                print(f"[WARNING] New API failed: {new_api_error}")
+                logger.warning("New API failed: %s", new_api_error)
                 # Fallback to old API
                 openai.api_key = api_key
                 self.client = openai
                 self.use_new_api = False
-                print(f"[INFO] OpenAI client initialized with old API")
+                logger.info("OpenAI client initialized with old API")
             
         except Exception as e:
-            print(f"[ERROR] Failed to initialize OpenAI client: {str(e)}")
+            logger.error("Failed to initialize OpenAI client: %s", e)
             raise Exception(f"OpenAI client initialization failed: {str(e)}")
     
     def map_columns_with_openai(self, df: pd.DataFrame, sample_size: int = 50) -> Dict[str, str]:
@@ -59,102 +202,318 @@ class OpenAIColumnMapper:
             Dictionary mapping original columns to required columns
         """
         try:
-            # Prepare sample data for OpenAI
-            sample_data = self._prepare_sample_data(df, sample_size)
-            print(f"Sample data: {sample_data}")
-            # Create prompt for OpenAI
-            prompt = self._create_mapping_prompt(sample_data)
-            print(f"Prompt: {prompt}")
+            resolved, unmapped, unresolved = self._mapping_request(df)
+            if unmapped is None:
+                return resolved
+            
+            cache_key = self._schema_cache_key(unmapped, unresolved)
+            cached = self._cached_mapping(cache_key)
+            if cached is not None:
+                return self._merge_mapping(resolved, cached)
+            
+            request = self._completion_request(unmapped, unresolved, sample_size)
+            
             # Call OpenAI API using appropriate format based on client type
             if self.use_new_api:
-                response = self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "You are an expert data analyst specializing in column mapping for sales data. Your task is to map columns from uploaded Excel/CSV files to a standardized format."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.1,
-                    max_tokens=2000
-                )
-                content = response.choices[0].message.content
+                response = self.client.chat.completions.create(**request)
             else:
-                response = self.client.ChatCompletion.create(
-                    model="gpt-4",
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "You are an expert data analyst specializing in column mapping for sales data. Your task is to map columns from uploaded Excel/CSV files to a standardized format."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.1,
-                    max_tokens=2000
-                )
-                content = response.choices[0].message.content
-            print(f"Response: {response}")
+                response = self.client.ChatCompletion.create(**request)
+            content = response.choices[0].message.content
+            logger.debug("Response: %s", response)
             # Parse response
             mapping_result = self._parse_openai_response(content)
-            print(f"Mapping result: {mapping_result}")
-            return mapping_result
+            logger.info("Mapping result: %s", mapping_result)
+            
+            self._remember_mapping(cache_key, mapping_result)
+            return self._merge_mapping(resolved, mapping_result)
+            
+        except Exception as e:
+            logger.error("Error in OpenAI column mapping: %s", e)
+            # Fallback to basic mapping
+            return self._fallback_mapping(df)
+    
+    async def amap_columns(self, df: pd.DataFrame, sample_size: int = 50) -> Dict[str, str]:
+        """
+        Async map_columns_with_openai: the API call is awaited instead of holding a thread
+        
+        Args:
+            df: DataFrame with original data
+            sample_size: Number of sample rows to send to OpenAI
+            
+        Returns:
+            Dictionary mapping original columns to required columns
+        """
+        if not self.use_new_api:
+            return await asyncio.to_thread(self.map_columns_with_openai, df, sample_size)
+        
+        try:
+            resolved, unmapped, unresolved = self._mapping_request(df)
+            if unmapped is None:
+                return resolved
+            
+            cache_key = self._schema_cache_key(unmapped, unresolved)
+            cached = self._cached_mapping(cache_key)
+            if cached is not None:
+                return self._merge_mapping(resolved, cached)
+            
+            request = self._completion_request(unmapped, unresolved, sample_size)
+            response = await _get_shared_async_client(self.api_key).chat.completions.create(**request)
+            mapping_result = self._parse_openai_response(response.choices[0].message.content)
+            logger.info("Mapping result: %s", mapping_result)
+            
+            self._remember_mapping(cache_key, mapping_result)
+            return self._merge_mapping(resolved, mapping_result)
             
         except Exception as e:
-            print(f"Error in OpenAI column mapping: {str(e)}")
+            logger.error("Error in OpenAI column mapping: %s", e)
             # Fallback to basic mapping
             return self._fallback_mapping(df)
     
+    async def amap_many(self, dfs: List[pd.DataFrame], sample_size: int = 50, concurrency: int = 8) -> List[Dict[str, str]]:
+        """
+        Map several files concurrently, at most `concurrency` API calls in flight
+        
+        Args:
+            dfs: DataFrames with original data, one per file
+            sample_size: Number of sample rows to send to OpenAI per file
+            concurrency: Maximum simultaneous OpenAI requests
+            
+        Returns:
+            One mapping per DataFrame, in input order
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def map_one(df: pd.DataFrame) -> Dict[str, str]:
+            async with semaphore:
+                return await self.amap_columns(df, sample_size)
+        
+        return list(await asyncio.gather(*(map_one(df) for df in dfs)))
+    
+    def map_columns_batch(self, dfs: List[pd.DataFrame], sample_size: int = 50, poll_interval: float = 30) -> List[Dict[str, str]]:
+        """
+        Map many files in one OpenAI Batch API job (half the token price, answered within 24h)
+        
+        For latency-tolerant bulk ingest; interactive uploads keep map_columns_with_openai.
+        Blocks until the batch finishes. Files the batch could not answer get the fallback mapping.
+        
+        Args:
+            dfs: DataFrames with original data, one per file
+            sample_size: Number of sample rows to send to OpenAI per file
+            poll_interval: Seconds between batch status checks
+            
+        Returns:
+            One mapping per DataFrame, in input order
+        """
+        if not self.use_new_api:
+            # The legacy module client has no Batch API
+            return [self.map_columns_with_openai(df, sample_size) for df in dfs]
+        
+        requests = [self._mapping_request(df) for df in dfs]
+        cache_keys = [
+            self._schema_cache_key(unmapped, unresolved) if unmapped is not None else None
+            for _, unmapped, unresolved in requests
+        ]
+        with _mapping_cache_lock:
+            cached = [_mapping_cache.get(key) if key else None for key in cache_keys]
+        
+        # Only files that still need OpenAI and have no cached answer go into the batch
+        pending = [i for i, key in enumerate(cache_keys) if key is not None and cached[i] is None]
+        if not pending:
+            return [
+                resolved if cache_keys[i] is None else self._merge_mapping(resolved, cached[i])
+                for i, (resolved, _, _) in enumerate(requests)
+            ]
+        
+        contents = {}
+        try:
+            lines = [
+                json.dumps({
+                    "custom_id": f"file_{i}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._completion_request(requests[i][1], requests[i][2], sample_size)
+                })
+                for i in pending
+            ]
+            input_file = self.client.files.create(
+                file=("column_mapping.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            logger.info("Submitted column mapping batch %s for %s of %s files", batch.id, len(pending), len(dfs))
+            
+            while batch.status not in self.BATCH_FINAL_STATUSES:
+                time.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch.id)
+            
+            if batch.status != "completed":
+                logger.warning("Column mapping batch %s ended as %s", batch.id, batch.status)
+            
+            # Expired or cancelled batches still report the requests they finished
+            if batch.output_file_id:
+                for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                    result = json.loads(line)
+                    response = result.get("response") or {}
+                    if response.get("status_code") == 200:
+                        contents[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error("Error in OpenAI batch column mapping: %s", e)
+        
+        mappings = []
+        for i, (df, (resolved, _, _)) in enumerate(zip(dfs, requests)):
+            if cache_keys[i] is None:
+                mappings.append(resolved)
+                continue
+            if cached[i] is not None:
+                mappings.append(self._merge_mapping(resolved, cached[i]))
+                continue
+            content = contents.get(f"file_{i}")
+            if content is None:
+                mappings.append(self._fallback_mapping(df))
+                continue
+            try:
+                mapping = self._parse_openai_response(content)
+            except (TypeError, ValueError) as e:
+                logger.error("Error parsing OpenAI batch response for file %s: %s", i, e)
+                mappings.append(self._fallback_mapping(df))
+                continue
+            # Later single-file calls for the same data reuse the batch answer
+            self._remember_mapping(cache_keys[i], mapping)
+            mappings.append(self._merge_mapping(resolved, mapping))
+        return mappings
+    
+    def _mapping_request(self, df: pd.DataFrame) -> Tuple[Dict[str, str], Optional[pd.DataFrame], List[str]]:
+        """
+        Resolve what exact column names can, and split off what is left for OpenAI
+        
+        Returns:
+            The exact-name mapping, the original columns it left unmapped (None when nothing is left
+            for OpenAI to map) and the required columns it left NOT_FOUND
+        """
+        resolved = self._exact_mapping(df)
+        unresolved = [col for col, original in resolved.items() if original == "NOT_FOUND"]
+        mapped = set(resolved.values())
+        remaining = [col for col in df.columns if col not in mapped]
+        if not unresolved or not remaining:
+            logger.info("Exact column names left nothing for OpenAI to map, skipping the API call")
+            return resolved, None, unresolved
+        
+        return resolved, df[remaining], unresolved
+    
+    @staticmethod
+    def _merge_mapping(resolved: Dict[str, str], answer: Dict[str, str]) -> Dict[str, str]:
+        """Fill the NOT_FOUND entries of the exact-name mapping from the OpenAI answer"""
+        return {
+            col: original if original != "NOT_FOUND" else answer.get(col, "NOT_FOUND")
+            for col, original in resolved.items()
+        }
+    
+    def _completion_request(self, unmapped: pd.DataFrame, unresolved: List[str], sample_size: int) -> Dict[str, Any]:
+        """Chat completion parameters for mapping the unresolved columns, shared by the live and batch calls"""
+        prompt = self._create_mapping_prompt(self._prepare_sample_data(unmapped, sample_size), unresolved)
+        logger.debug("Prompt: %s", prompt)
+        
+        # Structured output: each unresolved column gets one of the unmapped column names or NOT_FOUND
+        choices = [str(col) for col in unmapped.columns] + ["NOT_FOUND"]
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "column_mapping",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {col: {"type": "string", "enum": choices} for col in unresolved},
+                    "required": unresolved,
+                    "additionalProperties": False
+                }
+            }
+        }
+        
+        return {
+            "model": OPENAI_MAPPING_MODEL,
+            "messages": [
+                {
+                    "role": "system", 
+                    "content": "You are an expert data analyst specializing in column mapping for sales data. Your task is to map columns from uploaded Excel/CSV files to a standardized format."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.1,
+            # The answer is one small JSON object
+            "max_tokens": 300,
+            "response_format": response_format
+        }
+    
+    @staticmethod
+    def _schema_cache_key(unmapped: pd.DataFrame, unresolved: List[str]) -> str:
+        """Mapping cache key from column names and dtypes, so re-uploads of a template hit it whatever their rows"""
+        schema = [[str(col) for col in unmapped.columns], unmapped.dtypes.astype(str).tolist(), unresolved]
+        return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _cached_mapping(cache_key: str) -> Optional[Dict[str, str]]:
+        """A copy of the cached mapping for a schema, or None"""
+        with _mapping_cache_lock:
+            cached = _mapping_cache.get(cache_key)
+        if cached is None:
+            return None
+        logger.info("Reusing cached column mapping")
+        return dict(cached)
+    
+    @staticmethod
+    def _remember_mapping(cache_key: str, mapping: Dict[str, str]) -> None:
+        """Cache a parsed mapping; one that maps nothing stays uncached so the next call asks again"""
+        if any(value != "NOT_FOUND" for value in mapping.values()):
+            with _mapping_cache_lock:
+                _mapping_cache.set(cache_key, dict(mapping))
+    
     def _prepare_sample_data(self, df: pd.DataFrame, sample_size: int) -> Dict[str, Any]:
-        """Prepare sample data for OpenAI analysis"""
-        # Get sample rows
+        """Prepare sample data for OpenAI analysis: a few distinct values per column from the first rows"""
         sample_df = df.head(sample_size)
         
-        # Convert to dictionary format
         sample_data = {
             "columns": df.columns.tolist(),
-            "sample_rows": sample_df.to_dict('records'),
-            "data_types": df.dtypes.astype(str).to_dict(),
+            "sample_values": {
+                str(col): sample_df.iloc[:, position].dropna().astype(str).unique()[:SAMPLE_VALUES_PER_COLUMN].tolist()
+                for position, col in enumerate(df.columns)
+            },
             "total_rows": len(df)
         }
         
         return sample_data
     
-    def _create_mapping_prompt(self, sample_data: Dict[str, Any]) -> str:
-        """Create prompt for OpenAI column mapping"""
+    def _create_mapping_prompt(self, sample_data: Dict[str, Any], required_columns: Optional[List[str]] = None) -> str:
+        """Create prompt for OpenAI column mapping, for all required columns unless given a subset"""
+        required_columns = required_columns or self.REQUIRED_COLUMNS
+        guidelines = "\n".join(
+            f"{number}. {self.MAPPING_GUIDELINES[col]}" for number, col in enumerate(required_columns, 1)
+        )
+        response_format = ",\n".join(f'    "{col}": "original_column_name_or_NOT_FOUND"' for col in required_columns)
         
         prompt = f"""
 I have uploaded an Excel/CSV file with sales data. I need you to map the columns to a standardized format.
 
 REQUIRED COLUMNS (these are the target columns I need):
-{json.dumps(self.REQUIRED_COLUMNS, indent=2)}
+{json.dumps(required_columns, indent=2)}
 
 ORIGINAL DATA STRUCTURE:
 Columns: {sample_data['columns']}
-Data Types: {sample_data['data_types']}
 Total Rows: {sample_data['total_rows']}
 
-SAMPLE DATA (first few rows):
-{json.dumps(sample_data['sample_rows'][:5], indent=2, default=str)}
+SAMPLE VALUES (distinct values per column):
+{json.dumps(sample_data['sample_values'], indent=2)}
 
 Please analyze the data and provide a mapping from the original columns to the required columns. 
 
 SPECIFIC MAPPING GUIDELINES:
-1. "Product Name" should map to "Category" column (this contains the product names/categories)
-2. "Country" should map to columns named "Country", "Nation", "Region", "Market"
-3. "Year" should map to columns named "Year", "Yr", containing year data
-4. "Month" should map to columns named "Month", "Mon", containing month data (can be numbers 1-12 or month names like Jan, Feb, March, etc.)
-5. "Sales Count" should map to quantity/volume columns like "Quantity", "Qty", "Volume", "Count", "Units" - NOT country or other text columns. If no quantity column exists, mark as "NOT_FOUND"
-6. "Sales Value (usd)" should map to USD sales columns like "Sales Value (USD)", "Sales Value (usd)", "Sales USD", "Revenue USD", "Amount USD". Look for columns containing "USD", "dollar", "$" or "US" in the name. If no USD column exists, look for the main sales/revenue column.
-7. "SOH" should map to stock/inventory columns like "SOH (Vol)", "SOH", "Stock", "Inventory", "IMS"
-8. "Description" should map to description columns like "Item Description", "Description", "Details", "Notes"
-9. "Type" should map to type/category columns like "Type", "Category", "Group", "Class"
+{guidelines}
 
 CRITICAL RULES:
 - Look for EXACT column name matches first (case-insensitive)
@@ -162,19 +521,11 @@ CRITICAL RULES:
 - For "Sales Value (usd)", prioritize USD columns over LC (Local Currency) columns
 - If no exact match exists, choose the closest semantic match
 - If a required column has no suitable match, mark it as "NOT_FOUND"
-- Consider data types: numeric columns for counts/values, text columns for names/descriptions
+- Consider the sample values: numeric columns for counts/values, text columns for names/descriptions
 
 Please respond with a JSON object in this exact format:
 {{
-    "Product Name": "original_column_name_or_NOT_FOUND",
-    "Country": "original_column_name_or_NOT_FOUND", 
-    "Year": "original_column_name_or_NOT_FOUND",
-    "Month": "original_column_name_or_NOT_FOUND",
-    "Sales Count": "original_column_name_or_NOT_FOUND",
-    "Sales Value (usd)": "original_column_name_or_NOT_FOUND",
-    "SOH": "original_column_name_or_NOT_FOUND",
-    "Description": "original_column_name_or_NOT_FOUND",
-    "Type": "original_column_name_or_NOT_FOUND"
+{response_format}
 }}
 
 Only return the JSON object, no additional text.
@@ -182,65 +533,29 @@ Only return the JSON object, no additional text.
         return prompt
     
     def _parse_openai_response(self, response_content: str) -> Dict[str, str]:
-        """Parse OpenAI response and extract mapping"""
-        try:
-            # Clean the response content
-            response_content = response_content.strip()
-            
-            # Remove any markdown formatting
-            if response_content.startswith("```json"):
-                response_content = response_content[7:]
-            if response_content.endswith("```"):
-                response_content = response_content[:-3]
-            
-            # Parse JSON
-            mapping = json.loads(response_content)
-            
-            # Validate that all required columns are present
-            for required_col in self.REQUIRED_COLUMNS:
-                if required_col not in mapping:
-                    mapping[required_col] = "NOT_FOUND"
-            
-            return mapping
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing OpenAI response: {str(e)}")
-            print(f"Response content: {response_content}")
-            return self._create_empty_mapping()
-        except Exception as e:
-            print(f"Error in response parsing: {str(e)}")
-            return self._create_empty_mapping()
+        """Parse the structured OpenAI answer; raises TypeError/ValueError when there is no JSON object (e.g. a refusal)"""
+        mapping = json.loads(response_content)
+        return {col: mapping.get(col, "NOT_FOUND") for col in self.REQUIRED_COLUMNS}
     
-    def _create_empty_mapping(self) -> Dict[str, str]:
-        """Create empty mapping when parsing fails"""
-        return {col: "NOT_FOUND" for col in self.REQUIRED_COLUMNS}
+    def _exact_mapping(self, df: pd.DataFrame) -> Dict[str, str]:
+        """Map required columns whose original column has one of the known exact names"""
+        return self._first_named_columns(df.columns.tolist(), self.EXACT_COLUMN_NAMES)
     
-    def _fallback_mapping(self, df: pd.DataFrame) -> Dict[str, str]:
-        """Fallback mapping when OpenAI fails"""
-        mapping = {}
+    def _currency_column_names(self, columns: List[Any]) -> Dict[str, List[Any]]:
+        """EXACT_COLUMN_NAMES with Sales Value (usd) narrowed to USD columns, or widened with LC ones
         
-        # First, try exact matches for common column names
-        exact_matches = {
-            "Product Name": ["Category", "Product Name", "Product"],
-            "Country": ["Country"],
-            "Year": ["Year"],
-            "Month": ["Month"],
-            "Sales Count": ["Quantity", "Qty", "Volume", "Count", "Units", "Sales Count"],
-            "Sales Value (usd)": ["Sales Value (USD)", "Sales Value (usd)", "Sales USD", "Revenue USD", "Sales Value", "Earning", "Earnings", "Revenue", "Revenues"],
-            "SOH": ["SOH (Vol)", "SOH", "Stock", "Inventory"],
-            "Description": ["Item Description", "Description", "Details"],
-            "Type": ["Type", "Category", "Group"]
-        }
+        Substring matches ("lc" is in "Calculated"), so only the fallback uses them; the OpenAI prompt
+        carries the same USD-over-LC preference.
+        """
+        exact_matches = dict(self.EXACT_COLUMN_NAMES)
         
-        # Special USD detection logic - prioritize USD over LC
+        # Special USD detection logic - prioritize USD over LC, classifying each column once
         usd_columns = []
         lc_columns = []
-        
-        for col in df.columns:
-            col_lower = col.lower()
-            if any(keyword in col_lower for keyword in ['usd', 'dollar', '$']):
+        for col, col_lower in zip(columns, self._lower_names(columns)):
+            if self.USD_PATTERN.search(col_lower):
                 usd_columns.append(col)
-            elif any(keyword in col_lower for keyword in ['lc', 'local currency', 'local']):
+            elif self.LC_PATTERN.search(col_lower):
                 lc_columns.append(col)
         
         # If we found USD columns, use ONLY USD columns for Sales Value (usd)
@@ -249,77 +564,58 @@ Only return the JSON object, no additional text.
         # Only use LC as fallback if no USD found
         elif lc_columns:
             exact_matches["Sales Value (usd)"] = lc_columns + exact_matches["Sales Value (usd)"]
+        return exact_matches
+    
+    @staticmethod
+    def _first_named_columns(columns: List[Any], names: Dict[str, List[Any]]) -> Dict[str, str]:
+        """Map each required column to the first original column (in file order) carrying one of its names"""
+        first_position = {}
+        for position, col in enumerate(columns):
+            first_position.setdefault(col, position)
+        mapping = {}
+        for required_col, candidates in names.items():
+            positions = [first_position[name] for name in candidates if name in first_position]
+            mapping[required_col] = columns[min(positions)] if positions else "NOT_FOUND"
         
-        # Try exact matches first
-        for required_col, exact_names in exact_matches.items():
-            found = False
-            for original_col in df.columns:
-                if original_col in exact_names:
-                    mapping[required_col] = original_col
-                    found = True
-                    break
-            if not found:
-                mapping[required_col] = "NOT_FOUND"
+        return mapping
+    
+    def _fallback_mapping(self, df: pd.DataFrame) -> Dict[str, str]:
+        """Fallback mapping when OpenAI fails"""
+        mapping = self._first_named_columns(df.columns.tolist(), self._currency_column_names(df.columns.tolist()))
         
         # If we still have NOT_FOUND mappings, try fuzzy matching
         if any(v == "NOT_FOUND" for v in mapping.values()):
-            # Enhanced keyword-based mapping with priority order
-            column_mapping_rules = {
-                "Product Name": [
-                    "category", "product name", 
-                    "sku", "barcode", "product", "name"
-                ],
-                "Country": ["country", "nation", "region", "market"],
-                "Year": ["year", "yr"],
-                "Month": ["month", "mon"],
-                "Sales Count": [
-                    "quantity", "qty", "volume", "vol", "count", "units", 
-                    "sales count", "total quantity"
-                ],
-                "Sales Value (usd)": [
-                    "sales value (usd)", "sales value (usd)", "sales usd", "sales value", "earning", "earnings",
-                    "revenue usd", "amount usd", "value usd", "sales value usd", "revenue", "revenues"
-                ],
-                "SOH": [
-                    "soh (vol)", "soh", "stock", "inventory", 
-                    "stock on hand", "soh vol"
-                ],
-                "Description": [
-                    "item description", "description", "desc", "details", "notes"
-                ],
-                "Type": ["type", "category", "group", "class", "sub"]
-            }
+            columns = df.columns.tolist()
+            columns = list(zip(columns, self._lower_names(columns)))
             
-            for required_col, keywords in column_mapping_rules.items():
-                if mapping[required_col] == "NOT_FOUND":
-                    found = False
-                    # Try partial matches
-                    for original_col in df.columns:
-                        if any(keyword.lower() in original_col.lower() for keyword in keywords):
-                            # Special validation for Sales Count - don't map to Country
-                            if required_col == "Sales Count" and original_col.lower() == "country":
-                                continue
+            for required_col, pattern in self.FUZZY_PATTERNS.items():
+                if mapping[required_col] != "NOT_FOUND":
+                    continue
+                
+                # Try partial matches
+                for original_col, col_lower in columns:
+                    if pattern.search(col_lower):
+                        # Special validation for Sales Count - don't map to Country
+                        if required_col == "Sales Count" and col_lower == "country":
+                            continue
+                        mapping[required_col] = original_col
+                        break
+                
+                # Special USD detection for Sales Value (usd) if still not found
+                if mapping[required_col] == "NOT_FOUND" and required_col == "Sales Value (usd)":
+                    for original_col, col_lower in columns:
+                        # Look for USD indicators that also carry a sales-related keyword
+                        if self.USD_INDICATOR_PATTERN.search(col_lower) and self.SALES_WORD_PATTERN.search(col_lower):
                             mapping[required_col] = original_col
-                            found = True
                             break
-                    
-                    # Special USD detection for Sales Value (usd) if still not found
-                    if not found and required_col == "Sales Value (usd)":
-                        for original_col in df.columns:
-                            col_lower = original_col.lower()
-                            # Look for USD indicators
-                            if any(indicator in col_lower for indicator in ['usd', 'dollar', '$', 'us']):
-                                # Also check if it contains sales-related keywords
-                                if any(sales_word in col_lower for sales_word in ['sales', 'revenue', 'value', 'amount', 'earning']):
-                                    mapping[required_col] = original_col
-                                    found = True
-                                    break
-                    
-                    if not found:
-                        mapping[required_col] = "NOT_FOUND"
         
         return mapping
     
+    @staticmethod
+    def _lower_names(columns: List[Any]) -> List[str]:
+        """Lowercased column names, computed once per matching pass"""
+        return [str(col).lower() for col in columns]
+    
     def apply_mapping(self, df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
         """
         Apply the column mapping to the DataFrame
@@ -361,11 +657,16 @@ Only return the JSON object, no additional text.
             "successful_mappings": 0
         }
         
+        # Non-null counts and dtypes of every mapped column in one pass
+        mapped = df[list(dict.fromkeys(col for col in mapping.values() if col != "NOT_FOUND" and col in df.columns))]
+        counts = mapped.count()
+        dtypes = mapped.dtypes.astype(str)
+        
         for required_col, original_col in mapping.items():
-            if original_col != "NOT_FOUND" and original_col in df.columns:
+            if original_col in counts.index:
                 # Convert numpy types to Python native types for JSON serialization
-                non_null_count = int(df[original_col].notna().sum())
-                data_type = str(df[original_col].dtype)
+                non_null_count = int(counts[original_col])
+                data_type = dtypes[original_col]
                 
                 validation["mapped_columns"].append({
                     "required": required_col,
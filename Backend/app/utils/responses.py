@@ -0,0 +1,21 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+
+
+class AppORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes numpy scalars and falls back to str() for Decimal/Timestamp cells"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+def model_response(model: BaseModel) -> Response:
+    """Serialize an already-built response model once, skipping FastAPI's response_model round-trip"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
@@ -0,0 +1,50 @@
+import asyncio
+import inspect
+import logging
+import random
+from typing import Any, Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying; PostgREST reports non-JSON gateway errors with the status as the code
+RETRYABLE_STATUS_CODES = frozenset({"408", "429", "500", "502", "503", "504"})
+
+
+def is_transient_error(error: Exception, idempotent: bool = True) -> bool:
+    """Whether a failed Supabase call may succeed if repeated
+
+    Non-idempotent calls (inserts) are only retried when the request certainly did not apply:
+    the connection was never made or the gateway rate-limited it.
+    """
+    message = str(error).lower()
+    rate_limited = "rate limit" in message or "too many requests" in message or str(getattr(error, "code", "")) == "429"
+    if rate_limited or isinstance(error, httpx.ConnectError):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+        return True
+    return str(getattr(error, "code", "")) in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int, base: float = 0.1, cap: float = 5.0) -> float:
+    """Exponential backoff with full jitter, so retrying workers do not stampede together"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry_async(call: Callable[[], Any], attempts: int = 4, idempotent: bool = True) -> Any:
+    """Run call() (sync or returning an awaitable), retrying transient failures with backoff"""
+    for attempt in range(attempts):
+        try:
+            result = call()
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient_error(e, idempotent):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("Transient Supabase error (attempt %s/%s), retrying in %.2fs: %s", attempt + 1, attempts, delay, e)
+            await asyncio.sleep(delay)
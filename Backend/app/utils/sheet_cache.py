@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, int, int, Optional[str]]
+
+
+class SheetCache:
+    """LRU cache of parsed workbooks keyed on (path, mtime, size, sheet) so repeat reads skip parsing"""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key so concurrent requests for the same file parse it only once
+        self._key_locks: Dict[CacheKey, threading.Lock] = {}
+
+    @staticmethod
+    def _key(file_path: str, sheet_name: Optional[str]) -> CacheKey:
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, sheet_name)
+
+    def _lookup(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """Find a cached entry; a single sheet can be served from a cached whole-workbook read"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        sheet_name = key[3]
+        if sheet_name is not None:
+            workbook = self._entries.get(key[:3] + (None,))
+            if workbook is not None and sheet_name in workbook:
+                self._entries.move_to_end(key[:3] + (None,))
+                return {sheet_name: workbook[sheet_name]}
+        return None
+
+    def _store(self, key: CacheKey, entry: Dict[str, Any]) -> None:
+        # Older versions of the same file can never be hit again
+        for stale in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+            del self._entries[stale]
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, file_path: str, sheet_name: Optional[str], loader: Callable[[str, Optional[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return cached sheets for the current file version, calling loader(file_path, sheet_name) on a miss"""
+        try:
+            key = self._key(file_path, sheet_name)
+        except OSError:
+            # Missing file: let the loader raise its usual error
+            return loader(file_path, sheet_name)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry
+
+            entry = loader(file_path, sheet_name)
+
+            with self._lock:
+                self._store(key, entry)
+                self._key_locks.pop(key, None)
+            return entry
+
+    def peek(self, file_path: str, sheet_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a cached entry without loading on a miss"""
+        try:
+            key = self._key(file_path, sheet_name)
+        except OSError:
+            return None
+        with self._lock:
+            return self._lookup(key)
+
+    def invalidate(self, file_path: str) -> None:
+        """Drop every cached entry for a file (e.g. after it is deleted)"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+
+sheet_cache = SheetCache(maxsize=int(os.getenv("SHEET_CACHE_SIZE", 8)))
+# Best-sheet detection results are small, so keep more file versions than parsed workbooks
+detection_cache = SheetCache(maxsize=32)
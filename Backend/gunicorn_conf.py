@@ -0,0 +1,19 @@
+import multiprocessing
+import os
+
+# Bind to the port provided by the platform (Heroku sets PORT)
+bind = f"0.0.0.0:{os.getenv('PORT', 8880)}"
+
+# One worker per WEB_CONCURRENCY, otherwise scale with the available cores
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Reuse client connections across bursts of upload requests
+keepalive = int(os.getenv("KEEPALIVE", 30))
+backlog = 2048
+
+# Uploads with OpenAI mapping can take a while
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+
+loglevel = os.getenv("LOG_LEVEL", "info")
+accesslog = "-"
@@ -1,3 +1,4 @@
+import multiprocessing
 import uvicorn
 import os
 
@@ -8,11 +9,19 @@ if __name__ == "__main__":
     # Determine if we're in production
     is_production = os.getenv("ENVIRONMENT", "development").lower() == "production"
     
+    # Same default worker count as gunicorn_conf.py; reload only works with a single process
+    workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)) if is_production else 1
+    
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=port,
+        workers=workers,
         reload=not is_production,  # Disable reload in production
         log_level="info" if is_production else "debug",
-        access_log=True,
+        access_log=not is_production,  # Skip a log write per request in production
+        loop="auto",  # uvloop when installed (uvicorn[standard])
+        http="auto",  # httptools when installed
+        timeout_keep_alive=30,
+        backlog=2048,
     )
\ No newline at end of file
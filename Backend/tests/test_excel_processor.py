@@ -0,0 +1,45 @@
+import openpyxl
+import pandas as pd
+import pytest
+
+from app.utils.excel_processor import ExcelProcessor
+from app.utils.sheet_cache import sheet_cache
+
+
+@pytest.fixture
+def workbook_with_blank_rows(tmp_path):
+    """A single-column sheet and a wide sheet, both with blank rows"""
+    path = str(tmp_path / "blank_rows.xlsx")
+    workbook = openpyxl.Workbook()
+    notes = workbook.active
+    notes.title = "Notes"
+    notes.append(["Note"])
+    for i in range(30):
+        notes.append([f"note {i}"] if i % 3 else [None])
+    sales = workbook.create_sheet("Sales")
+    sales.append(["Product", "Country", "Sales Count"])
+    for i in range(30):
+        sales.append([f"p{i}", "US", i] if i % 4 else [None, None, None])
+    workbook.save(path)
+    yield path
+    sheet_cache.invalidate(path)
+
+
+@pytest.mark.parametrize("sheet_name", ["Notes", "Sales"])
+def test_read_excel_range_cold_matches_warm(workbook_with_blank_rows, sheet_name):
+    path = workbook_with_blank_rows
+    offsets = range(0, 35, 7)
+    cold_pages = [ExcelProcessor.read_excel_range(path, sheet_name, offset, 7) for offset in offsets]
+    cold_shape = ExcelProcessor.get_sheet_metadata(path)[sheet_name]['shape']
+
+    full = ExcelProcessor.read_excel_file(path, sheet_name)[sheet_name]['data']
+    assert sheet_cache.peek(path, sheet_name) is not None
+    # Blank rows are kept, as read_excel keeps them
+    assert full.shape == pd.read_excel(path, sheet_name=sheet_name).shape
+
+    for offset, cold in zip(offsets, cold_pages):
+        warm = ExcelProcessor.read_excel_range(path, sheet_name, offset, 7)
+        assert cold['total_rows'] == warm['total_rows'] == len(full)
+        # Cold pages infer dtypes from their own rows
+        pd.testing.assert_frame_equal(cold['data'], warm['data'], check_dtype=False)
+    assert cold_shape == full.shape
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from app.utils.openai_mapper import OpenAIColumnMapper
+
+
+def mapper():
+    # The mapping passes need no client
+    return object.__new__(OpenAIColumnMapper)
+
+
+def test_exact_pass_ignores_currency_substrings():
+    df = pd.DataFrame(columns=["Local Distributor", "Calculated Margin", "Sales Value"])
+    resolved, unmapped, unresolved = mapper()._mapping_request(df)
+    assert resolved["Sales Value (usd)"] == "Sales Value"
+    assert list(unmapped.columns) == ["Local Distributor", "Calculated Margin"]
+    assert "Sales Value (usd)" not in unresolved
+
+
+def test_exact_pass_leaves_unnamed_currency_columns_to_openai():
+    df = pd.DataFrame(columns=["Local Distributor", "Amount"])
+    resolved, unmapped, unresolved = mapper()._mapping_request(df)
+    assert resolved["Sales Value (usd)"] == "NOT_FOUND"
+    assert "Sales Value (usd)" in unresolved
+    # Without OpenAI the fallback still prefers USD, then LC columns
+    assert mapper()._fallback_mapping(df)["Sales Value (usd)"] == "Local Distributor"
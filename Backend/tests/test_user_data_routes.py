@@ -0,0 +1,36 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import excel_routes
+
+
+class FakeSupabaseService:
+    """Records get_user_data calls instead of querying Supabase"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_user_data(self, organization_id, user_id, limit, offset, before_created_at=None, before_id=None):
+        self.calls.append((organization_id, user_id, limit, offset, before_created_at, before_id))
+        return {"data": [{"id": 7}], "next_before_created_at": None, "next_before_id": None}
+
+
+@pytest.fixture
+def client_and_service():
+    service = FakeSupabaseService()
+    app = FastAPI()
+    app.include_router(excel_routes.router, prefix="/api/v1/excel")
+    app.dependency_overrides[excel_routes.get_supabase_service] = lambda: service
+    return TestClient(app), service
+
+
+def test_user_data_route_reaches_get_user_data(client_and_service):
+    client, service = client_and_service
+    response = client.get(
+        "/api/v1/excel/user-data/org-1/user-1",
+        params={"limit": 5, "before_created_at": "2026-10-14T00:00:00+00:00", "before_id": "42"},
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == [{"id": 7}]
+    assert service.calls == [("org-1", "user-1", 5, 0, "2026-10-14T00:00:00+00:00", "42")]
@@ -32,23 +32,24 @@ export async function PATCH(
     const body = await request.json();
     console.log(`[ORDER API] Request body:`, JSON.stringify(body, null, 2));
     
-    // Fetch current order to check permissions and current status
-    const { data: currentOrder, error: fetchError } = await supabase
-      .from("orders")
-      .select("*")
-      .eq("id", id)
-      .single();
+    // Fetch current order (status check) and the caller's profile (permissions) in parallel
+    const [
+      { data: currentOrder, error: fetchError },
+      { data: profile },
+    ] = await Promise.all([
+      supabase.from("orders").select("*").eq("id", id).single(),
+      supabase
+        .from("user_profiles")
+        .select("role_name, brand_id, distributor_id")
+        .eq("user_id", user.id)
+        .single(),
+    ]);
 
     if (fetchError || !currentOrder) {
       return NextResponse.json({ error: "Order not found" }, { status: 404 });
     }
 
     // Check Permissions
-    const { data: profile } = await supabase
-      .from("user_profiles")
-      .select("role_name, brand_id, distributor_id")
-      .eq("user_id", user.id)
-      .single();
 
     const isSuperAdmin = profile?.role_name === "super_admin";
     const isDistributorAdmin = profile?.role_name?.startsWith("distributor_");
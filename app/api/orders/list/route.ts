@@ -52,10 +52,41 @@ interface OrdersListRequest {
   searchTerm?: string;
   brandId?: string;
   distributorId?: string;
+  // Opaque nextCursor from the previous page; when set, page is ignored and rows continue after it
+  cursor?: string;
 }
 
-function sanitizeSearchTerm(term: string) {
-  return term.replace(/[%_]/g, "\\$&");
+// ILIKE "contains" pattern with LIKE wildcards and the escape character taken literally
+function buildContainsPattern(term: string) {
+  return `%${term.replace(/[\\%_]/g, "\\$&")}%`;
+}
+
+// Double-quote a value inside a PostgREST or() filter so commas, dots and parentheses
+// in user input can't end the value or add conditions
+function quotePostgrestValue(value: string) {
+  return `"${value.replace(/["\\]/g, "\\$&")}"`;
+}
+
+const ORDER_SEARCH_COLUMNS = ["order_number", "customer_name", "customer_email"];
+
+// Keyset cursor over the list ordering (order_date DESC, id DESC): base64url of "order_date|id"
+function encodeCursor(order: { order_date: string; id: string }) {
+  return Buffer.from(`${order.order_date}|${order.id}`).toString("base64url");
+}
+
+function decodeCursor(cursor: string) {
+  const [orderDate, id] = Buffer.from(cursor, "base64url").toString().split("|");
+  return orderDate && id ? { orderDate, id } : null;
+}
+
+// "John ACME" -> "john:* & acme:*"; only letters/digits survive, so tsquery syntax can't be injected
+function buildPrefixTsQuery(term: string) {
+  return term
+    .toLowerCase()
+    .split(/[^0-9a-z\u00c0-\u024f]+/)
+    .filter(Boolean)
+    .map((token) => `${token}:*`)
+    .join(" & ");
 }
 
 function applyDateFilter(query: any, filters?: OrderFilters) {
@@ -90,6 +121,57 @@ function applyDateFilter(query: any, filters?: OrderFilters) {
   return query;
 }
 
+// Scope, search and filter conditions shared by the page query and the count-only fallback
+function applyListFilters(
+  query: any,
+  options: OrdersListRequest,
+  filters: OrderFilters,
+  searchTerm: string
+) {
+  const distributorFilter =
+    options.distributorId && options.distributorId !== "all"
+      ? options.distributorId
+      : filters.distributorId && filters.distributorId !== "all"
+      ? filters.distributorId
+      : undefined;
+
+  if (distributorFilter) {
+    query = query.eq("distributor_id", distributorFilter);
+  }
+
+  if (options.brandId) {
+    query = query.eq("brand_id", options.brandId);
+  }
+
+  const tsQuery = /\s/.test(searchTerm) ? buildPrefixTsQuery(searchTerm) : "";
+
+  if (tsQuery) {
+    // Multi-word: every word must prefix-match a token (indexed search_doc column)
+    query = query.textSearch("search_doc", tsQuery, { config: "simple" });
+  } else if (searchTerm) {
+    const pattern = quotePostgrestValue(buildContainsPattern(searchTerm));
+    query = query.or(
+      ORDER_SEARCH_COLUMNS.map((column) => `${column}.ilike.${pattern}`).join(",")
+    );
+  }
+
+  if (filters.status && filters.status !== "all") {
+    query = query.eq("order_status", filters.status);
+  }
+
+  if (filters.paymentStatus && filters.paymentStatus !== "all") {
+    query = query.eq("payment_status", filters.paymentStatus);
+  }
+
+  if (filters.customerType && filters.customerType !== "all") {
+    query = query.eq("customer_type", filters.customerType);
+  }
+
+  query = applyDateFilter(query, filters);
+
+  return query;
+}
+
 export async function POST(request: NextRequest) {
   const payload = (await request.json()) as OrdersListRequest;
   const supabase = await createClient();
@@ -115,52 +197,61 @@ export async function POST(request: NextRequest) {
   };
   const searchTerm = payload.searchTerm?.trim() ?? "";
 
-  let query = supabase
-    .from("orders")
-    .select(ORDER_LIST_COLUMNS, { count: "exact" });
+  const query = applyListFilters(
+    supabase.from("orders").select(ORDER_LIST_COLUMNS, { count: "exact" }),
+    payload,
+    filters,
+    searchTerm
+  );
 
-  const distributorFilter =
-    payload.distributorId && payload.distributorId !== "all"
-      ? payload.distributorId
-      : filters.distributorId && filters.distributorId !== "all"
-      ? filters.distributorId
-      : undefined;
-
-  if (distributorFilter) {
-    query = query.eq("distributor_id", distributorFilter);
-  }
-
-  if (payload.brandId) {
-    query = query.eq("brand_id", payload.brandId);
-  }
+  const cursor = payload.cursor ? decodeCursor(payload.cursor) : null;
 
-  if (searchTerm) {
-    const sanitized = sanitizeSearchTerm(searchTerm);
-    query = query.or(
-      `order_number.ilike.%${sanitized}%,customer_name.ilike.%${sanitized}%,customer_email.ilike.%${sanitized}%`
+  if (payload.cursor && !cursor) {
+    return NextResponse.json(
+      { ok: false, message: "Invalid cursor" },
+      { status: 400 }
     );
   }
 
-  if (filters.status && filters.status !== "all") {
-    query = query.eq("order_status", filters.status);
-  }
-
-  if (filters.paymentStatus && filters.paymentStatus !== "all") {
-    query = query.eq("payment_status", filters.paymentStatus);
-  }
+  const ordered = query
+    .order("order_date", { ascending: false })
+    .order("id", { ascending: false });
 
-  if (filters.customerType && filters.customerType !== "all") {
-    query = query.eq("customer_type", filters.customerType);
+  let pageQuery;
+  if (cursor) {
+    // (order_date, id) < cursor: Postgres walks the index from the cursor instead of skipping OFFSET rows
+    const orderDate = quotePostgrestValue(cursor.orderDate);
+    const id = quotePostgrestValue(cursor.id);
+    pageQuery = ordered
+      .or(`order_date.lt.${orderDate},and(order_date.eq.${orderDate},id.lt.${id})`)
+      .limit(pageSize);
+  } else {
+    const from = page * pageSize;
+    pageQuery = ordered.range(from, from + pageSize - 1);
   }
 
-  query = applyDateFilter(query, filters);
+  const { data, error, count } = await pageQuery;
 
-  const from = page * pageSize;
-  const to = from + pageSize - 1;
+  if (error?.code === "PGRST103") {
+    // Page starts past the last row (PostgREST answers 416): return an empty page with the real total
+    const { count: total, error: countError } = await applyListFilters(
+      supabase.from("orders").select("id", { count: "exact", head: true }),
+      payload,
+      filters,
+      searchTerm
+    );
 
-  const { data, error, count } = await query
-    .order("order_date", { ascending: false })
-    .range(from, to);
+    if (!countError) {
+      return NextResponse.json({
+        ok: true,
+        data: [],
+        totalCount: total ?? 0,
+        page,
+        pageSize,
+        nextCursor: null,
+      });
+    }
+  }
 
   if (error) {
     console.error("[OrdersList] Failed to fetch orders", error);
@@ -170,12 +261,15 @@ export async function POST(request: NextRequest) {
     );
   }
 
+  const rows = data ?? [];
+
   return NextResponse.json({
     ok: true,
-    data: data ?? [],
+    data: rows,
     totalCount: count ?? 0,
     page,
     pageSize,
+    nextCursor: rows.length === pageSize ? encodeCursor(rows[rows.length - 1]) : null,
   });
 }
 
@@ -52,36 +52,44 @@ export async function GET(request: NextRequest) {
       );
     }
 
-    // Calculate basic stats
+    // Calculate basic stats in a single pass over the relationships
     const totalRelationships = relationships?.length || 0;
-    const activeRelationships = relationships?.filter(r => r.status === 'active').length || 0;
-    const pendingRelationships = relationships?.filter(r => r.status === 'pending').length || 0;
-    const suspendedRelationships = relationships?.filter(r => r.status === 'suspended').length || 0;
-    const terminatedRelationships = relationships?.filter(r => r.status === 'terminated').length || 0;
-    
-    const totalRevenue = relationships?.reduce((sum, r) => sum + (r.total_revenue || 0), 0) || 0;
-    const totalOrders = relationships?.reduce((sum, r) => sum + (r.total_orders || 0), 0) || 0;
-    
-    const ratingsSum = relationships?.reduce((sum, r) => sum + (r.performance_rating || 0), 0) || 0;
-    const ratingsCount = relationships?.filter(r => r.performance_rating).length || 0;
-    const averagePerformanceRating = ratingsCount > 0 ? ratingsSum / ratingsCount : 0;
-
-    // Find expiring contracts (within 30 days)
+    const statusCounts: Record<string, number> = {};
+    let totalRevenue = 0;
+    let totalOrders = 0;
+    let ratingsSum = 0;
+    let ratingsCount = 0;
+    const expiringContracts: any[] = [];
+
+    // Expiring contracts end within the next 30 days
+    const now = new Date();
     const thirtyDaysFromNow = new Date();
     thirtyDaysFromNow.setDate(thirtyDaysFromNow.getDate() + 30);
-    
-    const expiringContracts = relationships?.filter(r => {
-      if (!r.contract_end_date) return false;
-      const contractEndDate = new Date(r.contract_end_date);
-      return contractEndDate <= thirtyDaysFromNow && contractEndDate > new Date();
-    }) || [];
+
+    for (const r of relationships || []) {
+      statusCounts[r.status] = (statusCounts[r.status] || 0) + 1;
+      totalRevenue += r.total_revenue || 0;
+      totalOrders += r.total_orders || 0;
+      if (r.performance_rating) {
+        ratingsSum += r.performance_rating;
+        ratingsCount += 1;
+      }
+      if (r.contract_end_date) {
+        const contractEndDate = new Date(r.contract_end_date);
+        if (contractEndDate <= thirtyDaysFromNow && contractEndDate > now) {
+          expiringContracts.push(r);
+        }
+      }
+    }
+
+    const averagePerformanceRating = ratingsCount > 0 ? ratingsSum / ratingsCount : 0;
 
     const stats: RelationshipStats = {
       total_relationships: totalRelationships,
-      active_relationships: activeRelationships,
-      pending_relationships: pendingRelationships,
-      suspended_relationships: suspendedRelationships,
-      terminated_relationships: terminatedRelationships,
+      active_relationships: statusCounts.active || 0,
+      pending_relationships: statusCounts.pending || 0,
+      suspended_relationships: statusCounts.suspended || 0,
+      terminated_relationships: statusCounts.terminated || 0,
       total_revenue: totalRevenue,
       total_orders: totalOrders,
       average_performance_rating: averagePerformanceRating,
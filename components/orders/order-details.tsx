@@ -94,42 +94,28 @@ export function OrderDetails({ orderId }: OrderDetailsProps) {
       }
       const supabase = createClient();
 
-      // Fetch order
+      // Fetch order with its distributor and source PO embedded (one round-trip)
       const { data: orderData, error: orderError } = await supabase
         .from("orders")
-        .select("*")
+        .select(
+          "*, distributors:distributor_id (*), purchase_orders:purchase_order_id (po_number)"
+        )
         .eq("id", orderId)
         .single();
 
       if (orderError) throw orderError;
-      setOrder(orderData);
-
-      // Fetch distributor if order has distributor_id
-      if (orderData.distributor_id) {
-        const { data: distributorData, error: distributorError } = await supabase
-          .from("distributors")
-          .select("*")
-          .eq("id", orderData.distributor_id)
-          .single();
-
-        if (distributorError) {
-          console.error("Error fetching distributor:", distributorError);
-        } else {
-          setDistributor(distributorData);
-        }
+
+      // Keep the embeds out of the order row so it still matches the orders columns
+      const { distributors: distributorData, purchase_orders: poData, ...orderRow } =
+        orderData as any;
+      setOrder(orderRow);
+
+      if (distributorData) {
+        setDistributor(distributorData);
       }
 
-      // Fetch source PO if exists
-      if (orderData.purchase_order_id) {
-        const { data: poData } = await supabase
-          .from("purchase_orders")
-          .select("po_number")
-          .eq("id", orderData.purchase_order_id)
-          .single();
-          
-        if (poData) {
-          setSourcePO(poData);
-        }
+      if (poData) {
+        setSourcePO(poData);
       }
     } catch (err: any) {
       console.error("Error fetching order details:", err);
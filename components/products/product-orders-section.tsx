@@ -73,10 +73,11 @@ export function ProductOrdersSection({
       setLoading(true);
       const supabase = createClient();
 
-      // Query orders where items JSONB array contains this product's SKU
+      // Query orders where items JSONB array contains this product's SKU (items @> '[{"sku": ...}]')
       const { data, error } = await supabase
         .from("orders")
         .select("*")
+        .contains("items", JSON.stringify([{ sku: productSku }]))
         .order("order_date", { ascending: false });
 
       if (error) {
@@ -84,13 +85,7 @@ export function ProductOrdersSection({
         return;
       }
 
-      // Filter orders that contain this product in their items
-      const productOrders = data.filter((order) => {
-        if (!order.items || !Array.isArray(order.items)) return false;
-        return order.items.some((item: any) => item.sku === productSku);
-      });
-
-      setOrders(productOrders);
+      setOrders(data ?? []);
     } catch (error) {
       console.error("Error loading orders:", error);
     } finally {
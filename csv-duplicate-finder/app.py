@@ -1,19 +1,38 @@
 from flask import Flask, render_template, request, send_file, session
 import pandas as pd
+import gzip
 import os
-from io import BytesIO
+import time
 import uuid
 import tempfile
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
-app.config['SECRET_KEY'] = os.urandom(24)  # Required for session
+# Required for session; set FLASK_SECRET_KEY so sessions survive restarts and work across workers
+app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY') or os.urandom(24)
+
+# Rows rendered per table; the rest of the duplicates are paged through /preview or downloaded
+PREVIEW_ROWS = 200
+
+# Duplicates files older than this are deleted on the next upload
+TEMP_FILE_MAX_AGE = 60 * 60
 
 # Create uploads directory if it doesn't exist
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+def remove_stale_files():
+    """Delete duplicates files left by sessions older than TEMP_FILE_MAX_AGE"""
+    cutoff = time.time() - TEMP_FILE_MAX_AGE
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            # Already removed by a concurrent upload
+            pass
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -28,8 +47,10 @@ def upload_file():
         return "No selected file", 400
     
     if file:
+        remove_stale_files()
         try:
-            # Read the CSV file
+            # Read the CSV file with the default engine: pyarrow's parses ISO dates, so values that
+            # differ as text (2024-01-01 vs 2024-01-01 00:00) would match, unlike /preview's re-read
             df = pd.read_csv(file)
             
             # Identify duplicates across all columns
@@ -38,32 +59,54 @@ def upload_file():
             # Store duplicates DataFrame in session using a unique ID
             # We'll store the duplicates as a temporary CSV file
             if not duplicates.empty:
-                # Generate a unique session ID for this upload
+                # Generate a unique ID for this upload's file
                 session_id = str(uuid.uuid4())
-                session['session_id'] = session_id
                 
-                # Save duplicates to a temporary file
-                temp_file = os.path.join(app.config['UPLOAD_FOLDER'], f'{session_id}_duplicates.csv')
-                duplicates.to_csv(temp_file, index=False)
+                # Save duplicates to a gzipped temporary file, which is also the download body
+                temp_file = os.path.join(app.config['UPLOAD_FOLDER'], f'{session_id}_duplicates.csv.gz')
+                duplicates.to_csv(temp_file, index=False, compression={'method': 'gzip', 'compresslevel': 6})
                 session['duplicates_file'] = temp_file
             else:
                 session['duplicates_file'] = None
             
-            # Store original data count for display
-            session['original_count'] = len(df)
+            # The cookie only carries what /preview needs
             session['duplicate_count'] = len(duplicates) if not duplicates.empty else 0
             
+            # Render only the first rows: the HTML for a whole upload runs to megabytes
             return render_template('results.html',
-                                  original_data=df.to_html(classes='table table-striped', index=False),
-                                  duplicate_data=duplicates.to_html(classes='table table-striped', index=False) if not duplicates.empty else None,
+                                  original_data=df.head(PREVIEW_ROWS).to_html(classes='table table-striped', index=False),
+                                  duplicate_data=duplicates.head(PREVIEW_ROWS).to_html(classes='table table-striped', index=False) if not duplicates.empty else None,
                                   has_duplicates=not duplicates.empty,
                                   original_count=len(df),
-                                  duplicate_count=len(duplicates) if not duplicates.empty else 0)
+                                  duplicate_count=len(duplicates) if not duplicates.empty else 0,
+                                  preview_rows=PREVIEW_ROWS)
         except Exception as e:
             return f"Error processing file: {e}", 500
     
     return "Something went wrong", 500
 
+@app.route('/preview', methods=['GET'])
+def preview_duplicates():
+    # Check if duplicates file exists in session
+    duplicates_file = session.get('duplicates_file')
+    if duplicates_file is None or not os.path.exists(duplicates_file):
+        return "No duplicates found or session expired. Please upload a file again.", 404
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    try:
+        # Parse only the requested page, keeping the header row
+        page = pd.read_csv(duplicates_file, skiprows=range(1, offset + 1), nrows=PREVIEW_ROWS)
+    except Exception as e:
+        return f"Error reading duplicates: {e}", 500
+    
+    return render_template('preview.html',
+                          duplicate_data=page.to_html(classes='table table-striped', index=False),
+                          offset=offset,
+                          page_rows=len(page),
+                          preview_rows=PREVIEW_ROWS,
+                          duplicate_count=session.get('duplicate_count', 0))
+
 @app.route('/download_duplicates', methods=['GET'])
 def download_duplicates():
     # Check if duplicates file exists in session
@@ -76,24 +119,19 @@ def download_duplicates():
     if not os.path.exists(duplicates_file):
         return "Duplicates file not found. Please upload a file again.", 404
     
-    try:
-        # Read the duplicates CSV file
-        duplicates_df = pd.read_csv(duplicates_file)
-        
-        # Convert to CSV in memory
-        output = BytesIO()
-        duplicates_df.to_csv(output, index=False)
-        output.seek(0)
-        
-        # Send the file for download
-        return send_file(
-            output,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name='duplicates.csv'
-        )
-    except Exception as e:
-        return f"Error generating download file: {e}", 500
+    # The temp file is already the gzipped CSV: send it as-is with Content-Encoding, so the browser
+    # saves a plain duplicates.csv; clients that don't accept gzip get it decompressed on the fly
+    accepts_gzip = 'gzip' in request.accept_encodings
+    response = send_file(
+        os.path.abspath(duplicates_file) if accepts_gzip else gzip.open(duplicates_file, 'rb'),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name='duplicates.csv'
+    )
+    if accepts_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,60 @@
+-- ================================================
+-- Migration: begin_document_ingest RPC
+-- Description: Duplicate check + document insert/retry for the Excel ingest API in one round-trip
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION begin_document_ingest(
+  p_document_name text,
+  p_user_id uuid,
+  p_brand_id uuid
+)
+RETURNS TABLE (
+  document_id uuid,
+  status text,
+  is_duplicate boolean,
+  can_retry boolean,
+  is_new boolean
+) AS $$
+DECLARE
+  v_document_id uuid;
+  v_status text;
+BEGIN
+  -- Serialize concurrent uploads of the same file name for this user/brand
+  PERFORM pg_advisory_xact_lock(hashtext(p_user_id::text || ':' || p_brand_id::text || ':' || p_document_name));
+
+  SELECT sds.document_id, sds.status
+  INTO v_document_id, v_status
+  FROM sales_documents_storage sds
+  WHERE sds.user_id = p_user_id
+    AND sds.brand_id = p_brand_id
+    AND sds.document_name = p_document_name
+  ORDER BY sds.created_at DESC
+  LIMIT 1
+  FOR UPDATE;
+
+  IF v_document_id IS NULL THEN
+    v_document_id := gen_random_uuid();
+    INSERT INTO sales_documents_storage (document_name, user_id, brand_id, document_id, status)
+    VALUES (p_document_name, p_user_id, p_brand_id, v_document_id, 'processing');
+    RETURN QUERY SELECT v_document_id, 'processing'::text, false, false, true;
+  ELSIF v_status = 'failed' THEN
+    -- Retry: flip back to processing before the caller re-runs the pipeline
+    UPDATE sales_documents_storage sds
+    SET status = 'processing'
+    WHERE sds.document_id = v_document_id;
+    RETURN QUERY SELECT v_document_id, v_status, false, true, false;
+  ELSE
+    RETURN QUERY SELECT v_document_id, v_status, v_status IN ('processing', 'success'), false, false;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT * FROM begin_document_ingest('sales.xlsx', 'your-user-id'::uuid, 'your-brand-id'::uuid);
@@ -0,0 +1,82 @@
+-- ================================================
+-- Migration: Scheduled refresh of brand materialized views
+-- Description: refresh_brand_view refreshes one sales_documents_view_<brand> CONCURRENTLY (readers are
+--              not blocked) and records when, so get_admin_data can report staleness_seconds.
+--              refresh_brand_views runs it for every brand view and is scheduled every 15 minutes
+--              with pg_cron, so rows changed outside uploads (e.g. document deletes) show up too.
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+-- Last build or refresh of each brand materialized view
+CREATE TABLE IF NOT EXISTS brand_view_refreshes (
+  view_name text PRIMARY KEY,
+  refreshed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION refresh_brand_view(
+  p_view_name text
+)
+RETURNS timestamptz AS $$
+DECLARE
+  v_refreshed_at timestamptz := clock_timestamp();
+BEGIN
+  IF p_view_name !~ '^sales_documents_view_[0-9a-f_]+$' THEN
+    RAISE EXCEPTION 'Not a brand view: %', p_view_name;
+  END IF;
+
+  -- CONCURRENTLY needs the unique (user_id, id) index the backend creates with the view
+  EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY public.%I', p_view_name);
+
+  INSERT INTO brand_view_refreshes (view_name, refreshed_at)
+  VALUES (p_view_name, v_refreshed_at)
+  ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+
+  RETURN v_refreshed_at;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION refresh_brand_views()
+RETURNS integer AS $$
+DECLARE
+  v_view record;
+  v_refreshed integer := 0;
+BEGIN
+  FOR v_view IN
+    SELECT matviewname FROM pg_matviews
+    WHERE schemaname = 'public' AND matviewname LIKE 'sales_documents_view\_%'
+  LOOP
+    BEGIN
+      PERFORM refresh_brand_view(v_view.matviewname);
+      v_refreshed := v_refreshed + 1;
+    EXCEPTION WHEN OTHERS THEN
+      -- One broken view (e.g. missing unique index) must not stop the others
+      RAISE WARNING 'Could not refresh %: %', v_view.matviewname, SQLERRM;
+    END;
+  END LOOP;
+
+  RETURN v_refreshed;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Schedule only where pg_cron is enabled (Database > Extensions); re-running updates the job
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('refresh_brand_views', '*/15 * * * *', 'SELECT refresh_brand_views()');
+  END IF;
+END;
+$$;
+
+-- Update statistics for query planner optimization
+ANALYZE brand_view_refreshes;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT refresh_brand_view('sales_documents_view_<brand>');
+-- SELECT view_name, now() - refreshed_at AS staleness FROM brand_view_refreshes;
+-- SELECT jobname, schedule, command FROM cron.job WHERE jobname = 'refresh_brand_views';
@@ -0,0 +1,89 @@
+-- ================================================
+-- Migration: Deduplicate Excel uploads by content hash
+-- Description: Adds sales_documents_storage.content_sha256 and makes begin_document_ingest
+--              match uploads on (user_id, content_sha256) instead of the file name
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+ALTER TABLE sales_documents_storage
+ADD COLUMN IF NOT EXISTS content_sha256 text;
+
+-- Rows uploaded before this migration have no hash and are not constrained
+CREATE UNIQUE INDEX IF NOT EXISTS sales_documents_storage_user_content_sha256_key
+ON sales_documents_storage (user_id, content_sha256)
+WHERE content_sha256 IS NOT NULL;
+
+-- The signature changes, so drop the name-based version instead of adding an overload
+DROP FUNCTION IF EXISTS begin_document_ingest(text, uuid, uuid);
+
+CREATE OR REPLACE FUNCTION begin_document_ingest(
+  p_document_name text,
+  p_user_id uuid,
+  p_brand_id uuid,
+  p_content_sha256 text DEFAULT NULL,
+  p_document_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  document_id uuid,
+  status text,
+  is_duplicate boolean,
+  can_retry boolean,
+  is_new boolean
+) AS $$
+DECLARE
+  v_document_id uuid;
+  v_status text;
+BEGIN
+  IF p_content_sha256 IS NOT NULL THEN
+    -- Serialize concurrent uploads of the same content for this user
+    PERFORM pg_advisory_xact_lock(hashtext(p_user_id::text || ':' || p_content_sha256));
+
+    SELECT sds.document_id, sds.status
+    INTO v_document_id, v_status
+    FROM sales_documents_storage sds
+    WHERE sds.user_id = p_user_id
+      AND sds.content_sha256 = p_content_sha256
+    ORDER BY sds.created_at DESC
+    LIMIT 1
+    FOR UPDATE;
+  ELSE
+    -- Serialize concurrent uploads of the same file name for this user/brand
+    PERFORM pg_advisory_xact_lock(hashtext(p_user_id::text || ':' || p_brand_id::text || ':' || p_document_name));
+
+    SELECT sds.document_id, sds.status
+    INTO v_document_id, v_status
+    FROM sales_documents_storage sds
+    WHERE sds.user_id = p_user_id
+      AND sds.brand_id = p_brand_id
+      AND sds.document_name = p_document_name
+    ORDER BY sds.created_at DESC
+    LIMIT 1
+    FOR UPDATE;
+  END IF;
+
+  IF v_document_id IS NULL THEN
+    v_document_id := COALESCE(p_document_id, gen_random_uuid());
+    INSERT INTO sales_documents_storage (document_name, user_id, brand_id, document_id, status, content_sha256)
+    VALUES (p_document_name, p_user_id, p_brand_id, v_document_id, 'processing', p_content_sha256);
+    RETURN QUERY SELECT v_document_id, 'processing'::text, false, false, true;
+  ELSIF v_status = 'failed' THEN
+    -- Retry: flip back to processing before the caller re-runs the pipeline
+    UPDATE sales_documents_storage sds
+    SET status = 'processing'
+    WHERE sds.document_id = v_document_id;
+    RETURN QUERY SELECT v_document_id, v_status, false, true, false;
+  ELSE
+    RETURN QUERY SELECT v_document_id, v_status, v_status IN ('processing', 'success'), false, false;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- \d sales_documents_storage
+-- SELECT * FROM begin_document_ingest('sales.xlsx', 'your-user-id'::uuid, 'your-brand-id'::uuid, 'sha256-hex', NULL);
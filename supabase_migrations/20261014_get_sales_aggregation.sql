@@ -0,0 +1,54 @@
+-- ================================================
+-- Migration: get_sales_aggregation RPC
+-- Description: One function for the backend's top-products, sales-by-country and category-performance
+--              questions; they differ only in the GROUP BY column. The brand view is derived from
+--              org_id, so one definition serves every brand's sales_documents_view_<brand>.
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION get_sales_aggregation(
+  org_id uuid,
+  user_uuid uuid,
+  dim text,
+  limit_count integer DEFAULT NULL
+)
+RETURNS TABLE (
+  group_key text,
+  total_sales numeric,
+  total_count bigint
+) AS $$
+DECLARE
+  v_view_name text := 'sales_documents_view_' || replace(org_id::text, '-', '_');
+BEGIN
+  IF dim NOT IN ('product_name', 'country', 'type') THEN
+    RAISE EXCEPTION 'Unsupported dimension: %', dim;
+  END IF;
+
+  IF to_regclass(format('public.%I', v_view_name)) IS NULL THEN
+    RETURN;
+  END IF;
+
+  -- Same filter as the partial (brand_id, user_id, <dim>) indexes on brand materialized views
+  -- (LIMIT NULL returns every group)
+  RETURN QUERY EXECUTE format(
+    'SELECT %I::text, SUM(sales_value_usd), SUM(sales_count)::bigint
+     FROM public.%I
+     WHERE brand_id = $1 AND user_id = $2 AND sales_value_usd IS NOT NULL
+     GROUP BY %I
+     ORDER BY 2 DESC
+     LIMIT $3',
+    dim, v_view_name, dim
+  )
+  USING org_id, user_uuid, limit_count;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY INVOKER;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT * FROM get_sales_aggregation('your-brand-id'::uuid, 'your-user-id'::uuid, 'product_name', 10);
+-- SELECT * FROM get_sales_aggregation('your-brand-id'::uuid, 'your-user-id'::uuid, 'country');
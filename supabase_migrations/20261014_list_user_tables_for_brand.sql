@@ -0,0 +1,35 @@
+-- ================================================
+-- Migration: list_user_tables_for_brand RPC
+-- Description: Existing per-user sales tables (sales_documents_<uid>) of a brand's members in one
+--              round-trip, replacing a probe per member when the backend rebuilds the brand view
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION list_user_tables_for_brand(
+  p_brand_id uuid
+)
+RETURNS TABLE (
+  table_name text
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT t.tablename::text
+  FROM pg_tables t
+  WHERE t.schemaname = 'public'
+    AND t.tablename IN (
+      SELECT 'sales_documents_' || replace(um.user_id::text, '-', '_')
+      FROM user_memberships um
+      WHERE um.brand_id = p_brand_id
+    )
+  ORDER BY t.tablename;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY INVOKER;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT * FROM list_user_tables_for_brand('your-brand-id'::uuid);
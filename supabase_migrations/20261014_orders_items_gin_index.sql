@@ -0,0 +1,24 @@
+-- ================================================
+-- Migration: JSONB containment index on orders.items
+-- Description: Lets the product orders tab (components/products/product-orders-section.tsx)
+--              filter with items @> '[{"sku": ...}]' in Postgres instead of loading every order
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+-- jsonb_path_ops: smaller than the default opclass and supports the @> operator used here
+CREATE INDEX IF NOT EXISTS idx_orders_items_path
+  ON orders USING gin(items jsonb_path_ops);
+
+-- Update statistics for query planner optimization
+ANALYZE orders;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- EXPLAIN ANALYZE
+-- SELECT id FROM orders WHERE items @> '[{"sku": "SKU-001"}]' ORDER BY order_date DESC;
+-- Expect a Bitmap Index Scan on idx_orders_items_path instead of a Seq Scan on orders.
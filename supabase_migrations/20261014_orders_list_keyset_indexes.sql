@@ -0,0 +1,31 @@
+-- ================================================
+-- Migration: Keyset pagination indexes for the orders list
+-- Description: Match the orders list ordering (order_date DESC, id DESC) so cursor pages
+--              in app/api/orders/list/route.ts read only the rows they return
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+-- Brand-scoped lists (brand users and the brandId filter)
+CREATE INDEX IF NOT EXISTS idx_orders_brand_date_id
+  ON orders(brand_id, order_date DESC, id DESC);
+
+-- Unscoped lists (super admins)
+CREATE INDEX IF NOT EXISTS idx_orders_date_id
+  ON orders(order_date DESC, id DESC);
+
+-- Update statistics for query planner optimization
+ANALYZE orders;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- EXPLAIN ANALYZE
+-- SELECT id FROM orders
+-- WHERE brand_id = '<brand uuid>'
+--   AND (order_date < '2026-10-01T00:00:00Z' OR (order_date = '2026-10-01T00:00:00Z' AND id < '<order uuid>'))
+-- ORDER BY order_date DESC, id DESC LIMIT 25;
+-- Expect an Index Scan on idx_orders_brand_date_id with no Sort node.
@@ -0,0 +1,33 @@
+-- ================================================
+-- Migration: Full-text search document for orders
+-- Description: Generated tsvector over the orders list search fields, used for multi-word
+--              searches in app/api/orders/list/route.ts (single terms keep trigram ILIKE)
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+-- 'simple' config: no stemming or stop words, so order numbers and names tokenize as typed
+ALTER TABLE orders
+ADD COLUMN IF NOT EXISTS search_doc tsvector
+GENERATED ALWAYS AS (
+  to_tsvector(
+    'simple',
+    coalesce(order_number, '') || ' ' || coalesce(customer_name, '') || ' ' || coalesce(customer_email, '')
+  )
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_orders_search_doc
+  ON orders USING gin(search_doc);
+
+-- Reload PostgREST schema cache so the new column can be filtered on
+NOTIFY pgrst, 'reload schema';
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- EXPLAIN ANALYZE
+-- SELECT id FROM orders WHERE search_doc @@ to_tsquery('simple', 'john:* & acme:*');
+-- Expect a Bitmap Index Scan on idx_orders_search_doc.
@@ -0,0 +1,36 @@
+-- ================================================
+-- Migration: Trigram indexes for orders search
+-- Description: Index the columns the orders list searches with leading-wildcard ILIKE
+--              (app/api/orders/list/route.ts) so search no longer scans the table
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+-- Trigram extension for ILIKE '%term%' index support
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Trigram index for order_number text search (ILIKE queries)
+CREATE INDEX IF NOT EXISTS idx_orders_order_number_trgm
+  ON orders USING gin(order_number gin_trgm_ops);
+
+-- Trigram index for customer_name text search (ILIKE queries)
+CREATE INDEX IF NOT EXISTS idx_orders_customer_name_trgm
+  ON orders USING gin(customer_name gin_trgm_ops);
+
+-- Trigram index for customer_email text search (ILIKE queries)
+CREATE INDEX IF NOT EXISTS idx_orders_customer_email_trgm
+  ON orders USING gin(customer_email gin_trgm_ops);
+
+-- Update statistics for query planner optimization
+ANALYZE orders;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- EXPLAIN ANALYZE
+-- SELECT id FROM orders
+-- WHERE order_number ILIKE '%1001%' OR customer_name ILIKE '%1001%' OR customer_email ILIKE '%1001%';
+-- Expect a BitmapOr over the three *_trgm indexes instead of a Seq Scan on orders.
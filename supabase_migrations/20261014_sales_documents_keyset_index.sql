@@ -0,0 +1,26 @@
+-- ================================================
+-- Migration: Keyset pagination index for a user's documents
+-- Description: Matches get_user_documents ordering (created_at DESC, id DESC) in the Python backend,
+--              so each page reads only the rows it returns at any depth
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_sales_documents_user_brand_created_id
+  ON sales_documents(user_id, brand_id, created_at DESC, id DESC);
+
+-- Update statistics for query planner optimization
+ANALYZE sales_documents;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- EXPLAIN ANALYZE
+-- SELECT * FROM sales_documents
+-- WHERE user_id = '<user uuid>' AND brand_id = '<brand uuid>'
+--   AND (created_at, id) < ('2026-10-01T00:00:00Z', '<document id>')
+-- ORDER BY created_at DESC, id DESC LIMIT 50;
+-- Expect an Index Scan on idx_sales_documents_user_brand_created_id with no Sort node.
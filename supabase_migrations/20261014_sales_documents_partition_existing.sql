@@ -0,0 +1,148 @@
+-- ================================================
+-- Migration: Move existing per-user sales tables into sales_documents_parent
+-- Description: One-off conversion for SALES_PARTITIONED_STORAGE=true. Every standalone sales_documents_<uid>
+--              table becomes a partition of sales_documents_parent, and every brand materialized view
+--              (a UNION ALL over those tables) becomes the plain view over the parent that the Python
+--              backend defines. Run after 20261014_sales_documents_partitioned.sql, when enabling the flag.
+--              create_sales_data_partition no longer drops the old table with CASCADE, which silently
+--              dropped the brand views reading it; the old table is kept until they are redefined.
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION create_sales_data_partition(
+  p_user_id uuid
+)
+RETURNS text AS $$
+DECLARE
+  v_table_name text := 'sales_documents_' || replace(p_user_id::text, '-', '_');
+  v_legacy_name text := v_table_name || '_legacy';
+  v_columns text := 'user_id, brand_id, document_id, product_name, year, month, country, '
+                 || 'sales_count, sales_value_usd, soh, description, type, created_at, updated_at';
+BEGIN
+  -- Serialize concurrent first uploads of the same user
+  PERFORM pg_advisory_xact_lock(hashtext('sales_data_partition:' || p_user_id::text));
+
+  IF EXISTS (
+    SELECT 1 FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.sales_documents_parent'::regclass
+      AND c.relname = v_table_name
+  ) THEN
+    RETURN v_table_name;
+  END IF;
+
+  IF to_regclass('public.' || v_table_name) IS NOT NULL THEN
+    EXECUTE format('ALTER TABLE public.%I RENAME TO %I', v_table_name, v_legacy_name);
+  END IF;
+
+  EXECUTE format(
+    'CREATE TABLE public.%I PARTITION OF sales_documents_parent FOR VALUES IN (%L)',
+    v_table_name, p_user_id
+  );
+
+  IF to_regclass('public.' || v_legacy_name) IS NOT NULL THEN
+    EXECUTE format(
+      'INSERT INTO public.%I (%s) SELECT %s FROM public.%I',
+      v_table_name, v_columns, v_columns, v_legacy_name
+    );
+    -- Brand views still reading the old table keep it; drop_orphaned_legacy_sales_tables removes it later
+    BEGIN
+      EXECUTE format('DROP TABLE public.%I', v_legacy_name);
+    EXCEPTION WHEN dependent_objects_still_exist THEN
+      RAISE NOTICE 'Keeping % until the views that depend on it are redefined', v_legacy_name;
+    END;
+  END IF;
+
+  -- Reload PostgREST schema cache so the partition can be written by name
+  NOTIFY pgrst, 'reload schema';
+
+  RETURN v_table_name;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Drop the old tables of converted users that no view depends on any more; returns how many were dropped
+CREATE OR REPLACE FUNCTION drop_orphaned_legacy_sales_tables()
+RETURNS integer AS $$
+DECLARE
+  v_table text;
+  v_dropped integer := 0;
+BEGIN
+  FOR v_table IN
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+      AND c.relkind = 'r'
+      AND c.relname ~ '^sales_documents_[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}_legacy$'
+  LOOP
+    BEGIN
+      EXECUTE format('DROP TABLE public.%I', v_table);
+      v_dropped := v_dropped + 1;
+    EXCEPTION WHEN dependent_objects_still_exist THEN
+      RAISE NOTICE 'Keeping %: other views still depend on it', v_table;
+    END;
+  END LOOP;
+
+  RETURN v_dropped;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+DO $$
+DECLARE
+  v_table text;
+  v_view text;
+BEGIN
+  -- Standalone per-user tables become partitions (their rows are copied into the parent)
+  FOR v_table IN
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+      AND c.relkind = 'r'
+      AND NOT c.relispartition
+      AND c.relname ~ '^sales_documents_[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}$'
+  LOOP
+    PERFORM create_sales_data_partition(
+      replace(substring(v_table FROM length('sales_documents_') + 1), '_', '-')::uuid
+    );
+  END LOOP;
+
+  -- Brand materialized views become views over the parent, as SupabaseService._create_partitioned_brand_view defines them
+  FOR v_view IN
+    SELECT matviewname
+    FROM pg_matviews
+    WHERE schemaname = 'public'
+      AND matviewname ~ '^sales_documents_view_[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}$'
+  LOOP
+    EXECUTE format('DROP MATERIALIZED VIEW public.%I', v_view);
+    EXECUTE format(
+      'CREATE VIEW public.%I AS '
+      || 'SELECT id, user_id, brand_id, product_name, year, month, document_id, country, '
+      || 'sales_count, sales_value_usd, soh, description, type, created_at, updated_at '
+      || 'FROM sales_documents_parent '
+      || 'WHERE user_id IN (SELECT user_id FROM user_memberships WHERE brand_id = %L)',
+      v_view,
+      replace(substring(v_view FROM length('sales_documents_view_') + 1), '_', '-')::uuid
+    );
+  END LOOP;
+
+  PERFORM drop_orphaned_legacy_sales_tables();
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
+
+ANALYZE sales_documents_parent;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition
+--   AND relname ~ '^sales_documents_[0-9a-f_]{36}(_legacy)?$';
+-- Expect no rows: every per-user table is a partition and no old copy is left.
+-- SELECT matviewname FROM pg_matviews WHERE matviewname LIKE 'sales_documents_view_%';
+-- Expect no rows: brand views are plain views over sales_documents_parent.
@@ -0,0 +1,95 @@
+-- ================================================
+-- Migration: Partitioned storage for per-user sales data
+-- Description: sales_documents_parent, LIST-partitioned by user_id, with one partition per user named
+--              like the old per-user tables (sales_documents_<uid>). Brand views become plain views over
+--              the parent, so uploads no longer rebuild a UNION ALL materialized view.
+--              Used by the Python backend when SALES_PARTITIONED_STORAGE=true.
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sales_documents_parent (
+  id bigserial,
+  user_id uuid NOT NULL,
+  brand_id uuid,
+  document_id uuid,
+  product_name text,
+  year integer,
+  month integer,
+  country text,
+  sales_count integer,
+  sales_value_usd numeric,
+  soh numeric,
+  description text,
+  type text,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, id)
+) PARTITION BY LIST (user_id);
+
+-- Local indexes, created on every partition
+CREATE INDEX IF NOT EXISTS idx_sales_documents_parent_brand
+  ON sales_documents_parent(brand_id);
+CREATE INDEX IF NOT EXISTS idx_sales_documents_parent_document
+  ON sales_documents_parent(document_id);
+
+-- Create the user's partition. An existing standalone per-user table is renamed, its rows are copied
+-- into the new partition, and it is dropped.
+CREATE OR REPLACE FUNCTION create_sales_data_partition(
+  p_user_id uuid
+)
+RETURNS text AS $$
+DECLARE
+  v_table_name text := 'sales_documents_' || replace(p_user_id::text, '-', '_');
+  v_legacy_name text := v_table_name || '_legacy';
+  v_columns text := 'user_id, brand_id, document_id, product_name, year, month, country, '
+                 || 'sales_count, sales_value_usd, soh, description, type, created_at, updated_at';
+BEGIN
+  -- Serialize concurrent first uploads of the same user
+  PERFORM pg_advisory_xact_lock(hashtext('sales_data_partition:' || p_user_id::text));
+
+  IF EXISTS (
+    SELECT 1 FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.sales_documents_parent'::regclass
+      AND c.relname = v_table_name
+  ) THEN
+    RETURN v_table_name;
+  END IF;
+
+  IF to_regclass('public.' || v_table_name) IS NOT NULL THEN
+    EXECUTE format('ALTER TABLE public.%I RENAME TO %I', v_table_name, v_legacy_name);
+  END IF;
+
+  EXECUTE format(
+    'CREATE TABLE public.%I PARTITION OF sales_documents_parent FOR VALUES IN (%L)',
+    v_table_name, p_user_id
+  );
+
+  IF to_regclass('public.' || v_legacy_name) IS NOT NULL THEN
+    EXECUTE format(
+      'INSERT INTO public.%I (%s) SELECT %s FROM public.%I',
+      v_table_name, v_columns, v_columns, v_legacy_name
+    );
+    EXECUTE format('DROP TABLE public.%I CASCADE', v_legacy_name);
+  END IF;
+
+  -- Reload PostgREST schema cache so the partition can be written by name
+  NOTIFY pgrst, 'reload schema';
+
+  RETURN v_table_name;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Update statistics for query planner optimization
+ANALYZE sales_documents_parent;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT create_sales_data_partition('your-user-id'::uuid);
+-- EXPLAIN ANALYZE SELECT count(*) FROM sales_documents_parent WHERE user_id = 'your-user-id'::uuid;
+-- Expect a scan of sales_documents_your_user_id only (partitions pruned).
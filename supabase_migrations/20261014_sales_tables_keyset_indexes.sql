@@ -0,0 +1,43 @@
+-- ================================================
+-- Migration: Keyset pagination indexes for per-user sales tables
+-- Description: (brand_id, user_id, created_at DESC, id DESC) on every existing sales_documents_<uid> table
+--              and on sales_documents_parent, matching get_user_data's cursor pages in the Python backend.
+--              New user tables get the same index when the backend creates them.
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+DO $$
+DECLARE
+  v_table text;
+BEGIN
+  -- Standalone per-user tables only; partitions inherit the parent's index below
+  FOR v_table IN
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+      AND c.relkind = 'r'
+      AND NOT c.relispartition
+      AND c.relname ~ '^sales_documents_[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}$'
+  LOOP
+    EXECUTE format(
+      'CREATE INDEX IF NOT EXISTS %I ON public.%I (brand_id, user_id, created_at DESC, id DESC)',
+      v_table || '_page', v_table
+    );
+  END LOOP;
+
+  IF to_regclass('public.sales_documents_parent') IS NOT NULL THEN
+    CREATE INDEX IF NOT EXISTS idx_sales_documents_parent_page
+      ON sales_documents_parent (brand_id, user_id, created_at DESC, id DESC);
+  END IF;
+END;
+$$;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT indexname FROM pg_indexes WHERE indexname LIKE 'sales_documents_%_page';
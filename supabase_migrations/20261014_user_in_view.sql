@@ -0,0 +1,43 @@
+-- ================================================
+-- Migration: user_in_view RPC
+-- Description: One round-trip for the backend's is_user_table_in_view: whether a user's sales table
+--              has rows and the brand view already contains that user's rows
+-- Date: October 14, 2026
+-- ================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION user_in_view(
+  p_view_name text,
+  p_user_table text,
+  p_user_id uuid
+)
+RETURNS boolean AS $$
+DECLARE
+  v_found boolean;
+BEGIN
+  IF to_regclass(format('public.%I', p_user_table)) IS NULL
+     OR to_regclass(format('public.%I', p_view_name)) IS NULL THEN
+    RETURN false;
+  END IF;
+
+  EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I)', p_user_table) INTO v_found;
+  IF NOT v_found THEN
+    RETURN false;
+  END IF;
+
+  -- Index lookup: brand materialized views carry a unique (user_id, id) index
+  EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE user_id = $1)', p_view_name)
+  INTO v_found
+  USING p_user_id;
+
+  RETURN v_found;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY INVOKER;
+
+COMMIT;
+
+-- ================================================
+-- Verification
+-- ================================================
+-- SELECT user_in_view('sales_documents_view_<brand>', 'sales_documents_<user>', 'your-user-id'::uuid);